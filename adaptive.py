@@ -0,0 +1,190 @@
+# adaptive.py
+"""
+Adaptive subdivision (Mariani-Silver) rendering.
+
+Big parts of most images are uniform: the inside of the set, where every point runs to max_iter, and at lower
+max_iter the bands outside it. The mandelbrot set and connected julia sets have no holes or islands, so if
+every pixel on the border of a rectangle never escapes, neither does anything inside it. So:
+    - compute the border of a rectangle
+    - if the whole border shares one iteration count, fill the inside with it without iterating
+    - otherwise split the rectangle in four and do the same for each quarter, down to min_size, below which
+      the inside is just computed
+
+All the rectangles of one level of subdivision are computed together in a single call to escape_time.
+
+By default only rectangles that never escape are filled, and the points in them are colored with the background
+anyway. The one catch is resolution: a filament of the set thinner than a pixel can cross a rectangle between
+its border pixels and be missed, which typically gets a handful of pixels per image wrong (see
+benchmarks/bench_adaptive.py). With fill_escaped=True rectangles with one escape count on the border are filled
+as well. Their iteration counts are right, but the inside has no |z| or exp(-|z|) sum of its own, so those are
+interpolated from the border, and smooth coloring inside such a rectangle is only approximate.
+
+The interior check and periodicity checking already make the inside of the set cheap with the numpy backend,
+so the gain is largest with the checks off, for julia sets, and at high max_iter.
+"""
+
+import numpy as np
+
+from engine import EscapeResult, escape_time, merge_stats, new_stats
+from formulas import get_formula
+
+
+def _evaluate(ys, xs, first_row, fields, grid, formula, c, options, counts):
+    # iterate the pixels (ys, xs) of a band starting at image row first_row and store their escape data in fields
+    if ys.size == 0:
+        return
+    x_min, x_size, y_min, y_size = grid
+    # the same arithmetic as complex_grid, so computed pixels match a full render exactly
+    points = (x_min + xs.astype(np.float64) * x_size, y_min + (ys + first_row).astype(np.float64) * y_size)
+    if formula.parameter_plane:
+        z = tuple(np.full(ys.shape, value) for value in formula.critical_point)
+        result = escape_time(z, points, formula, stats=counts, **options)
+    else:
+        result = escape_time(points, c, formula, stats=counts, **options)
+    for field, values in zip(fields, result):
+        if field is not None:
+            field[ys, xs] = values
+
+
+def _border(y0, y1, x0, x1):
+    # pixels on the borders of the rectangles [y0, y1] x [x0, x1] (inclusive, arrays of them, each at least 2x2)
+    #   Returns (ys, xs, starts): the pixels of every rectangle one after the other, and where each one starts
+    width = x1 - x0 + 1
+    side = y1 - y0 - 1
+    lengths = 2 * width + 2 * side
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    rectangle = np.repeat(np.arange(lengths.size), lengths)
+    k = np.arange(lengths.sum()) - starts[rectangle]
+    y0, y1, x0, x1, width, side = (a[rectangle] for a in (y0, y1, x0, x1, width, side))
+    # top row, bottom row, left column, right column
+    top, bottom, left = k < width, (k >= width) & (k < 2 * width), (k >= 2 * width) & (k < 2 * width + side)
+    ys = np.where(top, y0, np.where(bottom, y1, y0 + 1 + (k - 2 * width) % np.maximum(side, 1)))
+    xs = np.where(top, x0 + k, np.where(bottom, x0 + k - width, np.where(left, x0, x1)))
+    return ys, xs, starts
+
+
+def _inside(y0, y1, x0, x1):
+    # pixels inside the rectangles [y0, y1] x [x0, x1] (arrays of them). Returns (ys, xs, rectangle index)
+    width = x1 - x0 - 1
+    sizes = width * (y1 - y0 - 1)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    rectangle = np.repeat(np.arange(sizes.size), sizes)
+    k = np.arange(sizes.sum()) - starts[rectangle]
+    return y0[rectangle] + 1 + k // width[rectangle], x0[rectangle] + 1 + k % width[rectangle], rectangle
+
+
+def _fill_smooth(field, ys, xs, y0, y1, x0, x1):
+    # fill pixels inside rectangles from their borders (one rectangle per pixel):
+    #   the average of the left-right and top-bottom interpolations
+    tx = (xs - x0) / (x1 - x0)
+    ty = (ys - y0) / (y1 - y0)
+    left, right, top, bottom = field[ys, x0], field[ys, x1], field[y0, xs], field[y1, xs]
+    field[ys, xs] = ((left + (right - left) * tx) + (top + (bottom - top) * ty)) / 2
+
+
+def adaptive_render(image_size, bounds, formula='mandelbrot', c=None, max_iter=250, escape_radius=None,
+                    exp_smoothing=False, progress=None, backend='numpy', interior_check=False,
+                    periodicity=False, stats=None, rows=None, min_size=6, fill_escaped=False, precision='float64'):
+    '''
+    Compute the escape data for an image (or a band of its rows) by adaptive subdivision.
+
+        Parameters:
+            image_size, bounds, formula, c, max_iter, escape_radius, exp_smoothing, backend,
+            interior_check, periodicity, rows: see engine.render
+            precision: 'float32' or 'float64', see engine.escape_time
+            progress: optional callable, called as progress(pixels_done, total_pixels)
+            stats: optional dict (see engine.new_stats); the points filled without being iterated are
+                added to its 'filled' counter
+            min_size: rectangles whose inside is smaller than this (in pixels, either side) aren't split
+                any further, their inside is computed
+            fill_escaped: also fill rectangles whose border escapes at one iteration count (see the module docstring)
+
+        Returns an EscapeResult of (height, width) arrays, like engine.render
+    '''
+    formula = get_formula(formula)
+    width = image_size[0]
+    start, stop = (0, image_size[1]) if rows is None else rows
+    height = stop - start
+    x_min, x_max, y_min, y_max = bounds
+    x_size = (x_max - x_min)/image_size[0]
+    y_size = (y_max - y_min)/image_size[1]
+    grid = (x_min, x_size, y_min, y_size)
+
+    fields = [np.zeros((height, width), dtype=np.int32), np.zeros((height, width), dtype=np.float64),
+              np.zeros((height, width), dtype=np.float64) if exp_smoothing else None]
+    options = dict(max_iter=max_iter, escape_radius=escape_radius, exp_smoothing=exp_smoothing, backend=backend,
+                   interior_check=interior_check, periodicity=periodicity, precision=precision)
+    counts = new_stats()
+    counts['filled'] = 0
+    known = np.zeros((height, width), dtype=bool)
+    wanted = np.zeros(height * width, dtype=bool)
+    iterations = fields[0]
+    done = 0
+
+    def compute(ys, xs):
+        # borders of neighbouring rectangles overlap: only compute each pixel once, and only if it isn't known
+        nonlocal done
+        wanted[ys * width + xs] = True
+        wanted[known.ravel()] = False
+        flat = np.flatnonzero(wanted)
+        wanted[flat] = False
+        ys, xs = flat // width, flat % width
+        _evaluate(ys, xs, start, fields, grid, formula, c, options, counts)
+        known[ys, xs] = True
+        done += ys.size
+
+    # the rectangles of the current level, as arrays of their corners (inclusive)
+    y0, y1, x0, x1 = (np.array([value]) for value in (0, height - 1, 0, width - 1))
+    # insides of the rectangles too small to split, computed along with the next level's borders
+    leftover = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+    if height < 3 or width < 3:
+        y0 = y1 = x0 = x1 = np.zeros(0, dtype=np.int64)
+        leftover = tuple(np.indices((height, width)).reshape(2, -1))
+    while y0.size or leftover[0].size:
+        # every escape_time call iterates until its slowest point is done, so compute the borders of every
+        #   rectangle of this level, and what's left of the previous level, in one call
+        ys, xs, starts = _border(y0, y1, x0, x1)
+        compute(np.concatenate([ys, leftover[0]]), np.concatenate([xs, leftover[1]]))
+
+        leftover = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        if not y0.size:
+            break
+        border = iterations[ys, xs]
+        count = border[starts]
+        uniform = np.minimum.reduceat(border, starts) == np.maximum.reduceat(border, starts)
+        fill = uniform & ((count == max_iter) | fill_escaped)
+
+        # fill the uniform rectangles
+        rectangles = [a[fill] for a in (y0, y1, x0, x1)]
+        fill_ys, fill_xs, which = _inside(*rectangles)
+        corners = [a[which] for a in rectangles]
+        inside = count[fill][which] == max_iter
+        iterations[fill_ys, fill_xs] = count[fill][which]
+        for field in fields[1:]:
+            if field is None:
+                continue
+            # never escaped: no smooth value is used for these, the corner's is as good as any
+            field[fill_ys[inside], fill_xs[inside]] = field[corners[0][inside], corners[2][inside]]
+            if fill_escaped:
+                _fill_smooth(field, fill_ys[~inside], fill_xs[~inside], *(a[~inside] for a in corners))
+        known[fill_ys, fill_xs] = True
+        counts['filled'] += fill_ys.size
+        done += fill_ys.size
+
+        # compute the inside of small rectangles, split the others in four
+        rest = ~fill & (y1 - y0 > 1) & (x1 - x0 > 1)
+        small = rest & ((y1 - y0 - 1 <= min_size) | (x1 - x0 - 1 <= min_size))
+        leftover = _inside(*(a[small] for a in (y0, y1, x0, x1)))[:2]
+        split = rest & ~small
+        y0, y1, x0, x1 = (a[split] for a in (y0, y1, x0, x1))
+        ym, xm = (y0 + y1) // 2, (x0 + x1) // 2
+        y0, y1, x0, x1 = (np.concatenate(parts) for parts in (
+            (y0, y0, ym, ym), (ym, ym, y1, y1), (x0, xm, x0, xm), (xm, x1, xm, x1)))
+
+        if progress is not None:
+            progress(done, width * height)
+
+    if stats is not None:
+        merge_stats(stats, counts)
+    return EscapeResult(*fields)
+
@@ -0,0 +1,117 @@
+# antialias.py
+"""
+Adaptive supersampling anti-aliasing.
+
+Filaments and the edges of color bands alias badly with one sample per pixel. Rendering the image 4 or 16 times
+bigger and scaling it down fixes that, but multiplies the cost over the whole image, while most pixels sit in a
+smooth gradient or inside the set, where extra samples change nothing. So instead:
+    - render and color the image with one sample per pixel, as usual
+    - pick the pixels whose color differs strongly from one of their 8 neighbours
+    - render samples x samples jittered points inside each of those pixels only, color them, and replace the
+      pixel with the average of their colors (accumulated in a float buffer, rounded once at the end)
+
+Pixels are compared by color rather than by iteration count because the colors are what aliases: a big jump in
+the smooth value can land on the same color when the palette wraps around, and the edge of the set is a jump
+to the background whatever the counts are.
+
+benchmarks/bench_antialias.py compares the time and the result against brute-force supersampling.
+"""
+
+from decimal import Decimal, localcontext
+
+import numpy as np
+
+from engine import escape_time, merge_stats, new_stats
+from formulas import get_formula
+from precision import DoubleDouble, resolve_precision
+
+
+def edge_pixels(rgb, threshold=32):
+    '''Pixels whose color differs from one of their 8 neighbours by more than threshold in any channel.'''
+    rgb = rgb.astype(np.int16)
+    height, width = rgb.shape[:2]
+    edges = np.zeros((height, width), dtype=bool)
+    # compare each pixel with its right, lower, lower right and lower left neighbour, and mark both ends
+    for dy, dx in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        a = rgb[:height - dy, max(0, -dx):width - max(0, dx)]
+        b = rgb[dy:, max(0, dx):width + min(0, dx)]
+        differ = np.abs(a - b).max(axis=-1) > threshold
+        edges[:height - dy, max(0, -dx):width - max(0, dx)] |= differ
+        edges[dy:, max(0, dx):width + min(0, dx)] |= differ
+    return edges
+
+
+def supersample_edges(rgb, image_size, bounds, color, formula='mandelbrot', c=None, max_iter=250,
+                      escape_radius=None, exp_smoothing=False, samples=4, threshold=32, backend='numpy',
+                      interior_check=None, periodicity=None, stats=None, seed=0, batch=2**20, precision=None):
+    '''
+    Supersample the high-contrast pixels of an image rendered with one sample per pixel.
+
+        Parameters:
+            rgb: the (height, width, 3) uint8 image, rendered at image_size and bounds
+            color: callable turning an EscapeResult (of any shape) into uint8 colors, e.g.
+                lambda result: color_field(result, max_iter, 'exp', 0.41, 20)
+            formula, c, max_iter, escape_radius, exp_smoothing, backend, interior_check, periodicity, precision:
+                see engine.render; they have to be the ones rgb was rendered with
+            samples: each refined pixel gets samples x samples jittered samples
+            threshold: a pixel is refined if its color differs from a neighbour's by more than this (0-255)
+            stats: optional dict (see engine.new_stats); the number of refined pixels is added to its
+                'antialiased' counter and the extra samples to 'samples'
+            seed: seed of the jitter, so the same image comes out every time
+            batch: most points to iterate at once
+
+        Returns the anti-aliased image, a new (height, width, 3) uint8 array
+    '''
+    formula = get_formula(formula)
+    if interior_check is None:
+        interior_check = formula.interior_check
+    if periodicity is None:
+        periodicity = formula.periodicity
+    # samples are iterated in the precision rgb was rendered in, or they couldn't tell the pixel's corners apart
+    precision = resolve_precision(precision, image_size, bounds, formula, backend)
+    width, height = image_size
+    if precision == 'double-double':
+        # the corner keeps every digit of the bounds, the offsets from it only need float64
+        #   (as in precision.double_double_grid)
+        x_min, x_max, y_min, y_max = (Decimal(value) for value in bounds)
+        with localcontext() as context:
+            context.prec = 60
+            x_size = float((x_max - x_min)/width)
+            y_size = float((y_max - y_min)/height)
+        x_min, y_min = DoubleDouble.from_decimal(x_min), DoubleDouble.from_decimal(y_min)
+    else:
+        x_min, x_max, y_min, y_max = (float(value) for value in bounds)
+        x_size = (x_max - x_min)/width
+        y_size = (y_max - y_min)/height
+
+    ys, xs = np.nonzero(edge_pixels(rgb, threshold))
+    counts = new_stats()
+    counts['antialiased'] = ys.size
+    counts['samples'] = ys.size * samples * samples
+
+    # a stratified grid of samples x samples cells per pixel, one random point in each cell
+    #   (pixel (x, y) covers [x, x + 1) x [y, y + 1) in pixel units, its single sample was at the corner)
+    random = np.random.default_rng(seed)
+    cells = (np.arange(samples * samples) // samples, np.arange(samples * samples) % samples)
+    total = np.zeros((ys.size, 3), dtype=np.float64)
+    pixels_per_batch = max(1, batch // (samples * samples))
+    for start in range(0, ys.size, pixels_per_batch):
+        y, x = ys[start:start + pixels_per_batch, None], xs[start:start + pixels_per_batch, None]
+        jitter = random.random((2, y.size, samples * samples))
+        points = ((x_min + (x + (cells[1] + jitter[0]) / samples) * x_size).ravel(),
+                  (y_min + (y + (cells[0] + jitter[1]) / samples) * y_size).ravel())
+        options = dict(max_iter=max_iter, escape_radius=escape_radius, exp_smoothing=exp_smoothing,
+                       backend=backend, interior_check=interior_check, periodicity=periodicity, stats=counts,
+                       precision=precision)
+        if formula.parameter_plane:
+            z = tuple(np.full(points[0].shape, value) for value in formula.critical_point)
+            result = escape_time(z, points, formula, **options)
+        else:
+            result = escape_time(points, c, formula, **options)
+        total[start:start + y.size] = color(result).reshape(y.size, samples * samples, 3).mean(axis=1)
+
+    rgb = rgb.copy()
+    rgb[ys, xs] = np.round(total).astype(np.uint8)
+    if stats is not None:
+        merge_stats(stats, counts)
+    return rgb
@@ -0,0 +1,151 @@
+# atlas.py
+"""
+Julia set atlas: a mosaic of thousands of small julia sets, one for every c = a + ib on a grid over a region
+of the c-plane, to find (a, b) values worth rendering at full size with generate_julia.
+
+All the thumbnails are iterated together: the starting points of one thumbnail are repeated for every c, and
+c is spread along the extra dimension, so a batch of a few thousand thumbnails is one call to the engine. Batches
+are spread over a process pool.
+
+Laid out on the grid, the thumbnails redraw the mandelbrot set (connected julia sets are the c inside it), which
+overlay=True makes visible by blending the mandelbrot set of the same region over the mosaic.
+
+    python atlas.py                     # generated_images/atlas.png and generated_images/atlas.json
+
+The index (atlas.json) has the region, grid and thumbnail size, and the (a, b) of every thumbnail; thumbnail_at
+turns a pixel of the mosaic back into its (a, b).
+"""
+
+import json
+
+import numpy as np
+
+from engine import complex_bounds, complex_grid, escape_time, render
+from coloring import color_field
+
+
+def atlas_c(region, grid):
+    '''
+    The c of every thumbnail, as (a, b) arrays of shape (rows, columns).
+    region: (a_min, a_max, b_min, b_max); grid: (columns, rows). Thumbnails sample the middle of their cell.
+    '''
+    a_min, a_max, b_min, b_max = region
+    columns, rows = grid
+    a = a_min + (np.arange(columns) + 0.5) * (a_max - a_min) / columns
+    b = b_min + (np.arange(rows) + 0.5) * (b_max - b_min) / rows
+    return np.meshgrid(a, b)
+
+
+def _render_thumbnails(task):
+    # one batch of thumbnails: the starting grid repeated for every c, c along the first axis
+    a, b, thumbnail_size, view, max_iter, initial_color_hue, color_scale, palette, backend = task
+    zr, zi = complex_grid(thumbnail_size, view)
+    shape = (a.size,) + zr.shape
+    z = (np.broadcast_to(zr, shape).ravel(), np.broadcast_to(zi, shape).ravel())
+    c = (np.broadcast_to(a[:, None, None], shape).ravel(), np.broadcast_to(b[:, None, None], shape).ravel())
+    stats = {}
+    # float64, the precision engine.render picks for views this shallow, so that a thumbnail is pixel for pixel
+    #   the render of its c
+    result = escape_time(z, c, 'julia', max_iter, exp_smoothing=True, backend=backend, periodicity=True,
+                         precision='float64', stats=stats)
+    rgb = color_field(result, max_iter, 'exp', initial_color_hue, color_scale, palette)
+    return rgb.reshape(shape + (3,)), stats
+
+
+def render_atlas(region=(-2, 0.6, -1.2, 1.2), grid=(64, 64), thumbnail_size=(32, 32), max_iter=100,
+                 view=None, initial_color_hue=0.41, color_scale=20, palette='hsv', overlay=False,
+                 overlay_strength=0.35, batch=2**20, workers=1, backend='numpy', stats=None):
+    '''
+    Render a mosaic of julia set thumbnails.
+
+        Parameters:
+            region: (a_min, a_max, b_min, b_max) of the c-plane to cover
+            grid: (columns, rows) of thumbnails; thumbnail (row, column) is c = atlas_c(region, grid)[.][row, column]
+            thumbnail_size: size of a thumbnail in pixels
+            max_iter: number of iterations to run on a pixel
+            view: bounds (see engine.complex_bounds) of the z-plane every thumbnail shows.
+                Defaults to a square from -1.8 to 1.8, which frames most julia sets.
+            initial_color_hue, color_scale, palette: colors, as for generate_julia
+            overlay: blend the mandelbrot set of the region over the mosaic
+            overlay_strength: how much of the overlay shows, between 0 and 1
+            batch: about how many pixels to iterate at once
+            workers: number of processes (None uses every core)
+            backend: 'numpy' or 'numba' (see engine.render)
+            stats: optional dict (see engine.new_stats) that the counters are added to
+
+        Returns (mosaic, index): the (rows * height, columns * width, 3) uint8 mosaic and the index dict
+    '''
+    columns, rows = grid
+    width, height = thumbnail_size
+    if view is None:
+        view = complex_bounds((0, 0), 1, 1.8, width / height)
+    a, b = atlas_c(region, grid)
+    a, b = a.ravel(), b.ravel()
+
+    per_batch = max(1, batch // (width * height))
+    tasks = [(a[start:start + per_batch], b[start:start + per_batch], thumbnail_size, view, max_iter,
+              initial_color_hue, color_scale, palette, backend) for start in range(0, a.size, per_batch)]
+    if workers == 1 or len(tasks) == 1:
+        results = map(_render_thumbnails, tasks)
+        pool = None
+    else:
+        from parallel import new_pool
+        pool = new_pool(workers)
+        results = pool.imap(_render_thumbnails, tasks)
+    try:
+        thumbnails = []
+        for rgb, counts in results:
+            thumbnails.append(rgb)
+            if stats is not None:
+                for key, value in counts.items():
+                    stats[key] = stats.get(key, 0) + value
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    # (rows * columns, height, width, 3) -> (rows * height, columns * width, 3)
+    mosaic = np.concatenate(thumbnails).reshape(rows, columns, height, width, 3)
+    mosaic = mosaic.transpose(0, 2, 1, 3, 4).reshape(rows * height, columns * width, 3)
+
+    if overlay:
+        # pixel centers of the mosaic, like atlas_c's thumbnail centers
+        a_min, a_max, b_min, b_max = region
+        shift_a = (a_max - a_min) / (columns * width) / 2
+        shift_b = (b_max - b_min) / (rows * height) / 2
+        mandelbrot = render((columns * width, rows * height),
+                            (a_min + shift_a, a_max + shift_a, b_min + shift_b, b_max + shift_b),
+                            'mandelbrot', max_iter=max_iter, backend=backend, precision='float64')
+        shade = color_field(mandelbrot, max_iter, palette='grayscale', background=(255, 255, 255))
+        mosaic = np.round(mosaic * (1 - overlay_strength) + shade * overlay_strength).astype(np.uint8)
+
+    index = dict(region=list(region), grid=list(grid), thumbnail_size=list(thumbnail_size), view=list(view),
+                 max_iter=max_iter, thumbnails=[dict(row=int(i // columns), column=int(i % columns),
+                                                     a=float(a[i]), b=float(b[i])) for i in range(a.size)])
+    return mosaic, index
+
+
+def thumbnail_at(index, x, y):
+    '''(a, b) of the thumbnail under pixel (x, y) of a mosaic, given its index.'''
+    width, height = index['thumbnail_size']
+    columns = index['grid'][0]
+    thumbnail = index['thumbnails'][(y // height) * columns + x // width]
+    return thumbnail['a'], thumbnail['b']
+
+
+def save_atlas(mosaic, index, name):
+    '''Save the mosaic as name.png and the index as name.json.'''
+    from PIL import Image
+    Image.fromarray(mosaic).save(name + '.png')
+    with open(name + '.json', 'w') as file:
+        json.dump(index, file)
+
+
+if __name__=="__main__":
+    from time import perf_counter
+    start = perf_counter()
+    mosaic, index = render_atlas(grid=(96, 96), overlay=True, workers=None)
+    seconds = perf_counter() - start
+    save_atlas(mosaic, index, 'generated_images/atlas')
+    print(f"{len(index['thumbnails'])} thumbnails in {seconds:.2f}s "
+          f"({len(index['thumbnails']) / seconds:.0f} per second), saved as generated_images/atlas.png")
@@ -0,0 +1,251 @@
+# batch.py
+"""
+Batch runner for parameter sweeps.
+
+Instead of editing the __main__ block of a generator and bumping job by hand, describe the images in a manifest
+(YAML or JSON) and let the runner render them across a process pool:
+
+    generator: julia              # or mandelbrot
+    directory: generated_images/sweep
+    index: index.jsonl            # results index in directory, .jsonl or .csv
+    first_job: 1                  # job number of the first image, they are numbered in order
+    defaults:                     # keyword arguments of the generator shared by every job
+        max_iter: 250
+        image_size: [960, 540]
+    grid:                         # every combination of these
+        a: [-0.834, 0.359]
+        b: [-0.171, 0.348]
+        initial_color_hue: [0.41]
+        color_scale: [10, 20]
+    jobs:                         # and/or jobs listed one by one, after the grid
+        - {a: -0.8, b: 0.156, initial_color_hue: 0.5, color_scale: 20}
+
+    python batch.py sweep.yaml -w 4
+
+Jobs whose image is already there are skipped, so an interrupted run picks up where it stopped when started
+again (job numbers come from the manifest, so they are the same every run); images are renamed into place once
+completely written (see image_writer.py), so one cut off mid-write is rendered again. Every finished job is appended to
+the index as soon as its image is written, with its render time, the process that ran it and the engine's counters
+(points, iterations, iterations saved, ...).
+
+Every worker imports the engine once when it starts, and with backend 'numba' compiles the kernels once by
+rendering a tiny image, so none of that is paid again per job.
+"""
+
+import argparse
+from collections import deque
+import csv
+from itertools import product
+import json
+import os
+from time import perf_counter
+
+
+# generator name: (module, function, function giving the file name an image is saved under)
+GENERATORS = {
+    'mandelbrot': ('mandelbrot', 'generate_mandelbrot_zoom', 'mandelbrot_save_name'),
+    'julia': ('julia', 'generate_julia', 'julia_save_name'),
+}
+
+# columns of a .csv index; a .jsonl index keeps everything
+INDEX_FIELDS = ['job', 'generator', 'output', 'seconds', 'pid', 'points', 'iterations', 'iterations_saved',
+                'interior_skipped', 'periodic', 'mirrored', 'filled', 'params']
+
+# the generator, imported once per worker by _warm
+_worker = {}
+
+
+def load_manifest(path):
+    '''Read a manifest from a .yaml/.yml (needs PyYAML) or .json file.'''
+    with open(path) as file:
+        if path.lower().endswith(('.yaml', '.yml')):
+            import yaml
+            return yaml.safe_load(file)
+        return json.load(file)
+
+
+def expand_grid(grid):
+    '''Every combination of a grid of {parameter: list of values}, as a list of {parameter: value} dicts.'''
+    if not grid:
+        return []
+    names = list(grid)
+    values = [value if isinstance(value, (list, tuple)) else [value] for value in grid.values()]
+    return [dict(zip(names, combination)) for combination in product(*values)]
+
+
+def _arguments(params):
+    # YAML and JSON only have lists: the generators want tuples for these
+    return {name: tuple(value) if name in ('image_size', 'center_point') and isinstance(value, list) else value
+            for name, value in params.items()}
+
+
+def manifest_jobs(manifest):
+    '''
+    The jobs of a manifest, in order, as dicts of
+        job: job number, generator: generator name, params: keyword arguments of the generator,
+        output: file the image is saved to
+    '''
+    generator = manifest.get('generator', 'julia')
+    if generator not in GENERATORS:
+        raise ValueError(f"unknown generator {generator!r}, expected one of {', '.join(GENERATORS)}")
+    directory = manifest.get('directory', 'generated_images')
+    module, _, save_name = GENERATORS[generator]
+    save_name = getattr(__import__(module), save_name)
+
+    jobs = []
+    entries = expand_grid(manifest.get('grid')) + list(manifest.get('jobs') or [])
+    for number, entry in enumerate(entries, manifest.get('first_job', 1)):
+        params = _arguments({**manifest.get('defaults', {}), **entry})
+        number = params.pop('job', number)
+        for name in ('directory', 'image_save', 'verbose', 'stats'):
+            params.pop(name, None)
+        names = dict(initial_color_hue=params.get('initial_color_hue', 0.5), color_scale=params.get('color_scale', 10),
+                     job=number, image_format=params.get('image_format', '.png'))
+        if generator == 'julia':
+            names.update(a=params['a'], b=params['b'])
+        jobs.append(dict(job=number, generator=generator, params=params,
+                         output=os.path.join(directory, save_name(**names))))
+    return jobs
+
+
+def _warm(generator, backends, pooled=False):
+    # runs once in every worker (pooled) or in this process: import the generator (and with it the engine),
+    #   compile the numba kernels
+    from importlib import import_module
+    module, function, _ = GENERATORS[generator]
+    _worker['generate'] = getattr(import_module(module), function)
+    if 'numba' in backends:
+        from engine import complex_bounds, render
+        if pooled:
+            try:
+                import numba
+                # the pool already runs one process per core; rendering in this process keeps numba's threads
+                numba.set_num_threads(1)
+            except ImportError:
+                pass
+        formula, c = ('mandelbrot', None) if generator == 'mandelbrot' else ('julia', (-0.8, 0.156))
+        render((8, 8), complex_bounds(), formula, c, 10, exp_smoothing=generator == 'julia', backend='numba')
+
+
+def _run(job, writer=None):
+    # runs in a worker: render and save one image, return its index record. With a writer, the image is queued
+    #   on it instead, and the future of its save is returned with the record
+    stats = {}
+    start = perf_counter()
+    image = _worker['generate'](**job['params'], job=job['job'], directory=os.path.dirname(job['output']) or None,
+                                image_save=writer is None, verbose=False, stats=stats, writer=writer)
+    record = dict(job=job['job'], generator=job['generator'], output=job['output'],
+                  seconds=round(perf_counter() - start, 4), pid=os.getpid(), **stats, params=job['params'])
+    if writer is None:
+        return record
+    return record, writer.submit(job['output'], image)
+
+
+def _saved(results):
+    # the records of (record, future) pairs, in order, each once its image is written (raising if it failed),
+    #   so that the index never lists an image that isn't there
+    waiting = deque()
+    for result in results:
+        waiting.append(result)
+        while waiting and waiting[0][1].done():
+            record, saved = waiting.popleft()
+            saved.result()
+            yield record
+    for record, saved in waiting:
+        saved.result()
+        yield record
+
+
+def _write_record(path, record):
+    # append one finished job to the index, writing the csv header if the file is new
+    if path.lower().endswith('.csv'):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        with open(path, 'a', newline='') as file:
+            writer = csv.DictWriter(file, INDEX_FIELDS, extrasaction='ignore')
+            if new:
+                writer.writeheader()
+            writer.writerow({**record, 'params': json.dumps(record['params'])})
+    else:
+        with open(path, 'a') as file:
+            file.write(json.dumps(record) + '\n')
+
+
+def run_batch(manifest, workers=None, force=False, verbose=True):
+    '''
+    Render every job of a manifest that hasn't been rendered yet.
+
+        Parameters:
+            manifest: a manifest dict, or the file name of one (see the module docstring)
+            workers: number of processes (None uses every core). 1 renders in this process.
+            force: render jobs whose image already exists too
+            verbose: print a line for every finished job
+
+        Returns the index records of the jobs rendered by this call
+    '''
+    if isinstance(manifest, str):
+        manifest = load_manifest(manifest)
+    generator = manifest.get('generator', 'julia')
+    directory = manifest.get('directory', 'generated_images')
+    index = os.path.join(directory, manifest.get('index', 'index.jsonl'))
+    os.makedirs(directory, exist_ok=True)
+
+    jobs = manifest_jobs(manifest)
+    pending = [job for job in jobs if force or not os.path.exists(job['output'])]
+    if verbose: print(f'{len(jobs)} jobs, {len(jobs) - len(pending)} already done, {len(pending)} to render')
+    backends = sorted({job['params'].get('backend', 'numpy') for job in pending})
+
+    records = []
+    start = perf_counter()
+    pool = writer = None
+    try:
+        if workers == 1 or len(pending) <= 1:
+            from image_writer import ImageWriter
+            _warm(generator, backends)
+            # in one process, encode and save each image while the next one renders
+            writer = ImageWriter()
+            results = _saved(_run(job, writer) for job in pending)
+        else:
+            from parallel import new_pool
+            pool = new_pool(workers, _warm, (generator, backends, True))
+            results = pool.imap_unordered(_run, pending)
+        for record in results:
+            _write_record(index, record)
+            records.append(record)
+            if verbose:
+                print(f"[{len(records)}/{len(pending)}] {record['output']}: {record['seconds']:.2f} s, "
+                      f"{record.get('iterations', 0):,} iterations")
+        if writer is not None:
+            writer.close()
+    except BaseException:
+        # wait for the images already queued, but raise the error that stopped the batch, not a failed write
+        if writer is not None:
+            try:
+                writer.close()
+            except Exception:
+                pass
+        raise
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if verbose and records:
+        busy = sum(record['seconds'] for record in records)
+        print(f'rendered {len(records)} images in {perf_counter() - start:.2f} s '
+              f'({busy:.2f} s of rendering), index: {index}')
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Render every image of a manifest, skipping finished ones.')
+    parser.add_argument('manifest', help='YAML or JSON manifest')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='processes (default: every core)')
+    parser.add_argument('-f', '--force', action='store_true', help='render images that already exist again')
+    parser.add_argument('-n', '--dry-run', action='store_true', help='list the jobs and whether they are done')
+    args = parser.parse_args()
+
+    if args.dry_run:
+        for job in manifest_jobs(load_manifest(args.manifest)):
+            print('done   ' if os.path.exists(job['output']) else 'pending', job['output'])
+    else:
+        run_batch(args.manifest, args.workers, args.force)
@@ -0,0 +1,73 @@
+# bench_adaptive.py
+"""
+Adaptive subdivision against the full render: time both, count the pixels that were filled in without being
+iterated, and check the images match.
+
+Run from the top of the repository:
+    python benchmarks/bench_adaptive.py [--size 960x540] [--max-iter 1000]
+"""
+
+import argparse
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import complex_bounds, render, new_stats
+from coloring import color_field
+
+
+def scenes():
+    '''(name, formula, bounds, c, coloring style) for each benchmark scene.'''
+    return [
+        ('mandelbrot', 'mandelbrot', complex_bounds((-0.5, 0), 1.5), None, 'smooth'),
+        ('mandelbrot seahorse x50', 'mandelbrot', complex_bounds((-0.745, 0.11), 50), None, 'smooth'),
+        ('julia a=-0.12 b=0.75', 'julia', complex_bounds((0, 0), 1), (-0.12, 0.75), 'exp'),
+        ('julia a=-0.834 b=-0.171', 'julia', complex_bounds((0, 0), 1), (-0.834, -0.171), 'exp'),
+    ]
+
+
+def benchmark(image_size=(960, 540), max_iter=1000, adaptive=True, checks=True, backend='numpy'):
+    '''Returns True if every adaptive image matched the full render.'''
+    print(f'image size {image_size}, max_iter {max_iter}, adaptive={adaptive!r}, backend {backend}, '
+          f'interior/periodicity checks {"on" if checks else "off"}')
+    # None leaves the checks to the formula
+    options = dict(backend=backend, interior_check=None if checks else False, periodicity=None if checks else False)
+    all_same = True
+    for name, formula, bounds, c, style in scenes():
+        exp_smoothing = style == 'exp'
+        start = perf_counter()
+        full = render(image_size, bounds, formula, c, max_iter, exp_smoothing=exp_smoothing, **options)
+        full_time = perf_counter() - start
+
+        stats = new_stats()
+        start = perf_counter()
+        quick = render(image_size, bounds, formula, c, max_iter, exp_smoothing=exp_smoothing, stats=stats,
+                       adaptive=adaptive, **options)
+        quick_time = perf_counter() - start
+
+        wrong = np.count_nonzero(full.iterations != quick.iterations)
+        mismatched = np.count_nonzero((color_field(full, max_iter, style) !=
+                                       color_field(quick, max_iter, style)).any(axis=-1))
+        all_same = all_same and mismatched == 0
+        print(f'  {name:<26} {full_time:7.3f}s -> {quick_time:7.3f}s ({full_time / quick_time:4.1f}x), '
+              f'{stats["filled"] / (image_size[0] * image_size[1]):6.1%} of pixels skipped, '
+              f'{wrong} wrong iteration counts, {mismatched} mismatched pixels')
+    return all_same
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', default='960x540', help='image size, WIDTHxHEIGHT')
+    parser.add_argument('--max-iter', type=int, default=1000)
+    parser.add_argument('--escaped', action='store_true',
+                        help='also fill rectangles with one escape count (approximate smooth coloring)')
+    parser.add_argument('--no-checks', action='store_true',
+                        help='turn off the cardioid/bulb test and periodicity checking in both renders')
+    parser.add_argument('--backend', default='numpy')
+    args = parser.parse_args()
+    benchmark(tuple(int(n) for n in args.size.split('x')), args.max_iter, 'escaped' if args.escaped else True,
+              not args.no_checks, args.backend)
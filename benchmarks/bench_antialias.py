@@ -0,0 +1,92 @@
+# bench_antialias.py
+"""
+Adaptive supersampling against brute-force supersampling: time both, report the fraction of pixels refined,
+and how far each image (and the one sample per pixel image) is from the brute-force one.
+
+Run from the top of the repository:
+    python benchmarks/bench_antialias.py [--size 960x540] [--samples 4] [--threshold 32]
+"""
+
+import argparse
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import complex_bounds, render, new_stats
+from coloring import color_field
+from antialias import supersample_edges
+
+
+def scenes():
+    '''(name, formula, bounds, c, coloring style) for each benchmark scene.'''
+    return [
+        ('mandelbrot', 'mandelbrot', complex_bounds((-0.5, 0), 1.5), None, 'smooth'),
+        ('mandelbrot seahorse x50', 'mandelbrot', complex_bounds((-0.745, 0.11), 50), None, 'smooth'),
+        ('julia a=-0.12 b=0.75', 'julia', complex_bounds((0, 0), 1), (-0.12, 0.75), 'exp'),
+        ('julia a=-0.834 b=-0.171', 'julia', complex_bounds((0, 0), 1), (-0.834, -0.171), 'exp'),
+    ]
+
+
+def error(image, reference):
+    # mean absolute difference per channel, and the share of pixels off by more than 16 in some channel
+    difference = np.abs(image.astype(np.int16) - reference.astype(np.int16))
+    return difference.mean(), np.mean(difference.max(axis=-1) > 16)
+
+
+def benchmark(image_size=(960, 540), max_iter=250, samples=4, threshold=32, backend='numpy'):
+    print(f'image size {image_size}, max_iter {max_iter}, {samples}x{samples} samples, threshold {threshold}, '
+          f'backend {backend}')
+    width, height = image_size
+    if backend == 'numba':
+        # compile the kernels before timing anything
+        for _, formula, bounds, c, style in scenes():
+            result = render((8, 8), bounds, formula, c, 10, exp_smoothing=style == 'exp', backend=backend)
+            supersample_edges(color_field(result, 10), (8, 8), bounds, lambda result: color_field(result, 10),
+                              formula, c, 10, exp_smoothing=style == 'exp', threshold=-1, backend=backend)
+    for name, formula, bounds, c, style in scenes():
+        exp_smoothing = style == 'exp'
+        if style == 'exp':
+            color = lambda result: color_field(result, max_iter, 'exp', 0.41, 20)
+        else:
+            color = lambda result: color_field(result, max_iter)
+
+        start = perf_counter()
+        single = color(render(image_size, bounds, formula, c, max_iter, exp_smoothing=exp_smoothing,
+                              backend=backend))
+        single_time = perf_counter() - start
+        stats = new_stats()
+        adaptive = supersample_edges(single, image_size, bounds, color, formula, c, max_iter,
+                                     exp_smoothing=exp_smoothing, samples=samples, threshold=threshold,
+                                     backend=backend, stats=stats)
+        adaptive_time = perf_counter() - start
+
+        # every pixel samples x samples times, on a regular grid, averaged
+        start = perf_counter()
+        big = color(render((width * samples, height * samples), bounds, formula, c, max_iter,
+                           exp_smoothing=exp_smoothing, backend=backend))
+        brute = np.round(big.reshape(height, samples, width, samples, 3).mean(axis=(1, 3))).astype(np.uint8)
+        brute_time = perf_counter() - start
+
+        single_error, single_off = error(single, brute)
+        adaptive_error, adaptive_off = error(adaptive, brute)
+        print(f'  {name:<26} {stats["antialiased"] / (width * height):6.1%} of pixels refined; '
+              f'adaptive {adaptive_time:6.2f}s, brute force {brute_time:6.2f}s ({brute_time / adaptive_time:4.1f}x), '
+              f'1 sample {single_time:5.2f}s')
+        print(f'  {"":<26} difference from brute force: 1 sample {single_error:5.2f} ({single_off:5.1%} of pixels '
+              f'off by >16), adaptive {adaptive_error:5.2f} ({adaptive_off:5.1%})')
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', default='960x540', help='image size, WIDTHxHEIGHT')
+    parser.add_argument('--max-iter', type=int, default=250)
+    parser.add_argument('--samples', type=int, default=4, help='samples per side of a pixel')
+    parser.add_argument('--threshold', type=int, default=32, help='color difference that gets a pixel refined')
+    parser.add_argument('--backend', default='numpy')
+    args = parser.parse_args()
+    benchmark(tuple(int(n) for n in args.size.split('x')), args.max_iter, args.samples, args.threshold,
+              args.backend)
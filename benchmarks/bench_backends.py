@@ -0,0 +1,91 @@
+# bench_backends.py
+"""
+Compare the pure Python loop, the numpy engine and the compiled numba kernels at increasing max_iter.
+
+Run from the top of the repository:
+    python benchmarks/bench_backends.py [--size 160x90] [--skip-python]
+
+The numba kernels are compiled once before timing; the compile time is reported separately.
+"""
+
+import argparse
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from legacy import legacy_mandelbrot, legacy_julia, legacy_fractal
+from engine import complex_bounds, render
+
+
+def scenes(image_size, max_iter):
+    '''(name, legacy render, engine render) for the three iterations, at the same viewport.'''
+    mandelbrot_bounds = complex_bounds((-0.5, 0), 1.5)
+    julia_bounds = complex_bounds((0, 0), 1)
+    exotic_bounds = complex_bounds((0.01, 0.01), 1)
+    return [
+        ('mandelbrot z^2 + c',
+         lambda: legacy_mandelbrot(1.5, max_iter, (-0.5, 0), image_size),
+         lambda backend: render(image_size, mandelbrot_bounds, 'mandelbrot', max_iter=max_iter,
+                                backend=backend, precision='float64')),
+        ('julia z^2 + c',
+         lambda: legacy_julia(-0.834, -0.171, 0.41, 20, 1, (0, 0), max_iter, image_size),
+         lambda backend: render(image_size, julia_bounds, 'julia', (-0.834, -0.171), max_iter,
+                                exp_smoothing=True, backend=backend, precision='float64')),
+        ('exotic z^(1/z) + c',
+         lambda: legacy_fractal(-0.3, 0.5, 0.41, 10, 1, (0.01, 0.01), max_iter, image_size),
+         lambda backend: render(image_size, exotic_bounds, 'exotic', (-0.3, 0.5), max_iter,
+                                backend=backend, precision='float64')),
+    ]
+
+
+def time_call(function, *args):
+    start = perf_counter()
+    result = function(*args)
+    return result, perf_counter() - start
+
+
+def benchmark(image_size=(160, 90), max_iters=(250, 2000, 20000), skip_python=False):
+    try:
+        import numba_kernels  # noqa: F401
+        have_numba = True
+    except ImportError:
+        have_numba = False
+        print('numba is not installed, only timing python and numpy')
+
+    if have_numba:
+        start = perf_counter()
+        for _, _, engine in scenes((8, 8), 10):
+            engine('numba')
+        print(f'numba compile time: {perf_counter() - start:.2f}s')
+
+    print(f'image size {image_size}')
+    print(f'  {"scene":<22}{"max_iter":>9}{"python":>10}{"numpy":>10}{"numba":>10}  numba matches numpy')
+    for max_iter in max_iters:
+        for name, legacy, engine in scenes(image_size, max_iter):
+            python_time = None if skip_python else time_call(legacy)[1]
+            numpy_result, numpy_time = time_call(engine, 'numpy')
+            numba_time, same = None, ''
+            if have_numba:
+                numba_result, numba_time = time_call(engine, 'numba')
+                # iteration counts must match exactly; exp() differs in the last bit between numpy's
+                #   SIMD implementation and libm, so the float fields are compared to 1e-12
+                same = np.array_equal(numpy_result.iterations, numba_result.iterations) and \
+                    all(np.allclose(x, y, rtol=1e-12, equal_nan=True) for x, y in
+                        zip(numpy_result[1:], numba_result[1:]) if x is not None)
+
+            cells = ['-' if t is None else f'{t:.3f}s' for t in (python_time, numpy_time, numba_time)]
+            print(f'  {name:<22}{max_iter:>9}{cells[0]:>10}{cells[1]:>10}{cells[2]:>10}  {same}')
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', default='160x90', help='image size, WIDTHxHEIGHT')
+    parser.add_argument('--max-iter', type=int, nargs='+', default=[250, 2000, 20000])
+    parser.add_argument('--skip-python', action='store_true',
+                        help="don't time the pure Python loop (slow at high max_iter)")
+    args = parser.parse_args()
+    benchmark(tuple(int(n) for n in args.size.split('x')), args.max_iter, args.skip_python)
@@ -0,0 +1,83 @@
+# bench_buddhabrot.py
+"""
+Throughput of the orbit density renderer, in orbits (sampled c values) per second, and the checks behind it:
+    - uniform sampling of the whole Buddhabrot and a Nebulabrot, on 1 and on every core
+    - a zoomed view, sampled with Metropolis-Hastings and uniformly for about the same time, each compared
+      with a long uniform run: Metropolis-Hastings spends its orbits where the view is
+    - checkpointing: a run stopped halfway and resumed gives the same histogram as one straight through
+
+Run from the top of the repository:
+    python benchmarks/bench_buddhabrot.py [--samples 2000000] [--workers 4]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import complex_bounds
+from buddhabrot import render_buddhabrot
+
+
+def timed(**options):
+    stats = {}
+    start = perf_counter()
+    histogram = render_buddhabrot(stats=stats, **options)
+    seconds = perf_counter() - start
+    return histogram, stats, seconds
+
+
+def error(histogram, reference):
+    '''Relative L1 distance between two histograms, each normalized to sum to 1.'''
+    return np.abs(histogram / histogram.sum() - reference / reference.sum()).sum()
+
+
+def benchmark(samples=2 * 10**6, workers=None):
+    workers = workers or os.cpu_count() or 1
+    whole = complex_bounds((-0.4, 0), 1, 1.6, 1)
+    print(f'whole set, 400x400, {samples:,} samples')
+    for name, max_iter in (('buddhabrot', 1000), ('nebulabrot', (5000, 500, 50))):
+        for count in sorted({1, workers}):
+            _, stats, seconds = timed(image_size=(400, 400), bounds=whole, samples=samples, max_iter=max_iter,
+                                      workers=count, chunk=2**17)
+            print(f'  {name:<11} max_iter {str(max_iter):<16} {count:2} workers: {seconds:6.1f}s, '
+                  f'{stats["samples"] / seconds:10,.0f} orbits/s ({stats["orbits"]:,} escaped and traced, '
+                  f'{stats["interior_skipped"]:,} skipped by the cardioid/bulb test)')
+
+    zoomed = complex_bounds((0.0, 0.65), 100, 1.6, 1)
+    print('zoomed view at (0, 0.65), zoom 100, 20x20, max_iter 500 (0.04% of uniform orbits pass through it): '
+          'error against a 2^26 sample uniform run')
+    options = dict(image_size=(20, 20), bounds=zoomed, max_iter=500, workers=workers)
+    reference, _, seconds = timed(samples=2**26, chunk=2**20, **options)
+    print(f'  reference   {seconds:6.1f}s')
+    metropolis, stats, seconds = timed(samples=2**19, method='metropolis', **options)
+    print(f'  metropolis  {seconds:6.1f}s, {stats["samples"] / seconds:10,.0f} orbits/s, '
+          f'error {error(metropolis, reference):.3f} ({stats["accepted"] / stats["samples"]:.0%} of moves accepted)')
+    # uniform sampling for as long
+    _, stats, rate_seconds = timed(samples=2**20, **options)
+    uniform, stats, seconds = timed(samples=int(stats['samples'] / rate_seconds * seconds), **options)
+    print(f'  uniform     {seconds:6.1f}s, {stats["samples"] / seconds:10,.0f} orbits/s, '
+          f'error {error(uniform, reference):.3f}')
+
+    print('checkpointing: 8 chunks straight through, against 4 chunks, then resumed for the other 4')
+    with tempfile.TemporaryDirectory() as directory:
+        options = dict(image_size=(100, 100), bounds=whole, max_iter=200, chunk=2**15, method='metropolis',
+                       chains=512, workers=1)
+        straight = render_buddhabrot(samples=8 * 2**15, **options)
+        path = os.path.join(directory, 'run.npz')
+        render_buddhabrot(samples=4 * 2**15, checkpoint=path, **options)
+        resumed = render_buddhabrot(samples=8 * 2**15, checkpoint=path, **options)
+        print(f'  resumed run matches: {np.allclose(straight, resumed)}')
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--samples', type=int, default=2 * 10**6)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    benchmark(args.samples, args.workers)
@@ -0,0 +1,90 @@
+# bench_cli.py
+"""
+Latency of a small render from the command line: a new Python process every time, against the warm daemon.
+
+A cold `python cli.py julia ...` pays for starting Python, importing numpy, Pillow and the engine (and compiling
+the numba kernels, with --backend numba) before it renders anything; for small images that is most of the time.
+With `--daemon` the client only starts Python and parses its arguments, and a worker that did the imports when
+the daemon started renders. Also reported: how long `--help` takes (nothing past the standard library is
+imported), and the latency of a request made from inside a running Python process, which is what remains
+once the client's own startup is gone.
+
+Run from the top of the repository:
+    python benchmarks/bench_cli.py [--size 160x90] [--repeat 5] [--backend numpy]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cli import request
+
+
+def median_seconds(command, repeat):
+    '''Median wall time of running a command line, in seconds.'''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def benchmark(size='160x90', repeat=5, backend='numpy'):
+    cli = [sys.executable, os.path.join(ROOT, 'cli.py')]
+    render = ['julia', '--size', size, '--no-save', '-q', '--backend', backend]
+    print(f'julia set, {size}, {backend} backend, median of {repeat} runs')
+    print(f'  cli.py --help          {median_seconds(cli + ["--help"], repeat) * 1000:8.1f} ms')
+    print(f'  cold process           {median_seconds(cli + render, repeat) * 1000:8.1f} ms')
+
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, 'daemon.sock')
+        daemon = subprocess.Popen(cli + ['daemon', '--workers', '1', '--socket', socket_path],
+                                  stdout=subprocess.DEVNULL)
+        try:
+            start = time.perf_counter()
+            while True:
+                try:
+                    request({'command': 'ping'}, socket_path, timeout=5)
+                    break
+                except OSError:
+                    if daemon.poll() is not None:
+                        raise RuntimeError('the daemon exited')
+                    time.sleep(0.05)
+            print(f'  daemon startup         {(time.perf_counter() - start) * 1000:8.1f} ms (once)')
+            warm = cli + render + ['--daemon', '--socket', socket_path]
+            print(f'  warm daemon, via cli   {median_seconds(warm, repeat) * 1000:8.1f} ms')
+
+            options = dict(a=-0.834, b=-0.171, initial_color_hue=0.41, color_scale=20, max_iter=250,
+                           image_size=[int(n) for n in size.split('x')], image_save=False, backend=backend)
+            options['aspect_ratio'] = options['image_size'][0] / options['image_size'][1]
+            times, renders = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                reply = request({'command': 'julia', 'options': options}, socket_path)
+                times.append(time.perf_counter() - start)
+                renders.append(reply['seconds'])
+            print(f'  warm daemon, request   {statistics.median(times) * 1000:8.1f} ms '
+                  f'(of which rendering {statistics.median(renders) * 1000:.1f} ms)')
+        finally:
+            try:
+                request({'command': 'stop'}, socket_path, timeout=5)
+            except OSError:
+                daemon.terminate()
+            daemon.wait()
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', default='160x90', help='image size, WIDTHxHEIGHT')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--backend', default='numpy', choices=('numpy', 'numba'))
+    args = parser.parse_args()
+    benchmark(args.size, args.repeat, args.backend)
@@ -0,0 +1,62 @@
+# bench_coloring.py
+"""
+A hue/scale sweep of one julia set, the way testing_hue_scale and the job_8 images were made: every image rendered
+from scratch, against computing the escape data once and only coloring it again for every image.
+
+Run from the top of the repository:
+    python benchmarks/bench_coloring.py [--size 960x540] [--images 10]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import complex_bounds, render
+from coloring import color_field, save_field, load_field
+from julia import generate_julia
+
+
+def benchmark(image_size=(960, 540), images=10, max_iter=250):
+    rng = np.random.default_rng(0)
+    sweep = [(round(float(hue), 3), round(float(scale), 3))
+             for hue, scale in zip(rng.random(images), rng.random(images) * 10)]
+    a, b = -0.834, -0.171
+
+    start = perf_counter()
+    rendered = [np.asarray(generate_julia(a, b, hue, scale, max_iter=max_iter, image_size=image_size,
+                                          image_save=False, verbose=False))
+                for hue, scale in sweep]
+    render_time = perf_counter() - start
+
+    start = perf_counter()
+    result = render(image_size, complex_bounds(), 'julia', (a, b), max_iter, exp_smoothing=True)
+    compute_time = perf_counter() - start
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'field.npz')
+        save_field(path, result, a=a, b=b, max_iter=max_iter)
+        field_size = os.path.getsize(path)
+        result, _ = load_field(path)
+    start = perf_counter()
+    colored = [color_field(result, max_iter, 'exp', hue, scale) for hue, scale in sweep]
+    color_time = (perf_counter() - start) / images
+
+    same = all(np.array_equal(x, y) for x, y in zip(rendered, colored))
+    print(f'image size {image_size}, {images} hue/scale pairs, max_iter {max_iter}')
+    print(f'  rendering every image:     {render_time:7.3f}s')
+    print(f'  compute once + recolor:    {compute_time + color_time * images:7.3f}s '
+          f'({compute_time:.3f}s compute, {color_time * 1000:.1f}ms per coloring), same images: {same}')
+    print(f'  saved field: {field_size / 2**20:.1f} MiB')
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', default='960x540', help='image size, WIDTHxHEIGHT')
+    parser.add_argument('--images', type=int, default=10)
+    args = parser.parse_args()
+    benchmark(tuple(int(n) for n in args.size.split('x')), args.images)
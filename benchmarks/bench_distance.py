@@ -0,0 +1,76 @@
+# bench_distance.py
+"""
+Boundary detail against iteration budget: iteration-count coloring against distance estimate coloring.
+
+An iteration-count image only draws a filament of the set where its pixels don't escape within max_iter, so thin
+filaments need large budgets to show. Distance estimation draws every pixel within a pixel of the set, which only
+needs the filament's pixels to escape at all. For a view of filaments, this reports which fraction of the boundary
+pixels (pixels within a pixel of the set, from a distance estimate at a very high max_iter) each image draws,
+and how long it took.
+
+Run from the top of the repository:
+    python benchmarks/bench_distance.py [--size 960x540] [--save generated_images]
+"""
+
+import argparse
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import complex_bounds, render
+from coloring import color_field
+from distance import render_distance, pixel_size, distance_color, normal_shade
+
+
+# filaments off the seahorse valley
+CENTER = (-0.743643887, 0.131825904)
+ZOOM = 2000
+
+
+def benchmark(image_size=(960, 540), budgets=(100, 250, 1000, 4000), reference_iter=50000, save=None):
+    bounds = complex_bounds(CENTER, ZOOM, 2.3, image_size[0] / image_size[1])
+    pixel = pixel_size(image_size, bounds)
+    reference = render_distance(image_size, bounds, max_iter=reference_iter)
+    boundary = (reference.iterations >= reference_iter) | (reference.distance < pixel)
+    print(f'{image_size[0]}x{image_size[1]} around {CENTER} at zoom {ZOOM}: {boundary.sum()} boundary pixels '
+          f'(within a pixel of the set at max_iter {reference_iter})')
+    print(f'  {"max_iter":>8}  {"iteration count":^26}  {"distance estimate":^26}')
+    print(f'  {"":>8}  {"seconds":>8} {"boundary drawn":>17}  {"seconds":>8} {"boundary drawn":>17}')
+
+    for max_iter in budgets:
+        start = perf_counter()
+        result = render(image_size, bounds, 'mandelbrot', max_iter=max_iter)
+        counted = perf_counter() - start
+        # the set is what the image draws in the background color
+        drawn = result.iterations >= max_iter
+
+        start = perf_counter()
+        estimate = render_distance(image_size, bounds, max_iter=max_iter, skip_distance=4 * pixel)
+        estimated = perf_counter() - start
+        estimate_drawn = (estimate.iterations >= max_iter) | (estimate.distance < pixel)
+
+        print(f'  {max_iter:8}  {counted:8.3f} {(drawn & boundary).sum() / boundary.sum():17.1%}  '
+              f'{estimated:8.3f} {(estimate_drawn & boundary).sum() / boundary.sum():17.1%}'
+              f'   ({(estimate_drawn & ~boundary).sum()} pixels drawn that are not boundary)')
+
+        if save is not None:
+            from PIL import Image
+            rgb = np.concatenate([color_field(result, max_iter),
+                                  normal_shade(estimate, max_iter, base=distance_color(estimate, max_iter, pixel))],
+                                 axis=1)
+            path = os.path.join(save, f'distance_comparison_{max_iter}.png')
+            Image.fromarray(rgb).save(path)
+            print(f'            saved as {path} (iteration count on the left, distance estimate on the right)')
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', default='960x540', help='image size, WIDTHxHEIGHT')
+    parser.add_argument('--budgets', nargs='+', type=int, default=[100, 250, 1000, 4000])
+    parser.add_argument('--save', metavar='DIRECTORY', help='save side by side images of each budget there')
+    args = parser.parse_args()
+    benchmark(tuple(int(n) for n in args.size.split('x')), args.budgets, save=args.save)
@@ -0,0 +1,96 @@
+# bench_gif.py
+"""
+Peak memory of streaming an animation: write gifs of more and more frames, from a generator of rendered frames and
+from a directory of frame files, and check that the peak stays the same while the animation grows.
+
+Needs natsort to read directories of frames; without it this says so and exits.
+
+Run from the top of the repository:
+    python benchmarks/bench_gif.py [--size 320x180] [--frames 25 50 100 200]
+"""
+
+import argparse
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from coloring import color_field
+from engine import complex_bounds, render
+
+
+def frames(image_size, count, max_iter=100):
+    # the colored frames of a zoom into the seahorse valley, rendered as they are asked for. The zoom starts over
+    #   every 25 frames, so longer animations are made of the same frames and only the writer can make them cost more
+    for index in range(count):
+        bounds = complex_bounds((-0.743643887, 0.131825904), 1.2 ** (index % 25), 2.3, image_size[0] / image_size[1])
+        yield color_field(render(image_size, bounds, 'mandelbrot', max_iter=max_iter, precision='float64'), max_iter)
+
+
+def _measure(write):
+    # numpy reports its allocations to tracemalloc, so this is the peak of every array alive at once.
+    #   Pillow's gif writer leaves a little cyclic garbage per frame, which the next collection frees
+    gc.collect()
+    tracemalloc.start()
+    start = perf_counter()
+    count = write()
+    seconds = perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, peak, seconds
+
+
+def benchmark(image_size=(320, 180), counts=(25, 50, 100, 200)):
+    from gif import write_animation
+    from image_writer import write_image
+    from PIL import Image
+
+    frame_size = image_size[0] * image_size[1] * 3
+    print(f'{image_size[0]}x{image_size[1]} frames ({frame_size / 2**20:.2f} MiB each as RGB)')
+    directory = tempfile.mkdtemp()
+    try:
+        output = os.path.join(directory, 'zoom.gif')
+        # import the Pillow plugins before measuring anything
+        write_animation(frames(image_size, 2), output)
+        for source, palette in (('generator', False), ('generator', True), ('directory', False)):
+            peaks = []
+            for count in counts:
+                if source == 'generator':
+                    write = lambda: write_animation(frames(image_size, count), output, palette=palette)
+                else:
+                    folder = os.path.join(directory, f'frames_{count}')
+                    if not os.path.isdir(folder):
+                        os.makedirs(folder)
+                        for index, rgb in enumerate(frames(image_size, count)):
+                            write_image(os.path.join(folder, f'job_{index}.png'), rgb, compress_level=1)
+                    write = lambda: write_animation(folder, output)
+                written, peak, seconds = _measure(write)
+                with Image.open(output) as animation:
+                    assert written == animation.n_frames == count, (written, animation.n_frames, count)
+                peaks.append(peak)
+                print(f'  {source:<9}{" palette" if palette else "        "} {count:4} frames: peak '
+                      f'{peak / 2**20:6.2f} MiB (all frames as RGB: {count * frame_size / 2**20:7.2f} MiB), '
+                      f'{seconds:6.2f}s')
+            # flat: holding the frames would add a whole frame per frame, while only the list of file names grows
+            growth = (peaks[-1] - peaks[0]) / max(counts[-1] - counts[0], 1)
+            assert growth < frame_size / 20, f'{source}: peak grows by {growth / 1024:.1f} KiB a frame'
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', default='320x180', help='frame size, WIDTHxHEIGHT')
+    parser.add_argument('--frames', type=int, nargs='+', default=[25, 50, 100, 200], help='animation lengths')
+    args = parser.parse_args()
+    try:
+        import natsort
+    except ImportError:
+        print('skipped: natsort is not installed (pip install natsort)')
+        sys.exit(0)
+    benchmark(tuple(int(n) for n in args.size.split('x')), args.frames)
@@ -0,0 +1,77 @@
+# bench_image_writer.py
+"""
+Saving frames in the background: a zoom rendered and saved frame by frame, with every image saved before the next
+frame renders, and with an ImageWriter encoding and writing frames while the next one renders.
+
+Also the time and size of one frame in every format and PNG compression level. The overlap needs a core to
+encode on while the render runs on another: on a single core the two runs take about as long.
+
+Run from the top of the repository:
+    python benchmarks/bench_image_writer.py [--size 1920x1080] [--frames 12] [--max-iter 250]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import complex_bounds, render
+from coloring import color_field
+from image_writer import ImageWriter, write_image
+
+
+def frames(image_size, count, max_iter):
+    # the colored frames of a zoom into the seahorse valley, rendered one by one
+    for index in range(count):
+        bounds = complex_bounds((-0.743643887, 0.131825904), 1.5 ** index, 2.3, image_size[0] / image_size[1])
+        result = render(image_size, bounds, 'mandelbrot', max_iter=max_iter, precision='float64')
+        yield index, color_field(result, max_iter)
+
+
+def benchmark(image_size=(1920, 1080), count=12, max_iter=250):
+    print(f'{count} frames of {image_size[0]}x{image_size[1]}, max_iter {max_iter}, on {os.cpu_count()} cores')
+    with tempfile.TemporaryDirectory() as directory:
+        start = perf_counter()
+        for index, rgb in frames(image_size, count, max_iter):
+            pass
+        render_only = perf_counter() - start
+        print(f'  render only           {render_only:7.3f}s')
+
+        for compress_level in (6, 1):
+            start = perf_counter()
+            for index, rgb in frames(image_size, count, max_iter):
+                write_image(f'{directory}/job_{index}.png', rgb, compress_level=compress_level)
+            serial = perf_counter() - start
+            start = perf_counter()
+            with ImageWriter(compress_level=compress_level) as writer:
+                for index, rgb in frames(image_size, count, max_iter):
+                    writer.submit(f'{directory}/job_{index}.png', rgb)
+            pipelined = perf_counter() - start
+            print(f'  png level {compress_level}: saved in turn {serial:7.3f}s, '
+                  f'in the background {pipelined:7.3f}s ({serial / pipelined:.2f}x)')
+
+        print('  one frame:')
+        _, rgb = next(frames(image_size, 1, max_iter))
+        for name, extension, options in (
+                *((f'png level {level}', '.png', dict(compress_level=level)) for level in (0, 1, 6, 9)),
+                ('webp quality 80', '.webp', {}), ('webp lossless', '.webp', dict(lossless=True)),
+                ('npy', '.npy', {})):
+            path = f'{directory}/frame{extension}'
+            runs = []
+            for _ in range(3):
+                start = perf_counter()
+                write_image(path, rgb, **options)
+                runs.append(perf_counter() - start)
+            print(f'    {name:<16} {min(runs) * 1000:7.1f} ms {os.path.getsize(path) / 2**20:7.2f} MiB')
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', default='1920x1080', help='frame size, WIDTHxHEIGHT')
+    parser.add_argument('--frames', type=int, default=12)
+    parser.add_argument('--max-iter', type=int, default=250)
+    args = parser.parse_args()
+    benchmark(tuple(int(n) for n in args.size.split('x')), args.frames, args.max_iter)
@@ -0,0 +1,46 @@
+# bench_interior.py
+"""
+Time the mandelbrot and a julia set with and without the checks their formulas declare
+(cardioid/bulb test, periodicity checking), and print how many iterations the checks saved.
+
+Run from the top of the repository:
+    python benchmarks/bench_interior.py
+"""
+
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import complex_bounds, render, new_stats, format_stats
+
+
+def benchmark(image_size=(480, 270), max_iters=(250, 2000), backend='numpy'):
+    scenes = [
+        ('mandelbrot', 'mandelbrot', complex_bounds((-0.5, 0), 1.5), None),
+        ('julia a=-0.12 b=0.75', 'julia', complex_bounds((0, 0), 1), (-0.12, 0.75)),
+    ]
+    print(f'image size {image_size}, backend {backend}')
+    for max_iter in max_iters:
+        for name, formula, bounds, c in scenes:
+            start = perf_counter()
+            plain = render(image_size, bounds, formula, c, max_iter, backend=backend,
+                           interior_check=False, periodicity=False)
+            plain_time = perf_counter() - start
+
+            stats = new_stats()
+            start = perf_counter()
+            checked = render(image_size, bounds, formula, c, max_iter, backend=backend, stats=stats)
+            checked_time = perf_counter() - start
+
+            same = np.array_equal(plain.iterations, checked.iterations)
+            print(f'  {name:<22} max_iter {max_iter:>6}: {plain_time:7.3f}s -> {checked_time:7.3f}s, '
+                  f'same iteration counts: {same}')
+            print(f'    {format_stats(stats)}')
+
+
+if __name__=="__main__":
+    benchmark(backend=sys.argv[1] if len(sys.argv) > 1 else 'numpy')
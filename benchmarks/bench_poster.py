@@ -0,0 +1,48 @@
+# bench_poster.py
+"""
+Peak memory of out-of-core poster rendering: render posters of increasing height at a fixed width, with a tile
+pyramid, and check that the peak stays the same while the image grows.
+
+Run from the top of the repository:
+    python benchmarks/bench_poster.py [--width 8000] [--strip-height 128]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from poster import render_poster
+
+
+def benchmark(width=8000, strip_height=128, heights=(1125, 2250, 4500, 9000)):
+    print(f'width {width}, strips of {strip_height} rows, .npy output and a DZI pyramid of 256 pixel tiles')
+    directory = tempfile.mkdtemp()
+    try:
+        for height in heights:
+            # numpy reports its allocations to tracemalloc, so this is the peak of every array alive at once
+            tracemalloc.start()
+            start = perf_counter()
+            tiles = render_poster((width, height), os.path.join(directory, 'poster.npy'), center_point=(-0.75, 0),
+                                  strip_height=strip_height, pyramid=os.path.join(directory, 'poster'))
+            seconds = perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f'  {width}x{height:<6} {width * height / 1e6:7.1f} Mpixels: peak {peak / 2**20:7.1f} MiB '
+                  f'(whole image as RGB: {width * height * 3 / 2**20:7.1f} MiB), {tiles.tiles} tiles, '
+                  f'{seconds:6.1f}s')
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--width', type=int, default=8000)
+    parser.add_argument('--strip-height', type=int, default=128)
+    args = parser.parse_args()
+    benchmark(args.width, args.strip_height)
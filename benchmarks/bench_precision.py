@@ -0,0 +1,146 @@
+# bench_precision.py
+"""
+Precision tiers against a high precision reference: does the tier the engine picks get the iteration counts right?
+
+For a view at each tier's depth (float32 at zoom 1, float64 at zoom 1e6, double-double at zoom 1e20), the
+mandelbrot set is rendered in the tier choose_precision picks, and in the next cheaper tier, and every pixel's
+iteration count is compared with the count from iterating the same pixel coordinates in 60 digit Decimal
+arithmetic. A pixel agrees if its count is within one iteration of the reference. Then the render time of every
+tier at a shallow view, where all three resolve the pixels.
+
+First, check() asserts that every tier gets every pixel within one iteration of the reference at a view of its
+depth, and that the engine's default picks float64 for the shallow views and double-double for the deep one. It
+raises AssertionError if not; --check runs only that.
+
+Run from the top of the repository:
+    python benchmarks/bench_precision.py [--check] [--size 64x36] [--time-size 960x540]
+"""
+
+import argparse
+from decimal import Decimal, localcontext
+import os
+import sys
+from time import perf_counter
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import complex_bounds, render
+from precision import PRECISIONS, choose_precision, resolve_precision
+
+
+# (center, zoom, max_iter); strings keep every digit of the center for double-double.
+#   c = i is a Misiurewicz point: the dendrite around it escapes within a few hundred iterations at any depth
+VIEWS = [
+    ((-0.5, 0), 1, 250),
+    ((-0.743643887, 0.131825904), 1e6, 1000),
+    (('-0.0000000000000000000047', '1.0000000000000000000023'), '1e20', 1000),
+]
+
+
+# (center, zoom, max_iter, tier) that check() holds to the reference on every pixel. float32 only keeps that up
+#   for short orbits: by max_iter 100 a few pixels near the edge of the set drift off by more than one iteration
+CHECKS = [
+    ((-0.5, 0), 1, 50, 'float32'),
+    ((-0.743643887, 0.131825904), 1e6, 250, 'float64'),
+    (VIEWS[2][0], '1e20', 1000, 'double-double'),
+]
+
+
+def reference_iterations(image_size, bounds, max_iter, precision):
+    '''Iteration counts of every pixel, iterated in 60 digit Decimal arithmetic from the tier's pixel coordinates.'''
+    width, height = image_size
+    with localcontext() as context:
+        context.prec = 60
+        x_min, x_max, y_min, y_max = (Decimal(value) if isinstance(value, float) else Decimal(str(value))
+                                      for value in bounds)
+        if precision == 'double-double':
+            # double_double_grid rounds the step to float64 and adds x * step exactly
+            x_size, y_size = Decimal(float((x_max - x_min) / width)), Decimal(float((y_max - y_min) / height))
+        else:
+            # complex_grid: float64 arithmetic, then the tier's rounding
+            bounds = tuple(float(value) for value in bounds)
+            dtype = np.float32 if precision == 'float32' else np.float64
+            x_size, y_size = (bounds[1] - bounds[0]) / width, (bounds[3] - bounds[2]) / height
+            re = (bounds[0] + np.arange(width, dtype=np.float64) * x_size).astype(dtype)
+            im = (bounds[2] + np.arange(height, dtype=np.float64) * y_size).astype(dtype)
+        iterations = np.empty((height, width), dtype=np.int32)
+        for y in range(height):
+            for x in range(width):
+                if precision == 'double-double':
+                    cr, ci = x_min + x * x_size, y_min + y * y_size
+                else:
+                    cr, ci = Decimal(float(re[x])), Decimal(float(im[y]))
+                zr = zi = Decimal(0)
+                for count in range(max_iter):
+                    if zr*zr + zi*zi > 4:
+                        break
+                    zr, zi = zr*zr - zi*zi + cr, 2*zr*zi + ci
+                else:
+                    count = max_iter
+                iterations[y, x] = count
+    return iterations
+
+
+def check(image_size=(64, 36)):
+    '''Assert that each tier matches the reference within one iteration on every pixel of CHECKS.'''
+    aspect_ratio = image_size[0] / image_size[1]
+    print(f'check: {image_size[0]}x{image_size[1]} pixels, every iteration count within one of the reference')
+    for center, zoom, max_iter, precision in CHECKS:
+        bounds = complex_bounds(center, zoom, 2.3, aspect_ratio)
+        assert choose_precision(image_size, bounds) == precision, f'zoom {zoom}: auto picks another tier'
+        default = precision if precision == 'double-double' else 'float64'
+        assert resolve_precision(None, image_size, bounds) == default, f'zoom {zoom}: default is not {default}'
+        result = render(image_size, bounds, 'mandelbrot', max_iter=max_iter, precision=precision)
+        reference = reference_iterations(image_size, bounds, max_iter, precision)
+        off = np.abs(result.iterations - reference) > 1
+        assert not off.any(), f'{precision} at zoom {zoom}: {off.sum()} pixels off by more than one iteration'
+        print(f'  {precision:<14} zoom {float(zoom):<6g} max_iter {max_iter:<5} ok')
+
+
+def benchmark(image_size=(64, 36), time_size=(960, 540)):
+    aspect_ratio = image_size[0] / image_size[1]
+    print(f'{image_size[0]}x{image_size[1]} pixels, iteration counts within one of a 60 digit reference')
+    for center, zoom, max_iter in VIEWS:
+        bounds = complex_bounds(center, zoom, 2.3, aspect_ratio)
+        chosen = choose_precision(image_size, bounds)
+        print(f'  zoom {float(zoom):<6g} at ({float(center[0]):.9g}, {float(center[1]):.9g}), max_iter {max_iter}: '
+              f'picks {chosen}')
+        tiers = PRECISIONS[max(PRECISIONS.index(chosen) - 1, 0):PRECISIONS.index(chosen) + 1]
+        reference = reference_iterations(image_size, bounds, max_iter, chosen)
+        for precision in tiers:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                result = render(image_size, bounds, 'mandelbrot', max_iter=max_iter, precision=precision)
+            agree = np.abs(result.iterations - reference) <= 1
+            distinct = len(np.unique(result.iterations))
+            print(f'    {precision:<14} {agree.mean():7.2%} of pixels agree, '
+                  f'{distinct} distinct counts (reference {len(np.unique(reference))})')
+
+    print(f'render time at zoom 1, {time_size[0]}x{time_size[1]}, max_iter 250 (best of 3)')
+    bounds = complex_bounds((-0.5, 0), 1, 2.3, time_size[0] / time_size[1])
+    for formula, c in (('mandelbrot', None), ('julia', (-0.834, -0.171))):
+        times = {}
+        for precision in PRECISIONS:
+            runs = []
+            for _ in range(3):
+                start = perf_counter()
+                render(time_size, bounds, formula, c, 250, exp_smoothing=c is not None, precision=precision)
+                runs.append(perf_counter() - start)
+            times[precision] = min(runs)
+        print(f'  {formula:<10} ' + '   '.join(f'{precision} {seconds:6.3f}s ({times["float64"] / seconds:.2f}x)'
+                                              for precision, seconds in times.items()))
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--check', action='store_true', help='only run the assertions')
+    parser.add_argument('--size', default='64x36', help='image size of the accuracy checks, WIDTHxHEIGHT')
+    parser.add_argument('--time-size', default='960x540', help='image size of the timings, WIDTHxHEIGHT')
+    args = parser.parse_args()
+    check(tuple(int(n) for n in args.size.split('x')))
+    if not args.check:
+        benchmark(tuple(int(n) for n in args.size.split('x')),
+                  tuple(int(n) for n in args.time_size.split('x')))
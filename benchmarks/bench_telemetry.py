@@ -0,0 +1,67 @@
+# bench_telemetry.py
+"""
+Cost of leaving telemetry on: render time without a Telemetry, with one and no sinks, and with one logging every
+event to a JSON lines file, single-process and with a pool.
+
+A Telemetry times the render in bands of rows, so it changes how the single-process render is split up; the
+iteration counts come out the same, which is checked. --save also writes the cost heatmap of the last render.
+
+Run from the top of the repository:
+    python benchmarks/bench_telemetry.py [--size 960x540] [--max-iter 500] [--workers 2] [--save heatmap.png]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import complex_bounds, render
+from telemetry import Telemetry, jsonl_sink
+
+
+def benchmark(image_size=(960, 540), max_iter=500, workers=2, save=None):
+    bounds = complex_bounds((-0.75, 0.1), 3, 2.3, image_size[0] / image_size[1])
+    options = dict(max_iter=max_iter, interior_check=True, periodicity=True, precision='float64')
+    print(f'mandelbrot {image_size[0]}x{image_size[1]}, max_iter {max_iter} (best of 5)')
+    with tempfile.TemporaryDirectory() as directory:
+        log = os.path.join(directory, 'telemetry.jsonl')
+        for pool in (1, workers):
+            reference = render(image_size, bounds, 'mandelbrot', workers=pool, **options)
+            if os.path.exists(log):
+                os.remove(log)
+            configurations = (('off', lambda: None), ('no sinks', Telemetry),
+                              ('jsonl log', lambda: Telemetry([jsonl_sink(log)])))
+            times = {name: [] for name, _ in configurations}
+            # interleaved, so a machine getting slower or faster doesn't favour one configuration
+            for _ in range(5):
+                for name, make in configurations:
+                    telemetry = make()
+                    start = perf_counter()
+                    result = render(image_size, bounds, 'mandelbrot', workers=pool, telemetry=telemetry, **options)
+                    times[name].append(perf_counter() - start)
+                    assert np.array_equal(result.iterations, reference.iterations)
+            times = {name: min(runs) for name, runs in times.items()}
+            off = times['off']
+            print(f'  workers {pool}: ' + '   '.join(f'{name} {seconds:6.3f}s ({(seconds / off - 1) * 100:+.1f}%)'
+                                                  for name, seconds in times.items()))
+            with open(log) as file:
+                events = file.read().count('\n') // 5
+            print(f'    {events} events per render; {telemetry.summary()}')
+    if save:
+        telemetry.save_heatmap(save)
+        print('heatmap saved as', save)
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', default='960x540', help='image size, WIDTHxHEIGHT')
+    parser.add_argument('--max-iter', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=2, help='processes of the pooled renders')
+    parser.add_argument('--save', metavar='FILE', help='save the cost heatmap of the last render')
+    args = parser.parse_args()
+    benchmark(tuple(int(n) for n in args.size.split('x')), args.max_iter, args.workers, args.save)
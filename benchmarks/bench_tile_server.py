@@ -0,0 +1,119 @@
+# bench_tile_server.py
+"""
+Load test of the tile server: concurrent clients fetch tiles from a server on localhost, and the tile latency
+percentiles are reported for
+    - cold: nothing cached, clients asking for overlapping tiles (requests for the same tile are coalesced)
+    - warm: the same requests again, served from the cache
+    - abandoned: clients asking for expensive tiles and hanging up before they are done; their renders are
+      cancelled, which the latency of the requests right after shows
+
+Run from the top of the repository:
+    python benchmarks/bench_tile_server.py [--clients 16] [--requests 200] [--workers 4]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tile_server import TileServer
+
+
+async def fetch(port, path, give_up=None):
+    '''GET path. Returns (status, body, seconds), or None if the client hung up after give_up seconds.'''
+    start = perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode())
+        await writer.drain()
+        try:
+            response = await asyncio.wait_for(reader.read(), give_up)
+        except asyncio.TimeoutError:
+            return None
+    finally:
+        writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), body, perf_counter() - start
+
+
+async def run_clients(port, paths, clients, give_up=None):
+    '''Fetch every path, clients at a time. Returns the latencies of the completed requests.'''
+    queue = list(paths)
+    latencies = []
+
+    async def client():
+        while queue:
+            result = await fetch(port, queue.pop(), give_up)
+            if result is not None:
+                status, _, seconds = result
+                assert status == 200, status
+                latencies.append(seconds)
+
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return latencies
+
+
+def report(name, latencies, seconds):
+    if not latencies:
+        print(f'  {name:<10} no completed requests')
+        return
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1000
+    print(f'  {name:<10} {len(latencies):5} tiles in {seconds:6.2f}s ({len(latencies) / seconds:7.1f} tiles/s), '
+          f'latency p50 {p50:7.1f} ms, p90 {p90:7.1f} ms, p99 {p99:7.1f} ms, max {max(latencies) * 1000:7.1f} ms')
+
+
+async def benchmark(clients=16, requests=200, workers=4, seed=0):
+    random.seed(seed)
+    server = await TileServer(workers=workers).start('127.0.0.1', 0)
+    try:
+        print(f'{clients} concurrent clients, {workers} render processes, 256x256 tiles')
+        # warm the workers up (imports), so the cold numbers are about rendering
+        await run_clients(server.port, [f'/mandelbrot/0/0/0.png?max_iter={n}' for n in range(1, workers + 1)],
+                          workers)
+
+        # tiles around the seahorse valley at zoom 3 to 5: neighbouring clients often want the same tile
+        paths = []
+        for _ in range(requests):
+            z = random.randint(3, 5)
+            x = int(2**z * random.uniform(0.32, 0.42))
+            y = int(2**z * random.uniform(0.45, 0.55))
+            paths.append(random.choice([f'/mandelbrot/{z}/{x}/{y}.png', f'/julia/{z}/{x}/{y}.png?a=-0.8&b=0.156']))
+
+        for name in ('cold', 'warm'):
+            start = perf_counter()
+            latencies = await run_clients(server.port, paths, clients)
+            report(name, latencies, perf_counter() - start)
+
+        # expensive tiles nobody waits for, then cheap ones: with cancellation the cheap ones don't queue
+        #   behind renders nobody wants
+        expensive = [f'/mandelbrot/12/{1400 + i}/{2048 + i}.png?max_iter=100000' for i in range(clients * 2)]
+        before = dict(server.stats)
+        await run_clients(server.port, expensive, clients, give_up=0.05)
+        start = perf_counter()
+        cheap = [f'/julia/2/{x}/{y}.png?a=0.285&b=0.01' for x in range(4) for y in range(4)]
+        latencies = await run_clients(server.port, cheap, clients)
+        report('abandoned', latencies, perf_counter() - start)
+        print(f'  {server.stats["cancelled"] - before["cancelled"]} of {len(expensive)} abandoned renders cancelled')
+
+        stats = json.loads((await fetch(server.port, '/stats'))[1])
+        print(f'server: {stats["requests"]} tile requests, {stats["hits"]} cache hits, '
+              f'{stats["coalesced"]} coalesced, {stats["renders"]} renders, {stats["cancelled"]} cancelled, '
+              f'{stats["failed"]} failed')
+    finally:
+        await server.close()
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.clients, args.requests, args.workers))
@@ -0,0 +1,67 @@
+# bench_zoom_sequence.py
+"""
+Frames per CPU second for a zoom animation: every frame rendered from scratch, the way the zoom gifs were made,
+against render_zoom_sequence with and without hi-res keyframes. Also prints how many pixels of the reused frames
+match a from-scratch render exactly.
+
+Run from the top of the repository:
+    python benchmarks/bench_zoom_sequence.py [--size 320x180] [--frames 48]
+"""
+
+import argparse
+import os
+import sys
+from time import process_time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import complex_bounds, render, new_stats
+from zoom_sequence import render_zoom_sequence, zoom_path
+
+
+def per_frame(path, image_size, max_iter):
+    '''Render every frame from scratch. Returns the iteration counts of every frame.'''
+    return [render(image_size, complex_bounds(center, zoom), 'mandelbrot', max_iter=max_iter,
+                   precision='float64').iterations
+            for center, zoom in path]
+
+
+def benchmark(image_size=(320, 180), frames=48, max_iter=500):
+    # zoom by 1000 into the seahorse valley
+    start = ((-0.5, 0), 1)
+    end = ((-0.743643887, 0.131825904), 1000)
+    path = zoom_path(start, end, frames)
+
+    cpu = process_time()
+    reference = per_frame(path, image_size, max_iter)
+    scratch_time = process_time() - cpu
+    print(f'image size {image_size}, {frames} frames, zoom x{end[1] / start[1]:g}, max_iter {max_iter}')
+    print(f'  {"every frame from scratch":<32}{frames / scratch_time:8.2f} frames/CPU second')
+
+    # scale 3 is expected to be slower than 2, about as slow as from scratch here (see zoom_sequence.py)
+    for keyframe_scale in (1, 2, 3):
+        stats = new_stats()
+        cpu = process_time()
+        matching = 0
+        keyframes = 0
+        for frame in render_zoom_sequence(start, end, frames, image_size, max_iter=max_iter,
+                                          keyframe_scale=keyframe_scale, stats=stats):
+            matching += np.count_nonzero(frame.result.iterations == reference[frame.index])
+            keyframes += frame.keyframe
+        elapsed = process_time() - cpu
+        name = f'render_zoom_sequence scale {keyframe_scale}'
+        print(f'  {name:<32}{frames / elapsed:8.2f} frames/CPU second ({scratch_time / elapsed:.1f}x), '
+              f'{keyframes} keyframes, {stats.get("reused", 0) / max(stats["points"] + stats.get("reused", 0), 1):.0%} '
+              f'of keyframe samples reused, {matching / (frames * image_size[0] * image_size[1]):.1%} '
+              f'of pixels match')
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', default='320x180', help='frame size, WIDTHxHEIGHT')
+    parser.add_argument('--frames', type=int, default=48)
+    parser.add_argument('--max-iter', type=int, default=500)
+    args = parser.parse_args()
+    benchmark(tuple(int(n) for n in args.size.split('x')), args.frames, args.max_iter)
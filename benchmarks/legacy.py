@@ -0,0 +1,121 @@
+# legacy.py
+"""
+The original per-pixel renderers, kept so the engine can be checked against them pixel for pixel
+and so benchmarks have something to measure the speedup against.
+Saving, timing and the progress bar have been stripped; each function returns the PIL image.
+"""
+
+from PIL import Image
+import math
+import colorsys
+
+
+def hsv2rgb(h,s,v):
+    return tuple(round(i*255) for i in colorsys.hsv_to_rgb(h,s,v))
+
+
+def legacy_bounds(zoom_level, center_point, x_max, aspect_ratio):
+    if aspect_ratio > 1:
+        y_max = x_max / aspect_ratio
+    else:
+        y_max = x_max * aspect_ratio
+    x_min = -x_max
+    y_min = -y_max
+
+    x_max = center_point[0] + x_max * 1/zoom_level
+    y_max = center_point[1] + y_max * 1/zoom_level
+    x_min = center_point[0] + x_min * 1/zoom_level
+    y_min = center_point[1] + y_min * 1/zoom_level
+    return x_min, x_max, y_min, y_max
+
+
+def legacy_mandelbrot(zoom_level=1, max_iter=250, center_point=(0,0),
+                      image_size=(1920, 1080), x_max=2.3, aspect_ratio=16/9):
+    x_min, x_max, y_min, y_max = legacy_bounds(zoom_level, center_point, x_max, aspect_ratio)
+
+    image = Image.new('RGB', image_size, 'black')
+    pixel = image.load()
+
+    x_size = (x_max - x_min)/image.size[0]
+    y_size = (y_max - y_min)/image.size[1]
+
+    for x in range(image.size[0]):
+        for y in range(image.size[1]):
+            l = 0
+            z = complex((x_min + x * x_size), (y_min + y * y_size))
+            z_curr = z
+            while pixel[x,y] == (0,0,0) and l < max_iter:
+                if abs(z_curr) > 2:
+                    nsmooth = (l + 1 - math.log10(math.log2(abs(z_curr)))/math.log10(2))/max_iter
+                    pixel[x,y] = hsv2rgb(h = nsmooth, s = 0.79, v = 0.59)
+
+                z_curr = z_curr**2 + z
+                l += 1
+
+    return image
+
+
+def legacy_julia(a, b, initial_color_hue, color_scale=10, zoom_level=1, center_point=(0,0),
+                 max_iter=250, image_size=(1920, 1080), x_max=2.3, aspect_ratio=16/9):
+    x_min, x_max, y_min, y_max = legacy_bounds(zoom_level, center_point, x_max, aspect_ratio)
+
+    image = Image.new('RGB', image_size, 'black')
+    pixel = image.load()
+
+    x_size = (x_max - x_min)/image.size[0]
+    y_size = (y_max - y_min)/image.size[1]
+
+    for x in range(image.size[0]):
+        for y in range(image.size[1]):
+            l = 0
+            z = complex((x_min + x * x_size), (y_min + y * y_size))
+            z_curr = z
+            c = complex(a, b)
+            nsmooth = math.exp(-abs(z_curr))
+            while pixel[x,y] == (0,0,0) and l < max_iter:
+                nsmooth += math.exp(-abs(z_curr))
+                if abs(z_curr) > 2:
+                    pixel[x,y] = hsv2rgb(h = initial_color_hue + color_scale * (nsmooth/max_iter), s = 0.79, v = 0.59)
+                z_curr = z_curr**2 + c
+                l += 1
+
+    return image
+
+
+def legacy_fractal(a, b, initial_color_hue, color_scale=10, zoom_level=1, center_point=(0,0),
+                   max_iter=250, image_size=(1920, 1080), x_max=2.3, aspect_ratio=16/9,
+                   m_style=True, j_style=False):
+    x_min, x_max, y_min, y_max = legacy_bounds(zoom_level, center_point, x_max, aspect_ratio)
+
+    image = Image.new('RGB', image_size, 'black')
+    pixel = image.load()
+
+    x_size = (x_max - x_min)/image.size[0]
+    y_size = (y_max - y_min)/image.size[1]
+
+    for x in range(image.size[0]):
+        for y in range(image.size[1]):
+            l = 0
+            z = complex((x_min + x * x_size), (y_min + y * y_size))
+            z_curr = z
+            c = complex(a, b)
+            if j_style:
+                nsmooth = math.exp(-abs(z_curr))
+
+            while pixel[x,y] == (0,0,0) and l < max_iter:
+                if j_style:
+                    nsmooth += math.exp(-abs(z_curr))
+
+                if abs(z_curr) > 1:
+                    if m_style:
+                        nsmooth = (l + 1 - math.log10(math.log2(abs(z_curr)))/math.log10(2))/max_iter
+                        pixel[x,y] = hsv2rgb(h = nsmooth, s = 0.79, v = 0.59)
+                    elif j_style:
+                        pixel[x,y] = hsv2rgb(h = initial_color_hue + color_scale * (nsmooth/max_iter), s = 0.79, v = 0.59)
+                    else:
+                        pixel[x,y] = (255, 255, 255)
+
+                z_curr = z_curr**(1/z_curr) + c
+                l += 1
+
+    return image
@@ -0,0 +1,218 @@
+# suite.py
+"""
+Benchmark suite: fixed scenes at fixed sizes and max_iter, to catch performance regressions and output changes.
+
+For every scene, image size and max_iter it reports the best render time over a few runs, pixels/s, iterations/s
+(iterations actually computed) and the peak memory of the arrays allocated during the render. Every image is
+also hashed and checked against benchmarks/golden.json, so a speedup that changes a single pixel is caught.
+
+Run from the top of the repository:
+    python benchmarks/suite.py                       # every case, checked against the golden hashes
+    python benchmarks/suite.py --scenes julia --sizes 960x540 --max-iter 1000
+    python benchmarks/suite.py --update-golden       # after a change that is meant to change the output
+    python benchmarks/suite.py --profile profiles    # also write a cProfile report per case
+    python benchmarks/suite.py --py-spy profiles     # and/or a py-spy flame graph (needs py-spy)
+    python benchmarks/suite.py --json results.jsonl  # append the numbers, to compare runs over time
+
+Golden hashes are of the numpy backend's output: other backends (and other numpy builds) can differ in the last
+bit of exp and log, which moves a few pixels by one shade.
+"""
+
+import argparse
+import cProfile
+import hashlib
+import json
+import os
+import pstats
+import subprocess
+import sys
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import complex_bounds, render, new_stats
+from coloring import color_field
+from deep_zoom import render_deep
+
+
+GOLDEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden.json')
+
+# c = i, a Misiurewicz point: the dendrite around it looks the same at every zoom, and escapes within a few hundred
+#   iterations however deep, so the deep zoom scene times the perturbation machinery rather than max_iter
+DEEP_CENTER = ('0', '1')
+
+
+def _mandelbrot(image_size, max_iter, stats, backend):
+    result = render(image_size, complex_bounds((-0.5, 0), 1, 2.3, image_size[0] / image_size[1]), 'mandelbrot',
+                    max_iter=max_iter, backend=backend, stats=stats)
+    return color_field(result, max_iter)
+
+
+def _julia(image_size, max_iter, stats, backend):
+    result = render(image_size, complex_bounds((0, 0), 1, 2.3, image_size[0] / image_size[1]), 'julia',
+                    (-0.834, -0.171), max_iter, exp_smoothing=True, backend=backend, stats=stats)
+    return color_field(result, max_iter, 'exp', 0.41, 20)
+
+
+def _exotic(image_size, max_iter, stats, backend):
+    # slightly off center, like the legacy comparison in bench_engine.py
+    result = render(image_size, complex_bounds((0.01, 0.01), 1, 2.3, image_size[0] / image_size[1]), 'exotic',
+                    (-0.3, 0.5), max_iter, backend=backend, stats=stats)
+    return color_field(result, max_iter)
+
+
+def _deep_zoom(image_size, max_iter, stats, backend):
+    # perturbation theory at a zoom float64 can't resolve; the backend doesn't apply
+    result = render_deep(image_size, DEEP_CENTER, '1e20', max_iter, aspect_ratio=image_size[0] / image_size[1],
+                         stats=stats)
+    return color_field(result, max_iter)
+
+
+# name: function(image_size, max_iter, stats, backend) returning the colored image
+SCENES = {
+    'mandelbrot': _mandelbrot,
+    'julia': _julia,
+    'exotic': _exotic,
+    'deep_zoom': _deep_zoom,
+}
+
+
+def case_name(scene, image_size, max_iter):
+    return f'{scene}_{image_size[0]}x{image_size[1]}_{max_iter}'
+
+
+def image_hash(rgb):
+    return hashlib.sha256(np.ascontiguousarray(rgb).tobytes()).hexdigest()
+
+
+def run_case(scene, image_size, max_iter, repeat=3, backend='numpy', profile=None):
+    '''
+    Time one case. Returns a dict of the numbers, the image's hash, and the image.
+        repeat: number of timed runs, the best one counts
+        profile: directory to write a cProfile report of one more run to, or None
+    '''
+    function = SCENES[scene]
+    times = []
+    for _ in range(repeat):
+        stats = new_stats()
+        start = perf_counter()
+        rgb = function(image_size, max_iter, stats, backend)
+        times.append(perf_counter() - start)
+    seconds = min(times)
+
+    # a separate run for memory: tracing every allocation slows the render down
+    tracemalloc.start()
+    function(image_size, max_iter, new_stats(), backend)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    if profile is not None:
+        os.makedirs(profile, exist_ok=True)
+        path = os.path.join(profile, case_name(scene, image_size, max_iter) + '.prof')
+        profiler = cProfile.Profile()
+        profiler.runcall(function, image_size, max_iter, new_stats(), backend)
+        profiler.dump_stats(path)
+
+    pixels = image_size[0] * image_size[1]
+    return dict(case=case_name(scene, image_size, max_iter), scene=scene, image_size=list(image_size),
+                max_iter=max_iter, backend=backend, seconds=round(seconds, 5),
+                pixels_per_second=round(pixels / seconds), iterations=stats['iterations'],
+                iterations_per_second=round(stats['iterations'] / seconds), peak_mib=round(peak / 2**20, 2),
+                hash=image_hash(rgb)), rgb
+
+
+def py_spy(case, directory, backend):
+    '''Record a py-spy flame graph of one case in a child process. Returns the svg's path, or None.'''
+    scene, size, max_iter = case.rsplit('_', 2)
+    path = os.path.join(directory, case + '.svg')
+    os.makedirs(directory, exist_ok=True)
+    command = ['py-spy', 'record', '--output', path, '--', sys.executable, os.path.abspath(__file__),
+               '--scenes', scene, '--sizes', size, '--max-iter', max_iter, '--repeat', '1', '--backend', backend,
+               '--no-golden']
+    try:
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    except (FileNotFoundError, subprocess.CalledProcessError) as error:
+        print(f'    py-spy failed ({error}); install it with pip install py-spy')
+        return None
+    return path
+
+
+def benchmark(scenes=tuple(SCENES), sizes=((320, 180), (960, 540)), max_iters=(250, 1000), repeat=3,
+              backend='numpy', golden=True, update_golden=False, profile=None, spy=None, results=None):
+    '''
+    Run every combination of scenes, sizes and max_iters.
+        golden: check the image hashes against golden.json; update_golden: write them there instead
+        profile, spy: directories for cProfile reports and py-spy flame graphs, or None
+        results: file to append the numbers to as JSON lines, or None
+    Returns True if no image differed from its golden hash.
+    '''
+    expected = {}
+    if os.path.exists(GOLDEN):
+        with open(GOLDEN) as file:
+            expected = json.load(file)
+    checking = golden and not update_golden and backend == 'numpy'
+
+    print(f'backend {backend}, best of {repeat}')
+    print(f'  {"case":<28} {"seconds":>8} {"Mpixels/s":>10} {"Miter/s":>9} {"peak MiB":>9}  golden')
+    all_match = True
+    for scene in scenes:
+        for image_size in sizes:
+            for max_iter in max_iters:
+                record, rgb = run_case(scene, image_size, max_iter, repeat, backend, profile)
+                case = record['case']
+                if update_golden:
+                    expected[case] = record['hash']
+                    check = 'updated'
+                elif not checking:
+                    check = '-'
+                elif case not in expected:
+                    check = 'no golden hash'
+                elif expected[case] == record['hash']:
+                    check = 'ok'
+                else:
+                    all_match = False
+                    # keep the image that differs, to look at
+                    from PIL import Image
+                    path = os.path.join(os.path.dirname(GOLDEN), case + '_mismatch.png')
+                    Image.fromarray(rgb).save(path)
+                    check = f'MISMATCH (saved as {path})'
+                print(f'  {case:<28} {record["seconds"]:8.3f} {record["pixels_per_second"] / 1e6:10.2f} '
+                      f'{record["iterations_per_second"] / 1e6:9.1f} {record["peak_mib"]:9.1f}  {check}')
+                if profile is not None:
+                    report = pstats.Stats(os.path.join(profile, case + '.prof'))
+                    report.sort_stats('cumulative').print_stats(8)
+                if spy is not None:
+                    path = py_spy(case, spy, backend)
+                    if path: print(f'    flame graph: {path}')
+                if results is not None:
+                    with open(results, 'a') as file:
+                        file.write(json.dumps(record) + '\n')
+
+    if update_golden:
+        with open(GOLDEN, 'w') as file:
+            json.dump(dict(sorted(expected.items())), file, indent=1)
+            file.write('\n')
+        print(f'golden hashes written to {GOLDEN}')
+    return all_match
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenes', nargs='+', default=list(SCENES), choices=list(SCENES))
+    parser.add_argument('--sizes', nargs='+', default=['320x180', '960x540'], help='image sizes, WIDTHxHEIGHT')
+    parser.add_argument('--max-iter', nargs='+', type=int, default=[250, 1000])
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per case, the best one counts')
+    parser.add_argument('--backend', default='numpy')
+    parser.add_argument('--no-golden', action='store_true', help="don't check the golden hashes")
+    parser.add_argument('--update-golden', action='store_true', help='write the hashes as the new golden ones')
+    parser.add_argument('--profile', metavar='DIRECTORY', help='write a cProfile report per case there')
+    parser.add_argument('--py-spy', metavar='DIRECTORY', help='write a py-spy flame graph per case there')
+    parser.add_argument('--json', metavar='FILE', help='append the results to FILE as JSON lines')
+    args = parser.parse_args()
+    ok = benchmark(args.scenes, [tuple(int(n) for n in size.split('x')) for size in args.sizes], args.max_iter,
+                   args.repeat, args.backend, not args.no_golden, args.update_golden, args.profile, args.py_spy,
+                   args.json)
+    sys.exit(0 if ok else 1)
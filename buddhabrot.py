@@ -0,0 +1,430 @@
+# buddhabrot.py
+"""
+Orbit density renders: the Buddhabrot, the Anti-Buddhabrot and the Nebulabrot.
+
+Instead of coloring c by how its orbit ends, every point z_1, z_2, ... of the orbit of z -> z^2 + c (the mandelbrot
+formula's step, from formulas.py) is counted in the pixel it lands on, over a huge number of sampled c:
+    Buddhabrot: orbits of the c that escape (with at least min_iter iterations)
+    Anti-Buddhabrot (anti=True): orbits of the c that never escape within max_iter
+    Nebulabrot: max_iter is a tuple, one histogram channel each, e.g. (5000, 500, 50) for red, green and blue
+
+The work is split into chunks of samples, each with its own random numbers and its own histogram. Chunks run in
+a process pool, a few streams of them side by side, and their histograms are merged as they come back. With
+checkpoint='run.npz' the merged histogram, the list of finished chunks and the state of the Metropolis-Hastings
+chains are written there every checkpoint_every seconds, and a run with the same parameters picks up from it.
+
+Sampling:
+    'uniform': c uniform over the square |Re c|, |Im c| <= 2. The cardioid/bulb test drops the c that can't
+        escape before they are iterated (Buddhabrot only, the Anti-Buddhabrot is made of them).
+    'metropolis': Metropolis-Hastings over c (Boswell's method), for zoomed views where almost no uniformly
+        sampled orbit passes through the view. Chains move towards the c whose orbits put many points in the view,
+        and every orbit is weighted by 1 / (its points in the view), so the image comes out the same as with
+        uniform sampling, up to a constant factor.
+
+Each c is iterated twice: once through the engine to find where its orbit ends (with the cardioid and
+periodicity checks), then again to trace the orbits that count.
+
+    python buddhabrot.py                # generated_images/buddhabrot.png
+"""
+
+import json
+import math
+import os
+from time import perf_counter
+
+import numpy as np
+
+from engine import complex_bounds, escape_time, new_stats, merge_stats
+from formulas import get_formula
+
+
+# where uniform sampling draws c from: every c whose orbit doesn't escape on the first iteration
+SAMPLE_REGION = (-2.0, 2.0, -2.0, 2.0)
+
+
+def _view(image_size, bounds):
+    # what _trace needs to turn z into a pixel
+    x_min, x_max, y_min, y_max = bounds
+    return x_min, (x_max - x_min) / image_size[0], y_min, (y_max - y_min) / image_size[1], image_size[0], \
+        image_size[1]
+
+
+def _limits(iterations, max_iters, min_iter, anti):
+    # (channels, n): channel k counts the orbit points z_s with s < limit, 0 leaves the orbit out of the channel
+    limits = np.zeros((len(max_iters), iterations.size), dtype=np.int64)
+    for k, max_iter in enumerate(max_iters):
+        if anti:
+            limits[k] = np.where(iterations >= max_iter, max_iter, 0)
+        else:
+            limits[k] = np.where((iterations >= min_iter) & (iterations < max_iter), iterations, 0)
+    return limits
+
+
+def _escape(cr, ci, max_iters, min_iter, anti, counts):
+    # where every orbit ends, turned into its limits
+    zero = np.zeros(cr.size)
+    result = escape_time((zero, zero), (cr, ci), 'mandelbrot', max(max_iters), escape_radius=2,
+                         interior_check=not anti, periodicity=True, stats=counts)
+    return _limits(result.iterations, max_iters, min_iter, anti)
+
+
+def _trace(cr, ci, limits, view, weights=None, histogram=None, counts=None, flush=2**22):
+    '''
+    Iterate every c from z = 0 again and count its orbit points z_1, z_2, ... that land in the view.
+
+        Parameters:
+            cr, ci: the c values
+            limits: (channels, n) from _limits
+            view: from _view
+            weights: what each orbit point of each c adds to the histogram (None for 1)
+            histogram: flat (channels * height * width) float64 array to add to, or None to only count
+            counts: optional stats dict; 'iterations' is added to
+            flush: number of buffered orbit points that triggers adding them to the histogram
+
+        Returns the number of orbit points of each c that landed in the view
+    '''
+    x_min, x_size, y_min, y_size, width, height = view
+    pixels = width * height
+    step_function = get_formula('mandelbrot').step
+    hits = np.zeros(cr.size, dtype=np.int64)
+    longest = limits.max(axis=0)
+    buffered, buffered_weights, size = [], [], 0
+
+    def add():
+        nonlocal buffered, buffered_weights, size
+        if size:
+            index = np.concatenate(buffered)
+            histogram[:] += np.bincount(index, None if weights is None else np.concatenate(buffered_weights),
+                                        minlength=histogram.size)
+        buffered, buffered_weights, size = [], [], 0
+
+    owner = np.flatnonzero(longest > 1)
+    cr, ci = cr[owner], ci[owner]
+    zr, zi = np.zeros(owner.size), np.zeros(owner.size)
+    s = 1
+    while owner.size:
+        zr, zi = step_function(zr, zi, cr, ci)
+        if counts is not None:
+            counts['iterations'] += owner.size
+        x = (zr - x_min) / x_size
+        y = (zi - y_min) / y_size
+        inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+        if inside.any():
+            who = owner[inside]
+            pixel = y[inside].astype(np.int64) * width + x[inside].astype(np.int64)
+            hits += np.bincount(who, minlength=hits.size)
+            if histogram is not None:
+                for k in range(limits.shape[0]):
+                    counted = limits[k, who] > s
+                    buffered.append(pixel[counted] + k * pixels)
+                    if weights is not None:
+                        buffered_weights.append(weights[who[counted]])
+                    size += buffered[-1].size
+                if size > flush:
+                    add()
+
+        # z_{s+1} only counts for the orbits that last longer
+        s += 1
+        going = longest[owner] > s
+        if not going.all():
+            owner, zr, zi, cr, ci = owner[going], zr[going], zi[going], cr[going], ci[going]
+    if histogram is not None:
+        add()
+    return hits
+
+
+def _uniform_chunk(rng, samples, view, max_iters, min_iter, anti, histogram, counts, batch=2**16):
+    # uniform sampling, batch c values at a time
+    x_min, x_max, y_min, y_max = SAMPLE_REGION
+    for start in range(0, samples, batch):
+        n = min(batch, samples - start)
+        cr = rng.uniform(x_min, x_max, n)
+        ci = rng.uniform(y_min, y_max, n)
+        limits = _escape(cr, ci, max_iters, min_iter, anti, counts)
+        counts['samples'] += n
+        counts['orbits'] += int((limits.max(axis=0) > 0).sum())
+        _trace(cr, ci, limits, view, histogram=histogram, counts=counts)
+
+
+def _metropolis_chunk(rng, samples, view, max_iters, min_iter, anti, histogram, counts, chains=4096,
+                      mutation=0.1, state=None, restart=0.25, burn_in=16, tries=16):
+    '''
+    Metropolis-Hastings over c with `chains` chains moving together. A proposal is a fresh uniform c with
+    probability restart, otherwise the current c plus a normal step of standard deviation mutation; both are
+    symmetric, so a proposal is accepted with probability (its orbit points in the view) / (the current c's).
+    The current c of every chain is counted once per step with weight 1 / (its orbit points in the view); its
+    orbit is only traced again when the chain moves on, with the weight of all the steps it stayed.
+
+    state: the chains where the previous chunk of the stream left them, (cr, ci, limits, hits), or None to start
+        them afresh: from up to tries * chains * 16 uniform samples, then burn_in steps that aren't counted
+    Returns the state to carry on from
+    '''
+    x_min, x_max, y_min, y_max = SAMPLE_REGION
+
+    def uniform(n):
+        return rng.uniform(x_min, x_max, n), rng.uniform(y_min, y_max, n)
+
+    def evaluate(cr, ci):
+        limits = _escape(cr, ci, max_iters, min_iter, anti, counts)
+        return limits, _trace(cr, ci, limits, view, counts=counts)
+
+    if state is None:
+        # start the chains from c that contribute, picked in proportion to their orbit points in the view (the
+        #   distribution the chains sample), out of uniform samples
+        found = []
+        for _ in range(tries):
+            tr, ti = uniform(chains * 16)
+            t_limits, t_hits = evaluate(tr, ti)
+            keep = t_hits > 0
+            found.append((tr[keep], ti[keep], t_limits[:, keep], t_hits[keep]))
+            if sum(part[0].size for part in found) >= chains:
+                break
+        cr, ci, limits, hits = (np.concatenate(values, axis=-1) for values in zip(*found))
+        if hits.size:
+            pick = rng.choice(hits.size, chains, p=hits / hits.sum())
+            cr, ci, limits, hits = cr[pick], ci[pick], limits[:, pick], hits[pick]
+        else:
+            # nothing in the view yet: the chains wander until they find something
+            cr, ci = uniform(chains)
+            limits, hits = evaluate(cr, ci)
+    else:
+        cr, ci, limits, hits = state
+        chains = cr.size
+        burn_in = 0
+
+    pending = np.zeros(chains)
+
+    def flush(which):
+        # add the orbits of the chains in which with the weight of every step they stayed
+        which = which[(pending[which] > 0) & (hits[which] > 0)]
+        if which.size:
+            _trace(cr[which], ci[which], limits[:, which], view, pending[which] / hits[which], histogram, counts)
+
+    steps = math.ceil(samples / chains)
+    for step in range(burn_in + steps):
+        recording = step >= burn_in
+        fresh = rng.random(chains) < restart
+        pr, pi = uniform(chains)
+        pr = np.where(fresh, pr, cr + rng.normal(0, mutation, chains))
+        pi = np.where(fresh, pi, ci + rng.normal(0, mutation, chains))
+        p_limits, p_hits = evaluate(pr, pi)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            acceptance = np.where(hits > 0, np.minimum(1, p_hits / hits), 1.0)
+        accepted = np.flatnonzero(rng.random(chains) < acceptance)
+
+        flush(accepted)
+        cr[accepted], ci[accepted], limits[:, accepted], hits[accepted] = \
+            pr[accepted], pi[accepted], p_limits[:, accepted], p_hits[accepted]
+        pending[accepted] = 0
+        if recording:
+            pending += 1
+            counts['samples'] += chains
+            counts['orbits'] += int((p_limits.max(axis=0) > 0).sum())
+            counts['accepted'] += accepted.size
+    # the chains go on in the next chunk: their weight so far belongs in this one
+    flush(np.arange(chains))
+    return cr, ci, limits, hits
+
+
+def _render_chunk(task):
+    # runs in a worker: one chunk of samples into a histogram of its own
+    index, samples, options, state = task
+    image_size = options['image_size']
+    max_iters = options['max_iter']
+    rng = np.random.default_rng(np.random.SeedSequence(options['seed'], spawn_key=(index,)))
+    view = _view(image_size, options['bounds'])
+    histogram = np.zeros(len(max_iters) * image_size[0] * image_size[1])
+    counts = new_stats()
+    counts.update(samples=0, orbits=0, accepted=0)
+    if options['method'] == 'uniform':
+        _uniform_chunk(rng, samples, view, max_iters, options['min_iter'], options['anti'], histogram, counts)
+    else:
+        state = _metropolis_chunk(rng, samples, view, max_iters, options['min_iter'], options['anti'], histogram,
+                                  counts, options['chains'], options['mutation'], state)
+    return index, histogram.reshape(len(max_iters), image_size[1], image_size[0]), counts, state
+
+
+STATE_FIELDS = ('cr', 'ci', 'limits', 'hits')
+
+
+def load_checkpoint(path):
+    '''
+    Load a checkpoint written by render_buddhabrot.
+    Returns (histogram, set of finished chunks, parameters, stats, {stream: Metropolis-Hastings chains}).
+    '''
+    with np.load(path) as data:
+        params = json.loads(str(data['params']))
+        states = {stream: tuple(data[f'state_{stream}_{field}'] for field in STATE_FIELDS)
+                  for stream in range(params['streams']) if f'state_{stream}_cr' in data.files}
+        return (data['histogram'], set(data['done'].tolist()), params, json.loads(str(data['stats'])), states)
+
+
+def _save_checkpoint(path, histogram, done, params, stats, states):
+    # write next to it and rename, so a run killed while saving leaves the last checkpoint intact
+    arrays = {f'state_{stream}_{field}': values for stream, state in states.items() if state is not None
+              for field, values in zip(STATE_FIELDS, state)}
+    temporary = path + '.partial'
+    with open(temporary, 'wb') as file:
+        np.savez(file, histogram=histogram, done=np.array(sorted(done), dtype=np.int64), params=json.dumps(params),
+                 stats=json.dumps(stats), **arrays)
+    os.replace(temporary, path)
+
+
+def render_buddhabrot(image_size=(1000, 1000), bounds=None, samples=10**7, max_iter=1000, min_iter=0, anti=False,
+                      method='uniform', workers=1, streams=None, chunk=2**18, seed=0, chains=4096, mutation=None,
+                      checkpoint=None, checkpoint_every=60, progress=None, stats=None, verbose=False):
+    '''
+    Accumulate an orbit density histogram.
+
+        Parameters:
+            image_size: Image size in pixels (tuple)
+            bounds: (x_min, x_max, y_min, y_max) of the view, see engine.complex_bounds. Defaults to the whole set.
+            samples: number of c values to sample (proposals, for 'metropolis')
+            max_iter: number of iterations to run on an orbit, or a tuple of them for a Nebulabrot (one channel each)
+            min_iter: leave out escaping orbits shorter than this (Buddhabrot only)
+            anti: the Anti-Buddhabrot, orbits that never escape
+            method: 'uniform' or 'metropolis', see the module docstring
+            workers: number of processes (None uses every core)
+            streams: number of sequences of chunks. Chunk i belongs to stream i % streams and starts its
+                Metropolis-Hastings chains where the stream's previous chunk left them, so they only burn in once;
+                the streams run side by side. Defaults to workers.
+            chunk: number of samples per chunk, the unit of work handed to a process, merged and checkpointed
+            seed: seed of the random streams; chunk i always gets the same one
+            chains: number of Metropolis-Hastings chains per stream
+            mutation: standard deviation of a Metropolis-Hastings step in the c-plane. Defaults to a tenth of the
+                view's width.
+            checkpoint: .npz file to keep the histogram (and the chains) in, and resume from if it exists
+            checkpoint_every: seconds between checkpoints
+            progress: optional callable, called as progress(chunks_done, total_chunks)
+            stats: optional dict (see engine.new_stats) that the counters are added to, plus
+                samples (c values sampled), orbits (orbits that counted), accepted (Metropolis-Hastings moves)
+                and seconds (time spent sampling, including the runs a checkpoint was resumed from)
+            verbose: print the throughput as chunks come in
+
+        Returns the (channels, height, width) float64 histogram
+    '''
+    if bounds is None:
+        bounds = complex_bounds((-0.5, 0), 1, 2.3, image_size[0] / image_size[1])
+    if method not in ('uniform', 'metropolis'):
+        raise ValueError(f"unknown method {method!r}, expected 'uniform' or 'metropolis'")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if streams is None:
+        streams = workers
+    max_iters = tuple(max_iter) if isinstance(max_iter, (tuple, list)) else (max_iter,)
+    if mutation is None:
+        mutation = (bounds[1] - bounds[0]) / 10
+    params = dict(image_size=list(image_size), bounds=[float(value) for value in bounds], max_iter=list(max_iters),
+                  min_iter=min_iter, anti=anti, method=method, streams=streams, chunk=chunk, seed=seed,
+                  chains=chains, mutation=float(mutation))
+
+    histogram = np.zeros((len(max_iters), image_size[1], image_size[0]))
+    done = set()
+    counts = new_stats()
+    counts.update(samples=0, orbits=0, accepted=0)
+    states = {}
+    if checkpoint is not None and os.path.exists(checkpoint):
+        histogram, done, saved, counts, states = load_checkpoint(checkpoint)
+        if saved != params:
+            raise ValueError(f'{checkpoint} was written with other parameters: {saved}')
+        if verbose: print(f'resuming from {checkpoint}: {len(done)} chunks done')
+
+    chunks = math.ceil(samples / chunk)
+    options = dict(params, image_size=tuple(image_size), max_iter=max_iters)
+    # the chunks still to do, stream by stream, in order
+    queues = [[index for index in range(stream, chunks, streams) if index not in done] for stream in range(streams)]
+    todo = sum(len(queue) for queue in queues)
+
+    def task(stream):
+        index = queues[stream].pop(0)
+        return index, min(chunk, samples - index * chunk), options, states.get(stream)
+
+    pool = None
+    if workers != 1 and todo > 1:
+        import queue
+        from parallel import new_pool
+        pool = new_pool(min(workers, streams))
+        finished = queue.Queue()
+
+        def submit(stream):
+            pool.apply_async(_render_chunk, (task(stream),), callback=finished.put, error_callback=finished.put)
+
+        def results():
+            running = 0
+            for stream in range(streams):
+                if queues[stream]:
+                    submit(stream)
+                    running += 1
+            while running:
+                result = finished.get()
+                if isinstance(result, BaseException):
+                    raise result
+                running -= 1
+                yield result
+                # the stream's next chunk starts from the chains this one ended with
+                stream = result[0] % streams
+                if queues[stream]:
+                    submit(stream)
+                    running += 1
+    else:
+        def results():
+            for index in sorted(index for queue in queues for index in queue):
+                yield _render_chunk(task(index % streams))
+
+    start = last_save = perf_counter()
+    sampled = 0
+    # seconds spent sampling, over every run that went into the checkpoint
+    seconds = counts.get('seconds', 0)
+    try:
+        for index, part, part_counts, state in results():
+            histogram += part
+            done.add(index)
+            states[index % streams] = state
+            merge_stats(counts, part_counts)
+            sampled += part_counts['samples']
+            if progress is not None:
+                progress(len(done), chunks)
+            if verbose:
+                print(f'chunk {len(done)}/{chunks}: {sampled / (perf_counter() - start):,.0f} orbits/s')
+            counts['seconds'] = seconds + perf_counter() - start
+            if checkpoint is not None and perf_counter() - last_save > checkpoint_every:
+                _save_checkpoint(checkpoint, histogram, done, params, counts, states)
+                last_save = perf_counter()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        if checkpoint is not None and todo:
+            _save_checkpoint(checkpoint, histogram, done, params, counts, states)
+
+    if stats is not None:
+        merge_stats(stats, counts)
+    return histogram
+
+
+def buddhabrot_image(histogram, gamma=0.5, percentile=99.95):
+    '''
+    Turn a histogram into a (height, width, 3) uint8 image: each channel is scaled so its given percentile is
+    full brightness, then raised to gamma. One channel is drawn in gray, three as red, green and blue.
+    '''
+    channels = []
+    for counts in histogram:
+        top = np.percentile(counts, percentile)
+        if top <= 0:
+            top = counts.max() or 1
+        channels.append(np.clip(counts / top, 0, 1) ** gamma)
+    if len(channels) == 1:
+        channels *= 3
+    return np.round(np.stack(channels, axis=-1) * 255).astype(np.uint8)
+
+
+if __name__=="__main__":
+    from PIL import Image
+    stats = {}
+    # the Buddhabrot is usually shown with the real axis vertical
+    histogram = render_buddhabrot((800, 800), complex_bounds((-0.4, 0), 1, 1.6, 1), samples=2 * 10**7,
+                                  max_iter=(5000, 500, 50), workers=None, stats=stats, verbose=True)
+    Image.fromarray(buddhabrot_image(histogram)).transpose(Image.Transpose.ROTATE_270).save(
+        'generated_images/buddhabrot.png')
+    print(f"{stats['samples']:,} orbits in {stats['seconds']:.1f}s ({stats['samples'] / stats['seconds']:,.0f} "
+          f"orbits/s), saved as generated_images/buddhabrot.png")
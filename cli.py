@@ -0,0 +1,387 @@
+#! /usr/bin/env python3
+# cli.py
+"""
+Command line interface to the generators, and an optional warm render daemon.
+
+    python cli.py julia -a -0.8 -b 0.156 --hue 0.41 --scale 20 --size 1920x1080
+    python cli.py mandelbrot --center -0.7436438870371587522 0.1318259042053119 --zoom 1e30 --max-iter 5000
+    python cli.py exotic -a -0.3 -b 0.5 --style j
+    python cli.py gif generated_images/first_zoom_gif -o zoom.mp4 -f 24 -p
+
+`python julia.py ...`, `python mandelbrot.py ...`, `python exotic_fractals/fractal.py ...` and `python gif.py ...`
+take the same arguments as the matching command. With no arguments they render what their old __main__ blocks
+did.
+
+Only the standard library is imported up front: numpy, Pillow and the engine are imported by the command that
+needs them, so --help answers straight away.
+
+Daemon: `python cli.py daemon` starts a process pool whose workers have imported the generators (and compiled
+the numba kernels, if numba is installed) and listens on a Unix socket. A render command with --daemon is then
+sent to it instead of being run in a new Python process, which leaves only the client's own startup and the
+render itself. Requests are one line of JSON each way:
+    {"command": "julia", "options": {keyword arguments of generate_julia}}
+    -> {"ok": true, "output": "generated_images/...png", "seconds": 0.05, "stats": "..."}
+`python cli.py daemon --status` and `--stop` talk to a running daemon. Renders in the daemon run one per worker,
+with workers=1 each (pool processes can't start pools of their own).
+"""
+
+import argparse
+import json
+import os
+import sys
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# command: (module, generator function, function giving the file name an image is saved under)
+GENERATORS = {
+    'julia': ('julia', 'generate_julia', 'julia_save_name'),
+    'mandelbrot': ('mandelbrot', 'generate_mandelbrot_zoom', 'mandelbrot_save_name'),
+    'exotic': ('fractal', 'generate_fractal', 'fractal_save_name'),
+}
+
+# generators that take a stats dict
+STATS = ('julia', 'mandelbrot')
+
+
+def default_socket():
+    '''Where the daemon listens unless told otherwise.'''
+    import tempfile
+    return os.path.join(tempfile.gettempdir(), f'fractal-daemon-{os.getuid()}.sock')
+
+
+def _generator(command):
+    # the generator function and save name function of a command, importing its module
+    from importlib import import_module
+    if command == 'exotic':
+        sys.path.insert(0, os.path.join(ROOT, 'exotic_fractals'))
+    module, function, save_name = GENERATORS[command]
+    module = import_module(module)
+    return getattr(module, function), getattr(module, save_name)
+
+
+def _size(text):
+    # WIDTHxHEIGHT
+    try:
+        width, height = (int(value) for value in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected WIDTHxHEIGHT, got {text!r}')
+    return width, height
+
+
+def _precise(text):
+    # a number, kept as a string if a float would lose digits of it (deep zooms want every digit)
+    from decimal import Decimal, InvalidOperation
+    try:
+        value = float(text)
+        exact = Decimal(text) == Decimal(repr(value))
+    except (ValueError, InvalidOperation):
+        raise argparse.ArgumentTypeError(f'expected a number, got {text!r}')
+    return value if exact else text
+
+
+def _add_render_arguments(parser, a=None, b=None, hue=0.5, scale=10, job=None, extras=True, number=float):
+    # the arguments every generator command takes; the defaults are what the generator's __main__ used to render
+    if a is not None:
+        parser.add_argument('-a', type=float, default=a, help=f'real part of c (default {a})')
+        parser.add_argument('-b', type=float, default=b, help=f'imaginary part of c (default {b})')
+    parser.add_argument('--hue', type=float, default=hue, dest='initial_color_hue', metavar='HUE',
+                        help=f'initial color hue, between 0 and 1 (default {hue})')
+    parser.add_argument('--scale', type=float, default=scale, dest='color_scale', metavar='SCALE',
+                        help=f'how rapidly colors change (default {scale})')
+    parser.add_argument('--zoom', type=number, default=1, dest='zoom_level', metavar='ZOOM', help='zoom level, 1 and up')
+    parser.add_argument('--center', type=number, nargs=2, default=(0, 0), metavar=('RE', 'IM'),
+                        dest='center_point', help='point the image is centered on')
+    parser.add_argument('--max-iter', type=int, default=250, metavar='N', help='iterations per pixel (default 250)')
+    parser.add_argument('--size', type=_size, default=(960, 540), dest='image_size', metavar='WIDTHxHEIGHT',
+                        help='image size in pixels (default 960x540); the aspect ratio follows it')
+    parser.add_argument('--job', type=int, default=job, help='job number, the start of the file name')
+    parser.add_argument('--directory', default='generated_images', help='where to save the image')
+    parser.add_argument('--no-save', action='store_false', dest='image_save', help="don't save the image")
+    parser.add_argument('--format', default='.png', choices=('.png', '.webp', '.npy'), dest='image_format',
+                        help='image file format; .npy is the uncompressed RGB array (default .png)')
+    parser.add_argument('--compress-level', type=int, default=None, choices=range(10), metavar='0-9',
+                        help='PNG compression, 0 (fastest) to 9 (smallest); default 6')
+    parser.add_argument('-q', '--quiet', action='store_false', dest='verbose', help='print nothing')
+    parser.add_argument('--workers', type=int, default=1, help='render processes (0 for every core)')
+    parser.add_argument('--backend', default='numpy', choices=('numpy', 'numba'))
+    parser.add_argument('--palette', default='hsv', help="'hsv', 'fire', 'ocean' or 'grayscale'")
+    parser.add_argument('--telemetry', metavar='FILE', default=None,
+                        help='log progress, tile timings and totals to FILE, one JSON event per line')
+    parser.add_argument('--heatmap', metavar='FILE', default=None,
+                        help='save an image of where the render spent its time to FILE')
+    if extras:
+        parser.add_argument('--precision', default=None, choices=('auto', 'float32', 'float64', 'double-double'),
+                            help="what to iterate in (default float64, or double-double when that can't resolve the "
+                                 "pixels; 'auto' also picks float32 for shallow views)")
+    else:
+        # the exotic formula uses numpy functions, which can't iterate double-doubles
+        parser.add_argument('--precision', default=None, choices=('auto', 'float32', 'float64'),
+                            help="what to iterate in (default float64; 'auto' also picks float32 for shallow views)")
+    if extras:
+        parser.add_argument('--antialias', type=int, default=None, metavar='N',
+                            help='supersample high-contrast pixels with NxN samples')
+        parser.add_argument('--adaptive', nargs='?', const=True, default=False, choices=(True, 'escaped'), metavar='escaped',
+                            help="Mariani-Silver subdivision; 'escaped' also fills escaped rectangles")
+        parser.add_argument('--cache', default=None, metavar='DIRECTORY', help='tile cache directory')
+        parser.add_argument('--field-save', action='store_true', help='also save the raw escape data (.npz)')
+        parser.add_argument('--field', default=None, metavar='FILE', help='color escape data saved earlier')
+    parser.add_argument('--daemon', action='store_true', help='send the render to a running daemon')
+    parser.add_argument('--socket', default=None, help='socket of the daemon (default: in the temp directory)')
+
+
+def _options(command, args):
+    # the generator's keyword arguments from parsed arguments
+    options = {name: value for name, value in vars(args).items()
+               if name not in ('command', 'daemon', 'socket', 'style', 'telemetry', 'heatmap')}
+    options['aspect_ratio'] = options['image_size'][0] / options['image_size'][1]
+    if options['workers'] == 0:
+        options['workers'] = None
+    if command in ('julia', 'exotic'):
+        options['a'], options['b'] = options.pop('a'), options.pop('b')
+    if command == 'exotic':
+        options['m_style'], options['j_style'] = args.style == 'm', args.style == 'j'
+    return options
+
+
+def _generate(generate, options):
+    # run a generator; a compression level is given to the ImageWriter that saves the image
+    compress_level = options.pop('compress_level', None)
+    if compress_level is None:
+        return generate(**options)
+    from image_writer import ImageWriter
+    with ImageWriter(compress_level=compress_level) as writer:
+        return generate(writer=writer, **options)
+
+
+def _render_job(command, options):
+    '''
+    Render one image with verbose off, as the daemon's workers do.
+    Returns {'output': file saved (or None), 'seconds': render time, 'stats': one line summary (or None)}.
+    '''
+    from time import perf_counter
+    generate, save_name = _generator(command)
+    # JSON has no tuples
+    options = {name: tuple(value) if isinstance(value, list) else value for name, value in options.items()}
+    options.update(verbose=False, workers=1)
+    stats = None
+    if command in STATS:
+        stats = {}
+        options['stats'] = stats
+    start = perf_counter()
+    _generate(generate, options)
+    seconds = perf_counter() - start
+
+    output = None
+    if options.get('image_save', True):
+        names = dict(initial_color_hue=options['initial_color_hue'], color_scale=options['color_scale'],
+                     job=options.get('job'), image_format=options.get('image_format', '.png'))
+        if command != 'mandelbrot':
+            names.update(a=options['a'], b=options['b'])
+        output = os.path.join(options.get('directory') or '', save_name(**names))
+    summary = None
+    if stats:
+        from engine import format_stats
+        from deep_zoom import format_deep_stats
+        summary = format_deep_stats(stats) if 'reference_length' in stats else format_stats(stats)
+    return dict(output=output, seconds=round(seconds, 4), stats=summary)
+
+
+def request(message, socket_path=None, timeout=None):
+    '''Send one request (a dict) to the daemon and return its reply (a dict).'''
+    import socket
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(socket_path or default_socket())
+        connection.sendall(json.dumps(message).encode() + b'\n')
+        with connection.makefile('rb') as reply:
+            return json.loads(reply.readline())
+
+
+def _warm():
+    # runs once in every daemon worker: import every generator, and compile the numba kernels if numba is there
+    for command in GENERATORS:
+        _generator(command)
+    try:
+        import numba
+    except ImportError:
+        return
+    # the pool already runs one process per core
+    numba.set_num_threads(1)
+    from engine import complex_bounds, render
+    for formula, c in (('mandelbrot', None), ('julia', (-0.8, 0.156)), ('exotic', (-0.3, 0.5))):
+        render((8, 8), complex_bounds(), formula, c, 10, exp_smoothing=formula != 'mandelbrot', backend='numba')
+
+
+def serve(socket_path=None, workers=None, verbose=True):
+    '''
+    Run the daemon until a stop request (or Ctrl-C): a warm process pool behind a Unix socket.
+
+        Parameters:
+            socket_path: where to listen (default_socket() if None). A stale socket file is replaced.
+            workers: number of processes (None uses every core), each rendering one image at a time
+            verbose: print a line per request
+    '''
+    import socketserver
+    import threading
+    from parallel import new_pool
+
+    socket_path = socket_path or default_socket()
+    if os.path.exists(socket_path):
+        try:
+            request({'command': 'ping'}, socket_path, timeout=1)
+        except OSError:
+            os.unlink(socket_path)
+        else:
+            raise RuntimeError(f'a daemon is already listening on {socket_path}')
+
+    workers = workers or os.cpu_count()
+    pool = new_pool(workers, _warm)
+    # have every worker warm before saying we're ready
+    pool.map(abs, range(workers))
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            try:
+                message = json.loads(self.rfile.readline())
+                command = message.get('command')
+            except (ValueError, AttributeError):
+                self.wfile.write(json.dumps(dict(ok=False, error='a request is one JSON object per line')).encode()
+                                 + b'\n')
+                return
+            if command == 'ping':
+                reply = dict(ok=True, pid=os.getpid(), workers=workers)
+            elif command == 'stop':
+                reply = dict(ok=True)
+                threading.Thread(target=server.shutdown).start()
+            elif command in GENERATORS:
+                try:
+                    reply = dict(ok=True, **pool.apply(_render_job, (command, message.get('options', {}))))
+                except Exception as error:
+                    reply = dict(ok=False, error=f'{type(error).__name__}: {error}')
+                if verbose:
+                    print(f"{command}: {reply['output']}, {reply['seconds']} s" if reply['ok'] else reply['error'])
+            else:
+                reply = dict(ok=False, error=f'unknown command {command!r}')
+            self.wfile.write(json.dumps(reply).encode() + b'\n')
+
+    server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+    server.daemon_threads = True
+    if verbose: print(f'listening on {socket_path} with {workers} warm workers')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        pool.terminate()
+        pool.join()
+
+
+def _render(command, args):
+    if args.backend == 'numba' and args.precision == 'float32':
+        print('--precision float32 needs the numpy backend: the numba kernels iterate in float64', file=sys.stderr)
+        return 1
+    options = _options(command, args)
+    if not args.daemon:
+        generate, _ = _generator(command)
+        telemetry = None
+        if args.telemetry or args.heatmap:
+            from telemetry import Telemetry, jsonl_sink
+            telemetry = options['telemetry'] = Telemetry([jsonl_sink(args.telemetry)] if args.telemetry else [])
+        _generate(generate, options)
+        if args.heatmap:
+            if telemetry.totals is None:
+                print('no heatmap: deep zooms only report progress', file=sys.stderr)
+                return 1
+            telemetry.save_heatmap(args.heatmap)
+            if args.verbose: print('time spent per pixel saved as:', args.heatmap)
+        return 0
+    if args.telemetry or args.heatmap:
+        print('--telemetry and --heatmap only work without --daemon', file=sys.stderr)
+        return 1
+    # paths are the daemon's to open, and it can run anywhere
+    for name in ('directory', 'cache', 'field'):
+        if options.get(name):
+            options[name] = os.path.abspath(options[name])
+    try:
+        reply = request({'command': command, 'options': options}, args.socket)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f'no daemon is listening on {args.socket or default_socket()}; start one with: python cli.py daemon',
+              file=sys.stderr)
+        return 1
+    if not reply['ok']:
+        print(reply['error'], file=sys.stderr)
+        return 1
+    if args.verbose:
+        print(f"rendered in {reply['seconds']} s by the daemon")
+        if reply['stats']: print(reply['stats'])
+        if reply['output']: print('saved as:', os.path.relpath(reply['output']))
+    return 0
+
+
+def _gif(args):
+    from gif import generate_gif
+    generate_gif(args.directory, args.image_format, args.print_file_names, args.output, args.fps, args.palette)
+    return 0
+
+
+def _daemon(args):
+    if args.status or args.stop:
+        try:
+            reply = request({'command': 'stop' if args.stop else 'ping'}, args.socket, timeout=5)
+        except (FileNotFoundError, ConnectionRefusedError):
+            print(f'no daemon is listening on {args.socket or default_socket()}')
+            return 1
+        print('stopped' if args.stop else f"running, pid {reply['pid']}, {reply['workers']} workers")
+        return 0
+    serve(args.socket, args.workers or None)
+    return 0
+
+
+def parser():
+    '''The argument parser of every command.'''
+    main_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = main_parser.add_subparsers(dest='command', required=True)
+
+    julia = commands.add_parser('julia', help='a julia set, z^2 + c')
+    _add_render_arguments(julia, a=-0.834, b=-0.171, hue=0.41, scale=20, job=13, number=_precise)
+    mandelbrot = commands.add_parser('mandelbrot', help='the mandelbrot set, with deep zooms')
+    _add_render_arguments(mandelbrot, hue=0.5, scale=20, job=13, number=_precise)
+    mandelbrot.add_argument('--deep-zoom', action=argparse.BooleanOptionalAction, default=None,
+                            help='force perturbation rendering on or off (default: when the zoom needs it)')
+    exotic = commands.add_parser('exotic', help='z^(1/z) + c')
+    _add_render_arguments(exotic, a=0.0, b=0.0, hue=0.41, scale=10, extras=False)
+    exotic.add_argument('--style', choices=('m', 'j', 'mask'), default='m',
+                        help="'m' colors like the mandelbrot, 'j' like a julia set, 'mask' in black and white")
+
+    gif = commands.add_parser('gif', help='a gif or video from a directory of numbered frames')
+    gif.add_argument('directory', help='folder of frames (or a glob pattern)')
+    gif.add_argument('image_format', nargs='?', default='.png', help='extension of the frames (default .png)')
+    gif.add_argument('-o', '--output', help='.gif or .mp4 file to write (default: the folder name + .gif)')
+    gif.add_argument('-f', '--fps', type=float, default=10, help='frames per second')
+    gif.add_argument('-p', '--palette', action='store_true', help='one palette, sampled from the frames, for all')
+    gif.add_argument('--print-file-names', action='store_true', help='list the frames, in order')
+
+    daemon = commands.add_parser('daemon', help='keep a warm worker pool behind a Unix socket')
+    daemon.add_argument('--workers', type=int, default=None, help='processes (default: every core)')
+    daemon.add_argument('--socket', default=None, help='where to listen (default: in the temp directory)')
+    daemon.add_argument('--status', action='store_true', help='check whether a daemon is running')
+    daemon.add_argument('--stop', action='store_true', help='stop the running daemon')
+    return main_parser
+
+
+def main(argv=None):
+    '''Run a command line (sys.argv[1:] if None). Returns the exit status.'''
+    args = parser().parse_args(argv)
+    if args.command in GENERATORS:
+        return _render(args.command, args)
+    if args.command == 'gif':
+        return _gif(args)
+    return _daemon(args)
+
+
+if __name__=="__main__":
+    sys.exit(main())
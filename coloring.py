@@ -0,0 +1,116 @@
+# coloring.py
+"""
+Coloring of the escape data the engine computes, kept apart from the computation.
+
+The engine's raw field (an EscapeResult: iteration counts, final |z| and the exp(-|z|) sum) is all the coloring
+needs. It can be saved to a compressed .npz file with save_field and colored again later with any hue, scale or
+palette, without iterating anything again:
+
+    result = render(...)
+    save_field('view.npz', result, max_iter=max_iter)
+    for color_scale in (1, 10, 20):
+        Image.fromarray(color_field(result, max_iter, 'exp', 0.41, color_scale)).save(...)
+
+Coloring a 960x540 field takes a few tens of milliseconds, against about half a second to compute it.
+"""
+
+import json
+
+import numpy as np
+
+from engine import EscapeResult, smooth_hue, exp_smooth_hue, hsv_to_rgb
+
+
+# color stops of the built-in palettes, as (position between 0 and 1, (r, g, b)).
+#   'hsv' isn't here: it is the hue wheel the generators have always used, see color_field
+PALETTES = {
+    'fire': [(0.0, (0, 0, 0)), (0.3, (128, 0, 0)), (0.6, (255, 128, 0)), (0.85, (255, 255, 64)),
+             (1.0, (255, 255, 255))],
+    'ocean': [(0.0, (0, 7, 100)), (0.16, (32, 107, 203)), (0.42, (237, 255, 255)), (0.64, (255, 170, 0)),
+              (0.86, (0, 2, 0)), (1.0, (0, 7, 100))],
+    'grayscale': [(0.0, (0, 0, 0)), (1.0, (255, 255, 255))],
+}
+
+
+def palette_lut(palette, size=1024):
+    '''
+    A lookup table of size colors for a palette: the name of one of PALETTES, or a list of
+    (position, (r, g, b)) stops. Returns a (size, 3) uint8 array.
+    '''
+    stops = PALETTES[palette] if isinstance(palette, str) else palette
+    positions = np.array([position for position, _ in stops], dtype=np.float64)
+    colors = np.array([color for _, color in stops], dtype=np.float64)
+    t = np.linspace(0, 1, size)
+    return np.round(np.stack([np.interp(t, positions, colors[:, i]) for i in range(3)], axis=-1)).astype(np.uint8)
+
+
+def hue_field(result, max_iter, style='smooth', initial_color_hue=0.0, color_scale=1.0):
+    '''
+    The value that picks each pixel's color.
+        style: 'smooth' for the normalized smooth iteration count (the mandelbrot's coloring),
+            'exp' for the accumulated exp(-|z|) sum (the julia coloring, needs a field rendered with exp_smoothing)
+        initial_color_hue, color_scale: the value is initial_color_hue + color_scale * (smooth value)
+    '''
+    if style == 'exp':
+        if result.exp_sum is None:
+            raise ValueError("style 'exp' needs a field rendered with exp_smoothing=True")
+        return exp_smooth_hue(result, max_iter, initial_color_hue, color_scale)
+    if style != 'smooth':
+        raise ValueError(f"unknown style {style!r}, expected 'smooth' or 'exp'")
+    return initial_color_hue + color_scale * smooth_hue(result, max_iter)
+
+
+def color_field(result, max_iter, style='smooth', initial_color_hue=0.0, color_scale=1.0, palette='hsv',
+                s=0.79, v=0.59, background=(0, 0, 0)):
+    '''
+    Color a raw field. Points that never escaped get the background color.
+
+        Parameters:
+            result: an EscapeResult
+            max_iter: the max_iter the field was rendered with
+            style, initial_color_hue, color_scale: see hue_field
+            palette: 'hsv' for the hue wheel at saturation s and value v (what the generators use),
+                the name of one of PALETTES, a list of color stops (see palette_lut), or a lookup table
+                as an (n, 3) array. The palettes wrap around: a value of 1.25 gets the same color as 0.25.
+            background: color of the points that never escaped
+
+        Returns a (height, width, 3) uint8 array
+    '''
+    hue = hue_field(result, max_iter, style, initial_color_hue, color_scale)
+    # color every point, then paint over the ones that never escaped: picking out the escaped points
+    #   first costs more than coloring the few extra points
+    if isinstance(palette, str) and palette == 'hsv':
+        rgb = hsv_to_rgb(hue, s, v)
+    else:
+        lut = palette if isinstance(palette, np.ndarray) else palette_lut(palette)
+        with np.errstate(invalid='ignore'):
+            index = (np.mod(hue, 1.0) * len(lut)).astype(np.int64) % len(lut)
+        # nan/inf (|z| exactly at the escape radius) land on the first color, like the hue wheel does
+        index[~np.isfinite(hue)] = 0
+        rgb = lut[index]
+    rgb[result.iterations >= max_iter] = background
+    return rgb
+
+
+def save_field(path, result, **params):
+    '''
+    Save a raw field to a compressed .npz file, with any parameters worth keeping alongside it
+    (max_iter, formula, center_point, ...) as long as they can be written as JSON.
+    '''
+    iterations = result.iterations
+    # iteration counts are small numbers: keep them in the smallest type they fit in
+    if iterations.size and iterations.max() < 2**16 and iterations.min() >= 0:
+        iterations = iterations.astype(np.uint16)
+    arrays = dict(iterations=iterations, magnitude=result.magnitude, params=json.dumps(params))
+    if result.exp_sum is not None:
+        arrays['exp_sum'] = result.exp_sum
+    np.savez_compressed(path, **arrays)
+
+
+def load_field(path):
+    '''Load a field saved by save_field. Returns (EscapeResult, dict of the saved parameters).'''
+    with np.load(path) as data:
+        result = EscapeResult(data['iterations'].astype(np.int32), data['magnitude'],
+                              data['exp_sum'] if 'exp_sum' in data.files else None)
+        params = json.loads(str(data['params']))
+    return result, params
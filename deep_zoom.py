@@ -0,0 +1,192 @@
+# deep_zoom.py
+"""
+Deep zooms of the mandelbrot set with perturbation theory.
+
+Past a zoom of about 1e13 neighbouring pixels are closer together than float64 can tell apart, so the image
+pixelates. Instead of iterating every pixel in arbitrary precision, one reference orbit Z_n is computed in
+high precision (Python's Decimal) at the center of the image, and each pixel only iterates its small
+difference from it in float64:
+
+    z_n = Z_n + d_n,    d_(n+1) = 2 Z_n d_n + d_n^2 + dc,    where dc is the pixel's offset from the center
+
+Series approximation: for the first iterations d_n is well approximated by A_n dc + B_n dc^2 + C_n dc^3, so
+every pixel can start at the last iteration where that approximation still holds.
+
+Glitches: when a pixel's orbit passes much closer to 0 than the reference does, d_n stops being small
+relative to z_n and float64 loses the precision the method relies on. Those pixels (and pixels that outlive
+the reference orbit) are rebased: their full value becomes the new d and they restart from the beginning of
+the reference orbit, where Z_0 = 0.
+
+Float64 deltas work down to pixel sizes around 1e-300, so zooms up to roughly 1e300.
+"""
+
+from decimal import Decimal, localcontext
+import math
+
+import numpy as np
+
+from engine import EscapeResult
+
+
+def to_decimal(value):
+    '''Convert a number or string to a Decimal without going through a binary float approximation.'''
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value))
+
+
+def needs_deep_zoom(center_point, zoom_level, image_size, x_max=2.3):
+    '''
+    Whether float64 can no longer resolve neighbouring pixels at this center and zoom
+    (or the center or zoom were given as strings or Decimals, which asks for deep zoom explicitly).
+    '''
+    if any(isinstance(value, (str, Decimal)) for value in (*center_point, zoom_level)):
+        return True
+    pixel_size = 2 * x_max / zoom_level / image_size[0]
+    center_size = max(abs(center_point[0]), abs(center_point[1]), 1.0)
+    # leave a few bits of the 52 for the iteration itself
+    return pixel_size < center_size * 2.0**-40
+
+
+def reference_orbit(center, max_iter, digits, escape_radius=2):
+    '''
+    Iterate z^2 + c from z = 0 at c = center in Decimal arithmetic with the given number of digits.
+    Returns the orbit as complex128, Z_0 = 0 up to the first point past the escape radius (or Z_max_iter).
+    '''
+    cr, ci = (to_decimal(value) for value in center)
+    orbit = [0j]
+    with localcontext() as context:
+        context.prec = digits
+        zr, zi = Decimal(0), Decimal(0)
+        limit = Decimal(escape_radius)**2
+        for _ in range(max_iter):
+            zr, zi = zr*zr - zi*zi + cr, 2*zr*zi + ci
+            orbit.append(complex(float(zr), float(zi)))
+            if zr*zr + zi*zi > limit:
+                break
+    return np.array(orbit, dtype=np.complex128)
+
+
+def series_coefficients(orbit, radius, tolerance=1e-12):
+    '''
+    Series approximation d_n ~ A_n dc + B_n dc^2 + C_n dc^3 along the reference orbit.
+    Returns (n, A_n, B_n, C_n) for the last n at which, for every |dc| <= radius, the cubic term is still
+    negligible next to the linear one and d_n is still small next to the escape radius.
+    '''
+    a, b, c = 0j, 0j, 0j
+    n = 0
+    for n_next in range(1, len(orbit)):
+        z = orbit[n_next - 1]
+        a_next = 2*z*a + 1
+        b_next = 2*z*b + a*a
+        c_next = 2*z*c + 2*a*b
+        if not (np.isfinite(a_next) and np.isfinite(b_next) and np.isfinite(c_next)) or \
+                abs(c_next) * radius**3 > tolerance * abs(a_next) * radius or abs(a_next) * radius > 1e-3:
+            break
+        a, b, c, n = a_next, b_next, c_next, n_next
+    return n, a, b, c
+
+
+def format_deep_stats(stats):
+    '''One line summary of the counters render_deep fills in, for verbose output.'''
+    return (f"reference orbit of {stats['reference_length']} iterations; {stats['iterations']} iterations computed, "
+            f"{stats['series_skipped']} skipped by series approximation; "
+            f"{stats['glitches']} glitched points, {stats['rebased']} rebases")
+
+
+def render_deep(image_size, center_point, zoom_level, max_iter=250, x_max=2.3, aspect_ratio=16/9,
+                series_approximation=True, stats=None, progress=None):
+    '''
+    Escape data for the mandelbrot set at any zoom, with perturbation theory.
+
+        Parameters:
+            image_size: Image size in pixels (tuple)
+            center_point: point at which the image is centered. Numbers, strings or Decimals;
+                use strings or Decimals for centers that need more than float64 precision.
+            zoom_level: any number from 1 to inf, as a number, string or Decimal
+            max_iter: number of iterations to run on a pixel
+            x_max, aspect_ratio: as for complex_bounds
+            series_approximation: skip the first iterations with the series approximation
+            stats: optional dict, counters are added to it (reference_length, series_skipped,
+                iterations, rebased, glitches)
+            progress: optional callable, called as progress(iteration, max_iter)
+
+        Returns an EscapeResult of (height, width) arrays, like engine.render for the 'mandelbrot' formula
+    '''
+    zoom = to_decimal(zoom_level)
+    width, height = image_size
+
+    # same geometry as complex_bounds, as offsets from the center
+    half_width = to_decimal(x_max) / zoom
+    half_height = (to_decimal(x_max) / to_decimal(aspect_ratio) if aspect_ratio > 1
+                   else to_decimal(x_max) * to_decimal(aspect_ratio)) / zoom
+    x_size = float(2 * half_width / width)
+    y_size = float(2 * half_height / height)
+    dcr = -float(half_width) + np.arange(width, dtype=np.float64) * x_size
+    dci = -float(half_height) + np.arange(height, dtype=np.float64) * y_size
+    dc = (dcr[None, :] + 1j * dci[:, None]).ravel()
+
+    # enough digits to place a pixel, plus headroom for the iteration
+    digits = max(30, zoom.adjusted() + int(math.log10(max(width, height))) + 20)
+    orbit = reference_orbit(center_point, max_iter, digits)
+    last = len(orbit) - 1
+
+    counts = {'reference_length': last, 'series_skipped': 0, 'iterations': 0, 'rebased': 0, 'glitches': 0}
+
+    skip, a, b, c = 0, 0j, 0j, 0j
+    if series_approximation:
+        radius = float(np.abs(dc).max())
+        skip, a, b, c = series_coefficients(orbit[:last], radius)
+    delta = a*dc + b*dc*dc + c*dc*dc*dc
+    counts['series_skipped'] = skip * dc.size
+
+    iterations = np.full(dc.size, max_iter, dtype=np.int32)
+    magnitude = np.zeros(dc.size, dtype=np.float64)
+    active = np.arange(dc.size)
+    # index into the reference orbit for every active pixel
+    ref = np.full(dc.size, skip, dtype=np.int64)
+
+    for l in range(skip, max_iter):
+        if active.size == 0:
+            break
+        reference = orbit[ref]
+        z = reference + delta
+        mag = np.abs(z)
+
+        escaped = mag > 2
+        if escaped.any():
+            done = active[escaped]
+            iterations[done] = l
+            magnitude[done] = mag[escaped]
+            keep = ~escaped
+            active, z, mag, delta, dc, ref, reference = (
+                active[keep], z[keep], mag[keep], delta[keep], dc[keep], ref[keep], reference[keep])
+
+        # Pauldelbrot's glitch criterion: the pixel is much closer to 0 than the reference
+        glitched = mag < 1e-3 * np.abs(reference)
+        counts['glitches'] += int(glitched.sum())
+        # rebase glitched pixels, pixels whose orbit is now closer to 0 than their delta is,
+        #   and pixels that are about to outlive the reference orbit
+        rebase = glitched | (mag < np.abs(delta)) | (ref >= last)
+        if rebase.any():
+            counts['rebased'] += int(rebase.sum())
+            delta[rebase] = z[rebase]
+            ref[rebase] = 0
+            reference[rebase] = 0
+
+        counts['iterations'] += delta.size
+        delta = 2*reference*delta + delta*delta + dc
+        ref += 1
+
+        if progress is not None:
+            progress(l + 1, max_iter)
+
+    # whatever is left never escaped
+    magnitude[active] = np.abs(orbit[ref] + delta)
+
+    if stats is not None:
+        for key, value in counts.items():
+            stats[key] = stats.get(key, 0) + value
+
+    shape = (height, width)
+    return EscapeResult(iterations.reshape(shape), magnitude.reshape(shape), None)
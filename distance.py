@@ -0,0 +1,327 @@
+# distance.py
+"""
+Exterior distance estimation and normal maps, from the derivative of the orbit.
+
+Alongside z, the engine's loop here also iterates its derivative dz:
+    mandelbrot: z -> z^2 + c, dz/dc -> 2 z dz/dc + 1, starting from z = 0, dz/dc = 0
+    julia:      z -> z^2 + c, dz/dz0 -> 2 z dz/dz0,   starting from z = z0, dz/dz0 = 1
+and once a point escapes, |z| log|z| / |dz| estimates its distance to the set (for a connected set, the true
+distance is between half and twice the estimate, by the Koebe quarter theorem) and z / dz points away from the
+set, which lights the image like a 3D surface. The mandelbrot set is connected, and so is the julia set of a c
+inside it; the julia set of a c outside it is dust, and the bound doesn't hold.
+
+Coloring by distance instead of by iteration count draws the filaments crisply whatever max_iter is: a pixel
+the filament passes through escapes late, but with a tiny distance estimate, so max_iter only has to be large
+enough for the filament to escape at all (see benchmarks/bench_distance.py). The estimate also proves whole
+blocks of pixels are far from the set, which render_distance's skip_distance uses to not iterate them.
+"""
+
+from collections import namedtuple
+import warnings
+
+import numpy as np
+
+from engine import complex_grid, in_cardioid_or_bulb, new_stats, merge_stats, hsv_to_rgb
+from formulas import get_formula
+
+
+# iterations: iteration at which the point escaped (max_iter if it never did)
+# distance: estimated distance to the set in the complex plane (0 for points that never escaped)
+# normal_x, normal_y: unit vector pointing away from the set (0 for points that never escaped)
+DistanceResult = namedtuple('DistanceResult', ['iterations', 'distance', 'normal_x', 'normal_y'])
+
+# formulas whose derivative the loop knows: z^2 + c on the parameter plane and on the dynamical plane
+DERIVATIVE_FORMULAS = ('mandelbrot', 'julia')
+
+
+def distance_estimate(z, c, formula='mandelbrot', max_iter=250, escape_radius=1000, progress=None,
+                      interior_check=False, stats=None):
+    '''
+    Iterate z and its derivative for every point until it escapes or max_iter is reached.
+
+        Parameters:
+            z: starting values, a (real, imaginary) pair of arrays
+            c: the constant added on each iteration, a (real, imaginary) pair of arrays or of numbers
+            formula: 'mandelbrot' (derivative with respect to c) or 'julia' (with respect to the starting z)
+            max_iter: number of iterations to run on a point
+            escape_radius: a point has escaped once |z| is greater than this. The estimate is only good well
+                outside the radius-2 circle the set lives in, so this is much larger than the engine's default.
+            progress: optional callable, called as progress(iteration, max_iter)
+            interior_check: don't iterate points inside the main cardioid or period-2 bulb (mandelbrot only)
+            stats: optional dict (see engine.new_stats) that the counters for this render are added to
+
+        Returns a DistanceResult of arrays shaped like z
+    '''
+    formula = get_formula(formula)
+    if formula.name not in DERIVATIVE_FORMULAS:
+        raise ValueError(f'no derivative for the {formula.name} formula, expected one of {DERIVATIVE_FORMULAS}')
+    step_function = formula.step
+    parameter_plane = formula.parameter_plane
+    shape = np.shape(z[0])
+
+    zr = np.array(z[0], dtype=np.float64).ravel()
+    zi = np.array(z[1], dtype=np.float64).ravel()
+    cr, ci = c
+    if np.ndim(cr) == 0 and np.ndim(ci) == 0:
+        cr, ci = float(cr), float(ci)
+        per_point_c = False
+    else:
+        cr = np.broadcast_to(np.asarray(cr, dtype=np.float64), shape).ravel()
+        ci = np.broadcast_to(np.asarray(ci, dtype=np.float64), shape).ravel()
+        per_point_c = True
+    # dz/dc starts at 0 (z0 doesn't depend on c), dz/dz0 at 1
+    dr = np.full(zr.size, 0.0 if parameter_plane else 1.0)
+    di = np.zeros(zr.size)
+
+    iterations = np.full(zr.size, max_iter, dtype=np.int32)
+    distance = np.zeros(zr.size, dtype=np.float64)
+    normal_x = np.zeros(zr.size, dtype=np.float64)
+    normal_y = np.zeros(zr.size, dtype=np.float64)
+    escape_radius2 = escape_radius * escape_radius
+
+    counts = new_stats()
+    counts['points'] = zr.size
+    active = np.arange(zr.size)
+
+    def drop(mask):
+        nonlocal active, zr, zi, dr, di, cr, ci
+        keep = ~mask
+        active = active[keep]
+        zr, zi, dr, di = zr[keep], zi[keep], dr[keep], di[keep]
+        if per_point_c:
+            cr, ci = cr[keep], ci[keep]
+
+    def finish(mask, l, mag2):
+        # record the escaped points in mask and drop them from the working arrays
+        done = active[mask]
+        iterations[done] = l
+        r, i, derivative_r, derivative_i = zr[mask], zi[mask], dr[mask], di[mask]
+        with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+            mag = np.sqrt(mag2[mask])
+            derivative = np.hypot(derivative_r, derivative_i)
+            # an overflowed derivative means the point is as good as on the set
+            distance[done] = np.where(np.isfinite(derivative), mag * np.log(mag) / derivative, 0.0)
+            # direction of z / dz = z * conj(dz) / |dz|^2
+            ur = r * derivative_r + i * derivative_i
+            ui = i * derivative_r - r * derivative_i
+            length = np.hypot(ur, ui)
+            normal_x[done] = np.where(length > 0, ur / length, 0.0)
+            normal_y[done] = np.where(length > 0, ui / length, 0.0)
+        drop(mask)
+
+    if interior_check:
+        if not per_point_c:
+            raise ValueError('interior_check needs a per-point c (mandelbrot-style rendering)')
+        inside = in_cardioid_or_bulb(cr, ci)
+        counts['interior_skipped'] = int(inside.sum())
+        counts['iterations_saved'] += counts['interior_skipped'] * max_iter
+        if counts['interior_skipped']:
+            drop(inside)
+
+    reported = 0
+    for l in range(max_iter):
+        if active.size == 0:
+            break
+
+        mag2 = zr*zr + zi*zi
+        escaped = mag2 > escape_radius2
+        if escaped.any():
+            finish(escaped, l, mag2)
+
+        if progress is not None:
+            progress(l + 1, max_iter)
+            reported = l + 1
+
+        counts['iterations'] += zr.size
+        # the derivative uses z before this step: d(z^2 + c) = 2 z dz (+ 1 for dc)
+        with np.errstate(over='ignore', invalid='ignore'):
+            dr, di = 2 * (zr*dr - zi*di), 2 * (zr*di + zi*dr)
+        if parameter_plane:
+            dr += 1
+        zr, zi = step_function(zr, zi, cr, ci)
+
+    if progress is not None and reported < max_iter:
+        progress(max_iter, max_iter)
+
+    if stats is not None:
+        merge_stats(stats, counts)
+
+    return DistanceResult(iterations.reshape(shape), distance.reshape(shape), normal_x.reshape(shape),
+                          normal_y.reshape(shape))
+
+
+def connected(c, max_iter=250):
+    '''
+    True if the julia set of c = (a, b) is connected, that is c is in the mandelbrot set: the orbit of 0 doesn't
+    escape within max_iter iterations.
+    '''
+    cr, ci = c
+    zr = zi = 0.0
+    for _ in range(max_iter):
+        zr, zi = zr*zr - zi*zi + cr, 2*zr*zi + ci
+        if zr*zr + zi*zi > 4:
+            return False
+    return True
+
+
+def render_distance(image_size, bounds, formula='mandelbrot', c=None, max_iter=250, escape_radius=1000,
+                    progress=None, interior_check=None, skip_distance=None, block=8, stats=None):
+    '''
+    Compute the distance estimate and normal of every pixel of an image.
+
+        Parameters:
+            image_size: Image size in pixels (tuple)
+            bounds: (x_min, x_max, y_min, y_max), see engine.complex_bounds
+            formula: 'mandelbrot' or 'julia'
+            c: (a, b) for the julia formula
+            max_iter, escape_radius, progress, stats: see distance_estimate
+            interior_check: see distance_estimate. None uses what the formula declares.
+            skip_distance: if given, first iterate only the corners of block x block squares, and don't iterate
+                the inside of a square whose corners are all provably more than skip_distance (in the complex
+                plane) from the set: its distances and normals are interpolated from the corners, which is
+                accurate that far from the set, where they change smoothly. Their iteration counts are copied
+                from the nearest corner, not interpolated, so coloring them by iteration count shows blocks.
+                A few times the pixel size keeps the boundary exact. The proof needs a connected set: for a
+                julia set whose c is outside the mandelbrot set (see connected), skip_distance is ignored with
+                a warning and every pixel is iterated.
+            block: size of those squares in pixels
+
+        Returns a DistanceResult of (height, width) arrays
+    '''
+    formula = get_formula(formula)
+    if interior_check is None:
+        interior_check = formula.interior_check
+    if not formula.parameter_plane and c is None:
+        raise ValueError(f'the {formula.name} formula needs c = (a, b)')
+    options = dict(formula=formula, max_iter=max_iter, escape_radius=escape_radius, progress=progress,
+                   interior_check=interior_check)
+
+    def start_values(re, im):
+        if formula.parameter_plane:
+            return (np.zeros(re.shape), np.zeros(re.shape)), (re, im)
+        return (re, im), c
+
+    grid = complex_grid(image_size, bounds)
+    if skip_distance is not None and not formula.parameter_plane and not connected(c, max_iter):
+        warnings.warn(f'the julia set of c = {tuple(c)} is not connected, so the distance estimate can\'t prove '
+                      'blocks far from it: iterating every pixel')
+        skip_distance = None
+    if skip_distance is None:
+        return distance_estimate(*start_values(*grid), stats=stats, **options)
+
+    counts = new_stats()
+    height, width = grid[0].shape
+    # the corners: every block-th row and column, and the last ones
+    ys = np.unique(np.r_[np.arange(0, height, block), height - 1])
+    xs = np.unique(np.r_[np.arange(0, width, block), width - 1])
+    # progress is reported for the rest, which is most of the work
+    coarse = distance_estimate(*start_values(grid[0][np.ix_(ys, xs)], grid[1][np.ix_(ys, xs)]), stats=counts,
+                               **dict(options, progress=None))
+    # every pixel of a square is within this of each of its corners
+    x_min, x_max, y_min, y_max = bounds
+    reach = np.hypot((x_max - x_min) / image_size[0], (y_max - y_min) / image_size[1]) * block
+    # the true distance is at least half the estimate
+    far = (coarse.iterations < max_iter) & (coarse.distance / 2 - reach > skip_distance)
+    far_square = far[:-1, :-1] & far[1:, :-1] & far[:-1, 1:] & far[1:, 1:]
+
+    # the square every pixel is in, and where in it
+    row = np.clip(np.searchsorted(ys, np.arange(height), 'right') - 1, 0, max(len(ys) - 2, 0))
+    column = np.clip(np.searchsorted(xs, np.arange(width), 'right') - 1, 0, max(len(xs) - 2, 0))
+    if len(ys) == 1 or len(xs) == 1:
+        far_square = np.zeros((1, 1), dtype=bool)
+        row[:], column[:] = 0, 0
+    filled = far_square[row[:, None], column[None, :]]
+    corner = np.zeros((height, width), dtype=bool)
+    corner[np.ix_(ys, xs)] = True
+    todo = ~filled & ~corner
+
+    fields = [np.empty((height, width), dtype=field.dtype) for field in coarse]
+    for field, values in zip(fields, coarse):
+        field[np.ix_(ys, xs)] = values
+    if filled.any():
+        y, x = np.nonzero(filled & ~corner)
+        j, i = row[y], column[x]
+        ty = (y - ys[j]) / (ys[j + 1] - ys[j])
+        tx = (x - xs[i]) / (xs[i + 1] - xs[i])
+
+        def interpolate(values):
+            top = values[j, i] * (1 - tx) + values[j, i + 1] * tx
+            bottom = values[j + 1, i] * (1 - tx) + values[j + 1, i + 1] * tx
+            return top * (1 - ty) + bottom * ty
+
+        fields[0][y, x] = coarse.iterations[j + np.round(ty).astype(int), i + np.round(tx).astype(int)]
+        fields[1][y, x] = interpolate(coarse.distance)
+        nx, ny = interpolate(coarse.normal_x), interpolate(coarse.normal_y)
+        length = np.hypot(nx, ny)
+        length[length == 0] = 1
+        fields[2][y, x], fields[3][y, x] = nx / length, ny / length
+    if todo.any():
+        part = distance_estimate(*start_values(grid[0][todo], grid[1][todo]), stats=counts, **options)
+        for field, values in zip(fields, part):
+            field[todo] = values
+    elif progress is not None:
+        progress(max_iter, max_iter)
+    counts['points'] = width * height
+    counts['interpolated'] = int(width * height - todo.sum() - corner.sum())
+    if stats is not None:
+        merge_stats(stats, counts)
+    return DistanceResult(*fields)
+
+
+def pixel_size(image_size, bounds):
+    '''Width of a pixel in the complex plane.'''
+    return (bounds[1] - bounds[0]) / image_size[0]
+
+
+def distance_color(result, max_iter, pixel, thickness=1.0, initial_color_hue=0.6, color_scale=0.15, s=0.6,
+                   v=1.0, background=(0, 0, 0)):
+    '''
+    Color a DistanceResult by distance: pixels darken towards the set over the last thickness pixels, so
+    filaments are drawn as lines of that width, and the hue changes with log distance.
+
+        Parameters:
+            result: a DistanceResult
+            max_iter: the max_iter it was rendered with
+            pixel: the width of a pixel in the complex plane (see pixel_size)
+            thickness: how thick the boundary is drawn, in pixels
+            initial_color_hue, color_scale: the hue is initial_color_hue + color_scale * log2(distance / pixel)
+            s, v: saturation and value of the exterior far from the set
+            background: color of the points that never escaped
+
+        Returns a (height, width, 3) uint8 array
+    '''
+    scaled = result.distance / (pixel * thickness)
+    with np.errstate(divide='ignore'):
+        hue = initial_color_hue + color_scale * np.log2(np.maximum(scaled, 1e-300))
+    # dark on the boundary, full brightness from a thickness away
+    shade = np.sqrt(np.clip(scaled, 0, 1))
+    rgb = np.round(hsv_to_rgb(hue, s, v) * shade[..., None]).astype(np.uint8)
+    rgb[result.iterations >= max_iter] = background
+    return rgb
+
+
+def normal_shade(result, max_iter, light_angle=45, light_height=1.5, base=None, ambient=0.2,
+                 background=(0, 0, 0)):
+    '''
+    Light the normal map: each escaped point is a surface tilted along its normal, lit from light_angle (degrees,
+    counterclockwise from the real axis) at light_height above the plane.
+
+        Parameters:
+            result: a DistanceResult
+            max_iter: the max_iter it was rendered with
+            light_angle, light_height: where the light comes from
+            base: (height, width, 3) uint8 colors to light, e.g. from distance_color or coloring.color_field.
+                None lights white.
+            ambient: brightness of the side facing away from the light
+            background: color of the points that never escaped
+
+        Returns a (height, width, 3) uint8 array
+    '''
+    angle = np.radians(light_angle)
+    lambert = (result.normal_x * np.cos(angle) + result.normal_y * np.sin(angle) + light_height) / (1 + light_height)
+    brightness = ambient + (1 - ambient) * np.clip(lambert, 0, 1)
+    if base is None:
+        base = np.full(result.iterations.shape + (3,), 255, dtype=np.uint8)
+    rgb = np.round(base * brightness[..., None]).astype(np.uint8)
+    rgb[result.iterations >= max_iter] = background
+    return rgb
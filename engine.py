@@ -0,0 +1,543 @@
+# engine.py
+"""
+Array-based escape-time engine shared by generate_mandelbrot_zoom, generate_julia and generate_fractal.
+The formulas it iterates live in formulas.py.
+
+Instead of walking the image pixel by pixel, the whole complex grid is iterated at once.
+Points that escape are recorded and dropped from the working arrays, so every iteration only
+touches the points that are still active.
+"""
+
+from collections import namedtuple
+from decimal import Decimal, localcontext
+import math
+from time import perf_counter
+import warnings
+
+import numpy as np
+
+from formulas import get_formula
+from precision import PRECISIONS, DoubleDouble, as_precision, leading, resolve_precision, supports_double_double, \
+    double_double_grid
+
+
+# iterations: iteration at which the point escaped (max_iter if it never did)
+# magnitude: |z| at escape, or after the last iteration for points that never escaped
+# exp_sum: accumulated exp(-|z|) smoothing sum (None unless requested)
+EscapeResult = namedtuple('EscapeResult', ['iterations', 'magnitude', 'exp_sum'])
+
+
+def complex_bounds(center_point=(0, 0), zoom_level=1, x_max=2.3, aspect_ratio=16/9):
+    '''
+    Find the boundaries of the complex plane in which the fractal will be generated.
+
+        Parameters:
+            center_point: point at which the image is centered
+            zoom_level: any number from 1 to inf.
+            x_max: maximum value on the real axis at zoom_level 1
+            aspect_ratio: ratio between sides of image
+
+        Returns (x_min, x_max, y_min, y_max).
+        If the center or the zoom are strings or Decimals (as for deep_zoom.py), the bounds are Decimals,
+        with every digit of the center, for the double-double precision tier (precision.py).
+    '''
+    if any(isinstance(value, (str, Decimal)) for value in (*center_point, zoom_level)):
+        with localcontext() as context:
+            context.prec = 60
+            center_point = tuple(Decimal(str(value)) for value in center_point)
+            zoom_level, x_max, aspect_ratio = (Decimal(str(value)) for value in (zoom_level, x_max, aspect_ratio))
+            return _bounds(center_point, zoom_level, x_max, aspect_ratio)
+    return _bounds(center_point, zoom_level, x_max, aspect_ratio)
+
+
+def _bounds(center_point, zoom_level, x_max, aspect_ratio):
+    # calculate image bounds like normal
+    if aspect_ratio > 1:
+        y_max = x_max / aspect_ratio
+    else:
+        y_max = x_max * aspect_ratio
+    x_min = -x_max
+    y_min = -y_max
+
+    # zooming, if desired
+    x_max = center_point[0] + x_max * 1/zoom_level
+    y_max = center_point[1] + y_max * 1/zoom_level
+    x_min = center_point[0] + x_min * 1/zoom_level
+    y_min = center_point[1] + y_min * 1/zoom_level
+
+    return x_min, x_max, y_min, y_max
+
+
+def complex_grid(image_size, bounds, rows=None):
+    '''
+    Return the real and imaginary parts of every pixel's coordinate as two (height, width) arrays.
+    Row y / column x hold the same value the per-pixel loops used: (x_min + x * x_size, y_min + y * y_size).
+    rows: optional (start, stop) to only build that band of rows
+    '''
+    x_min, x_max, y_min, y_max = bounds
+    x_size = (x_max - x_min)/image_size[0]
+    y_size = (y_max - y_min)/image_size[1]
+    start, stop = (0, image_size[1]) if rows is None else rows
+    re = x_min + np.arange(image_size[0], dtype=np.float64) * x_size
+    im = y_min + np.arange(start, stop, dtype=np.float64) * y_size
+    return np.broadcast_to(re, (stop - start, image_size[0])), \
+        np.broadcast_to(im[:, None], (stop - start, image_size[0]))
+
+
+BACKENDS = ('numpy', 'numba')
+
+
+def _numba_kernels():
+    # the compiled kernels, or None (with a warning) if numba isn't installed
+    try:
+        import numba_kernels
+    except ImportError:
+        warnings.warn('numba is not installed, falling back to the numpy backend')
+        return None
+    return numba_kernels
+
+
+def new_stats():
+    '''
+    Counters that escape_time adds to when given a stats dict.
+        points: number of points rendered
+        iterations: number of z updates actually computed
+        iterations_saved: z updates skipped by the interior check and periodicity checking
+        interior_skipped: points found inside the main cardioid or period-2 bulb
+        periodic: points whose orbit was caught in a cycle
+        mirrored: points copied from their mirror image instead of being rendered (render's symmetry option)
+        filled: points filled in by adaptive subdivision without being iterated (render's adaptive option)
+    '''
+    return {'points': 0, 'iterations': 0, 'iterations_saved': 0, 'interior_skipped': 0, 'periodic': 0,
+            'mirrored': 0, 'filled': 0}
+
+
+def merge_stats(total, part):
+    '''Add the counters in part to total.'''
+    for key, value in part.items():
+        total[key] = total.get(key, 0) + value
+    return total
+
+
+def format_stats(stats):
+    '''One line summary of the counters, for verbose output.'''
+    would_have_run = stats['iterations'] + stats['iterations_saved']
+    saved = stats['iterations_saved'] / would_have_run if would_have_run else 0
+    summary = (f"{stats['iterations']} iterations computed, {stats['iterations_saved']} saved ({saved:.1%}); "
+               f"{stats['interior_skipped']} points skipped by the cardioid/bulb test, "
+               f"{stats['periodic']} by periodicity checking")
+    if stats.get('filled'):
+        summary += f", {stats['filled']} filled in by adaptive subdivision"
+    if stats.get('antialiased'):
+        summary += f", {stats['antialiased']} pixels anti-aliased with {stats['samples']} extra samples"
+    if stats.get('interpolated'):
+        summary += f", {stats['interpolated']} far from the set interpolated from the distance estimate"
+    return summary
+
+
+def in_cardioid_or_bulb(cr, ci):
+    '''True for points c inside the main cardioid or the period-2 bulb of the mandelbrot set.'''
+    q = (cr - 0.25)**2 + ci*ci
+    cardioid = q * (q + (cr - 0.25)) < 0.25 * ci*ci
+    bulb = (cr + 1)**2 + ci*ci < 0.0625
+    return cardioid | bulb
+
+
+def escape_time(z, c, formula='mandelbrot', max_iter=250, escape_radius=None, exp_smoothing=False,
+                progress=None, backend='numpy', interior_check=False, periodicity=False, stats=None,
+                precision='float64'):
+    '''
+    Iterate every point of a complex grid until it escapes or max_iter is reached.
+
+        Parameters:
+            z: starting values, a (real, imaginary) pair of arrays
+            c: the constant added on each iteration, a (real, imaginary) pair of arrays or of numbers
+            formula: name of a formula in formulas.FORMULAS (or a Formula); only its step function is used here
+            max_iter: number of iterations to run on a point
+            escape_radius: a point has escaped once |z| is greater than this. Defaults to the formula's.
+            exp_smoothing: also accumulate the exp(-|z|) sum used to color julia sets
+            progress: optional callable, called as progress(iteration, max_iter)
+            backend: 'numpy', or 'numba' for the compiled per-pixel kernels in numba_kernels.py
+            interior_check: don't iterate points inside the main cardioid or period-2 bulb.
+                Only meaningful for the mandelbrot formula.
+            periodicity: stop iterating a point once its orbit repeats exactly (Brent's cycle detection).
+                The orbit is deterministic, so such a point can never escape.
+            stats: optional dict (see new_stats) that the counters for this render are added to
+            precision: 'float32', 'float64' or 'double-double' (see precision.py): what z and c are iterated in.
+                z and c can be DoubleDoubles for 'double-double'. The numba kernels iterate in float64 only:
+                'double-double' always uses the numpy backend, and 'float32' with backend 'numba' is a ValueError.
+
+        Returns an EscapeResult of arrays shaped like z.
+        Points stopped by the interior or periodicity checks get iterations = max_iter, and magnitude and
+        exp_sum from the iteration they were stopped at.
+    '''
+    formula = get_formula(formula)
+    if escape_radius is None:
+        escape_radius = formula.escape_radius
+    if backend not in BACKENDS:
+        raise ValueError(f'unknown backend {backend!r}, expected one of {BACKENDS}')
+    if precision not in PRECISIONS:
+        raise ValueError(f'unknown precision {precision!r}, expected one of {PRECISIONS}')
+    if precision == 'float32' and backend == 'numba':
+        raise ValueError("the numba kernels iterate in float64, use precision 'float64' or the numpy backend")
+    if precision == 'double-double' and not supports_double_double(formula):
+        raise ValueError(f'the {formula.name} formula uses numpy functions, it can\'t be iterated in double-double')
+    if backend == 'numba' and precision != 'double-double':
+        kernels = _numba_kernels()
+        if kernels is not None:
+            result = kernels.escape_time_numba(z, c, formula, max_iter, escape_radius, exp_smoothing,
+                                               interior_check, periodicity, stats)
+            if progress is not None:
+                progress(max_iter, max_iter)
+            return result
+
+    step_function = formula.step
+    shape = np.shape(z[0])
+
+    zr = as_precision(z[0], precision).copy().ravel()
+    zi = as_precision(z[1], precision).copy().ravel()
+    cr, ci = c
+    if np.ndim(cr) == 0 and np.ndim(ci) == 0:
+        cr, ci = (value if isinstance(value, DoubleDouble) else float(value) for value in (cr, ci))
+        per_point_c = False
+    else:
+        cr = as_precision(cr, precision, shape).ravel()
+        ci = as_precision(ci, precision, shape).ravel()
+        per_point_c = True
+
+    iterations = np.full(zr.size, max_iter, dtype=np.int32)
+    magnitude = np.zeros(zr.size, dtype=np.float64)
+    exp_sum = None
+    nsmooth = None
+    if exp_smoothing:
+        exp_sum = np.zeros(zr.size, dtype=np.float64)
+        nsmooth = np.exp(-np.hypot(leading(zr), leading(zi)), dtype=np.float64)
+
+    counts = new_stats()
+    counts['points'] = zr.size
+
+    # positions (in the flattened output) of the points that are still being iterated
+    active = np.arange(zr.size)
+    # the point of each orbit that periodicity checking compares against
+    saved_r, saved_i = (zr.copy(), zi.copy()) if periodicity else (None, None)
+
+    def finish(mask, l, mag=None):
+        # record the points in mask as stopped at iteration l and drop them from the working arrays
+        nonlocal active, zr, zi, cr, ci, nsmooth, saved_r, saved_i
+        done = active[mask]
+        iterations[done] = l
+        magnitude[done] = np.hypot(leading(zr[mask]), leading(zi[mask])) if mag is None else mag[mask]
+        if exp_smoothing:
+            exp_sum[done] = nsmooth[mask]
+
+        keep = ~mask
+        active = active[keep]
+        zr, zi = zr[keep], zi[keep]
+        if per_point_c:
+            cr, ci = cr[keep], ci[keep]
+        if exp_smoothing:
+            nsmooth = nsmooth[keep]
+        if periodicity:
+            saved_r, saved_i = saved_r[keep], saved_i[keep]
+
+    if interior_check:
+        if not per_point_c:
+            raise ValueError('interior_check needs a per-point c (mandelbrot-style rendering)')
+        inside = in_cardioid_or_bulb(leading(cr), leading(ci))
+        counts['interior_skipped'] = int(inside.sum())
+        counts['iterations_saved'] += counts['interior_skipped'] * max_iter
+        if counts['interior_skipped']:
+            finish(inside, max_iter)
+
+    reported = 0
+    for l in range(max_iter):
+        if active.size == 0:
+            break
+
+        mag = np.hypot(leading(zr), leading(zi))
+        if exp_smoothing:
+            nsmooth += np.exp(-mag)
+
+        escaped = mag > escape_radius
+        if escaped.any():
+            finish(escaped, l, mag)
+
+        if progress is not None:
+            progress(l + 1, max_iter)
+            reported = l + 1
+
+        counts['iterations'] += zr.size
+        zr, zi = step_function(zr, zi, cr, ci)
+
+        if periodicity and zr.size:
+            repeated = (zr == saved_r) & (zi == saved_i)
+            if repeated.any():
+                found = int(repeated.sum())
+                counts['periodic'] += found
+                counts['iterations_saved'] += found * (max_iter - (l + 1))
+                finish(repeated, max_iter)
+            # Brent: move the saved point forward whenever the number of updates is a power of two
+            if (l + 1) & l == 0:
+                saved_r, saved_i = zr.copy(), zi.copy()
+
+    if progress is not None and reported < max_iter:
+        progress(max_iter, max_iter)
+
+    # whatever is left never escaped
+    magnitude[active] = np.hypot(leading(zr), leading(zi))
+    if exp_smoothing:
+        exp_sum[active] = nsmooth
+
+    if stats is not None:
+        merge_stats(stats, counts)
+
+    return EscapeResult(
+        iterations.reshape(shape),
+        magnitude.reshape(shape),
+        None if exp_sum is None else exp_sum.reshape(shape),
+    )
+
+
+def render(image_size, bounds, formula='mandelbrot', c=None, max_iter=250, escape_radius=None,
+           exp_smoothing=False, workers=1, progress=None, backend='numpy', interior_check=None,
+           periodicity=None, symmetry=False, stats=None, rows=None, adaptive=False, precision=None,
+           telemetry=None):
+    '''
+    Compute the escape data for every pixel of an image.
+
+        Parameters:
+            image_size: Image size in pixels (tuple)
+            bounds: (x_min, x_max, y_min, y_max), see complex_bounds
+            formula: name of a formula in formulas.FORMULAS (or a Formula)
+            c: (a, b) for formulas where the pixel is the starting z (julia-style). Ignored on the parameter plane.
+            max_iter, escape_radius, exp_smoothing, backend, stats: see escape_time
+            interior_check, periodicity: see escape_time. None uses what the formula declares.
+            symmetry: only compute half of the image and mirror the rest, if the formula is symmetric and
+                the image is centered on its axis of symmetry. Mirrored coordinates can differ from the
+                computed ones in the last bit, so this is off by default.
+            workers: number of processes to render with. 1 renders in this process, None uses every core
+            progress: optional callable, called as progress(done, total)
+            rows: optional (start, stop) to only render that band of rows
+            adaptive: fill rectangles whose whole border never escapes without iterating their inside
+                (Mariani-Silver subdivision, see adaptive.py). 'escaped' also fills rectangles whose border
+                escapes at a single iteration count, with approximate smooth values inside.
+            precision: 'float32', 'float64' or 'double-double' to iterate in (see precision.py). None iterates
+                in float64, or double-double where float64 can't resolve the pixels; 'auto' picks the cheapest
+                tier that resolves them, float32 included (from float64 up with the numba backend, which has no
+                float32 kernels). Double-double needs bounds with more digits than float64 has (Decimals, from
+                complex_bounds given a string center) to show more detail.
+                Double-double images aren't mirrored or adaptively subdivided.
+            telemetry: a telemetry.Telemetry to report progress, per-tile timings and totals to, in place of
+                progress. A single-process render is then iterated in bands of telemetry.band_rows rows
+                (the same pixels, timed band by band); with workers, every band is timed in its worker.
+
+        Returns an EscapeResult of (height, width) arrays
+    '''
+    if telemetry is None:
+        return _render(image_size, bounds, formula, c, max_iter, escape_radius, exp_smoothing, workers, progress,
+                       backend, interior_check, periodicity, symmetry, stats, rows, adaptive, precision)
+    telemetry.start(image_size)
+    counts = new_stats()
+    result = _render(image_size, bounds, formula, c, max_iter, escape_radius, exp_smoothing, workers, telemetry,
+                     backend, interior_check, periodicity, symmetry, counts, rows, adaptive, precision, telemetry)
+    if stats is not None:
+        merge_stats(stats, counts)
+    telemetry.finish(result, max_iter, counts, rows)
+    return result
+
+
+def _render(image_size, bounds, formula, c, max_iter, escape_radius, exp_smoothing, workers, progress, backend,
+            interior_check, periodicity, symmetry, stats, rows, adaptive, precision, telemetry=None):
+    # render without the telemetry bookkeeping of a whole render; telemetry only gets tile events here
+    formula = get_formula(formula)
+    precision = resolve_precision(precision, image_size, bounds, formula, backend)
+    if precision == 'double-double':
+        if adaptive:
+            warnings.warn('adaptive subdivision works in float32 and float64 only, iterating every pixel')
+        symmetry = adaptive = False
+    else:
+        bounds = tuple(float(value) for value in bounds)
+    if interior_check is None:
+        interior_check = formula.interior_check
+    if periodicity is None:
+        periodicity = formula.periodicity
+    if not formula.parameter_plane and c is None:
+        raise ValueError(f'the {formula.name} formula needs c = (a, b)')
+    if rows is None:
+        rows = (0, image_size[1])
+
+    options = dict(formula=formula, c=c, max_iter=max_iter, escape_radius=escape_radius,
+                   exp_smoothing=exp_smoothing, workers=workers, progress=progress, backend=backend,
+                   interior_check=interior_check, periodicity=periodicity, stats=stats, adaptive=adaptive,
+                   precision=precision, telemetry=telemetry)
+
+    if symmetry and formula.symmetry is not None:
+        plan = _mirror_plan(image_size, bounds, rows, formula.symmetry)
+        if plan is not None:
+            return _render_mirrored(image_size, bounds, rows, plan, formula.symmetry, options)
+
+    if workers != 1:
+        from parallel import parallel_render
+        return parallel_render(image_size, bounds, rows=rows, **options)
+
+    if telemetry is not None:
+        return _render_bands(image_size, bounds, rows, options)
+
+    del options['telemetry']
+    if adaptive:
+        from adaptive import adaptive_render
+        del options['workers'], options['adaptive']
+        return adaptive_render(image_size, bounds, rows=rows, fill_escaped=adaptive == 'escaped', **options)
+
+    del options['workers'], options['c'], options['adaptive']
+    return escape_time(*_start_values(image_size, bounds, rows, formula, c, precision), **options)
+
+
+def _render_bands(image_size, bounds, rows, options):
+    # a single-process render, band by band, sending a tile event per band to the telemetry
+    #   (an adaptive render is one band: subdivision works best on the whole image)
+    telemetry = options['telemetry']
+    band_rows = rows[1] - rows[0] if options['adaptive'] else telemetry.band_rows
+    band_options = dict(options, progress=None, telemetry=None)
+    parts = []
+    for start in range(rows[0], rows[1], band_rows):
+        band = (start, min(start + band_rows, rows[1]))
+        counts = new_stats()
+        began = perf_counter()
+        parts.append(_render(image_size, bounds, rows=band, symmetry=False, **dict(band_options, stats=counts)))
+        telemetry.tile(band, None, perf_counter() - began, counts)
+        if options['stats'] is not None:
+            merge_stats(options['stats'], counts)
+        telemetry(band[1] - rows[0], rows[1] - rows[0])
+    return EscapeResult(*(None if fields[0] is None else np.concatenate(fields) for fields in zip(*parts)))
+
+
+def _start_values(image_size, bounds, rows, formula, c, precision='float64'):
+    # the (z, c) pair to iterate for a band of rows
+    if precision == 'double-double':
+        grid = double_double_grid(image_size, bounds, rows)
+    else:
+        grid = complex_grid(image_size, bounds, rows)
+    if formula.parameter_plane:
+        z = tuple(np.full(grid[0].shape, value) for value in formula.critical_point)
+        return z, grid
+    return grid, c
+
+
+def _mirror_plan(image_size, bounds, rows, symmetry):
+    # Find which rows are mirror images of other rows.
+    # Returns ((start, split) of the rows to compute, {mirrored row: source row}),
+    #   or None if this isn't the whole image or the image isn't centered on the axis.
+    x_min, x_max, y_min, y_max = bounds
+    width, height = image_size
+    if rows != (0, height) or height < 2:
+        return None
+    if symmetry == 'origin':
+        x_size = (x_max - x_min)/width
+        # column x mirrors column width - x
+        if abs((x_min + width * x_size) + x_min) > 1e-9 * x_size:
+            return None
+    # row y mirrors row height - y when the rows are centered on the real axis
+    y_size = (y_max - y_min)/height
+    if abs((y_min + height * y_size) + y_min) > 1e-9 * y_size:
+        return None
+
+    split = height // 2 + 1
+    return (0, split), {y: height - y for y in range(split, height)}
+
+
+def _render_mirrored(image_size, bounds, rows, plan, symmetry, options):
+    # render the computed rows, then fill the mirrored ones from them
+    (start, split), mirrors = plan
+    half = _render(image_size, bounds, rows=(start, split), symmetry=False, **options)
+
+    fields = []
+    for computed in half:
+        if computed is None:
+            fields.append(None)
+            continue
+        full = np.empty((rows[1] - rows[0],) + computed.shape[1:], dtype=computed.dtype)
+        full[:split - start] = computed
+        for y, source in mirrors.items():
+            row = computed[source - start]
+            if symmetry == 'origin':
+                # pixel (x, y) mirrors (width - x, height - y); column 0 has no mirror and is filled below
+                row = np.concatenate([row[:1], row[:0:-1]])
+            full[y - start] = row
+        fields.append(full)
+    result = EscapeResult(*fields)
+
+    if symmetry == 'origin':
+        # column 0 of the mirrored rows has no counterpart in the image, so compute it directly
+        mirrored_rows = np.array(sorted(mirrors))
+        x_min, x_max, y_min, y_max = bounds
+        y_size = (y_max - y_min)/image_size[1]
+        zr = np.full(mirrored_rows.size, x_min)
+        zi = y_min + mirrored_rows.astype(np.float64) * y_size
+        formula = options['formula']
+        z, c = ((np.zeros_like(zr), np.zeros_like(zi)), (zr, zi)) if formula.parameter_plane \
+            else ((zr, zi), options['c'])
+        column = escape_time(z, c, formula, options['max_iter'], options['escape_radius'],
+                             options['exp_smoothing'], backend=options['backend'],
+                             interior_check=options['interior_check'], periodicity=options['periodicity'],
+                             stats=options['stats'], precision=options['precision'])
+        for field, values in zip(result, column):
+            if field is not None:
+                field[mirrored_rows - rows[0], 0] = values
+
+    if options['stats'] is not None:
+        options['stats']['mirrored'] += len(mirrors) * (image_size[0] - (symmetry == 'origin'))
+    return result
+
+
+def smooth_hue(result, max_iter):
+    '''Normalized smooth iteration count, (l + 1 - log10(log2|z|)/log10(2))/max_iter, as used by the mandelbrot renderer.'''
+    with np.errstate(all='ignore'):
+        return (result.iterations + 1 - np.log10(np.log2(result.magnitude))/math.log10(2))/max_iter
+
+
+def exp_smooth_hue(result, max_iter, initial_color_hue, color_scale):
+    '''Hue from the accumulated exp(-|z|) sum, as used by the julia renderer.'''
+    return initial_color_hue + color_scale * (result.exp_sum/max_iter)
+
+
+def hsv_to_rgb(h, s, v):
+    '''
+    Vectorized colorsys.hsv_to_rgb, scaled and rounded to 0-255 the same way the per-pixel
+    hsv2rgb did (see benchmarks/legacy.py).
+    h is an array, s and v are numbers. Returns an array of shape h.shape + (3,) of uint8.
+    '''
+    h = np.asarray(h, dtype=np.float64)
+    if s == 0.0:
+        return np.repeat(np.round(np.full(h.shape + (1,), v) * 255), 3, axis=-1).astype(np.uint8)
+    with np.errstate(invalid='ignore'):
+        i = np.trunc(h*6.0)
+        f = (h*6.0) - i
+        sector = i.astype(np.int64) % 6
+        # v and p are the same for every point, so only q and t are arrays; each is rounded to 0-255 once
+        #   and the channels pick from the rounded values
+        value = np.uint8(round(v*255))
+        p = np.uint8(round(v*(1.0 - s)*255))
+        q = np.round(v*(1.0 - s*f)*255).astype(np.uint8)
+        t = np.round(v*(1.0 - s*(1.0-f))*255).astype(np.uint8)
+
+    rgb = np.empty(h.shape + (3,), dtype=np.uint8)
+    for channel, picks in enumerate(_HSV_PICKS):
+        rgb[..., channel] = np.choose(picks[sector], [value, p, q, t])
+    return rgb
+
+
+# which of (v, p, q, t) each of r, g and b is in each of the six sectors of the hue wheel, as in colorsys
+_HSV_PICKS = np.array([
+    [0, 2, 1, 1, 3, 0],
+    [3, 0, 0, 2, 1, 1],
+    [1, 1, 3, 0, 0, 2],
+])
+
+
+def colorize(hue, mask, s=0.79, v=0.59, background=(0, 0, 0)):
+    '''Color the points in mask by hue and everything else with the background color. Returns a (height, width, 3) uint8 array.'''
+    rgb = np.empty(np.shape(mask) + (3,), dtype=np.uint8)
+    rgb[...] = background
+    rgb[mask] = hsv_to_rgb(hue[mask], s, v)
+    return rgb
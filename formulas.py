@@ -0,0 +1,142 @@
+# formulas.py
+"""
+Registry of the fractal formulas the engine knows how to render.
+
+A formula is a small step function, z_next = f(z, c), written on the real and imaginary parts, plus a few
+facts about it the engine can use:
+    escape_radius: a point has escaped once |z| is greater than this
+    parameter_plane: True if each pixel is c and z starts at critical_point (mandelbrot-style),
+        False if each pixel is the starting z and c is given (julia-style)
+    critical_point: where z starts on the parameter plane
+    interior_check: the main cardioid / period-2 bulb test applies (only true for the mandelbrot itself)
+    periodicity: periodicity checking is worth doing (the set has a large interior)
+    symmetry: 'conjugate' if the image is mirrored across the real axis, 'origin' if it is symmetric
+        under z -> -z, None otherwise
+    scalar_step: a version of step for single numbers, used by the numba backend.
+        Only needed when step uses numpy-only functions (np.where and friends).
+
+Adding a fractal means writing its step function and calling register_formula.
+"""
+
+from collections import namedtuple
+import math
+
+import numpy as np
+
+
+Formula = namedtuple('Formula', [
+    'name', 'step', 'escape_radius', 'parameter_plane', 'critical_point', 'interior_check',
+    'periodicity', 'symmetry', 'scalar_step', 'description',
+])
+
+FORMULAS = {}
+
+
+def register_formula(name, step, escape_radius=2, parameter_plane=True, critical_point=(0.0, 0.0),
+                     interior_check=False, periodicity=True, symmetry=None, scalar_step=None,
+                     description=''):
+    '''Add a formula to the registry and return it. See the module docstring for the parameters.'''
+    formula = Formula(name, step, escape_radius, parameter_plane, critical_point, interior_check,
+                      periodicity, symmetry, scalar_step or step, description)
+    FORMULAS[name] = formula
+    return formula
+
+
+def get_formula(formula):
+    '''Look up a formula by name. Formula objects are passed through unchanged.'''
+    if isinstance(formula, Formula):
+        return formula
+    try:
+        return FORMULAS[formula]
+    except KeyError:
+        raise ValueError(f'unknown formula {formula!r}, expected one of {sorted(FORMULAS)}') from None
+
+
+# Step functions take the real/imaginary parts of z and c and return the next z.
+# They are written out component-wise so the arithmetic is exactly what Python's complex type does,
+#   and so the same function works on numpy arrays and, compiled by numba, on single numbers.
+def step_square(zr, zi, cr, ci):
+    # z**2 + c
+    return zr*zr - zi*zi + cr, zr*zi + zi*zr + ci
+
+
+def step_burning_ship(zr, zi, cr, ci):
+    # (|Re z| + i|Im z|)**2 + c
+    zr, zi = abs(zr), abs(zi)
+    return zr*zr - zi*zi + cr, zr*zi + zi*zr + ci
+
+
+def step_tricorn(zr, zi, cr, ci):
+    # conj(z)**2 + c
+    return zr*zr - zi*zi + cr, -(zr*zi + zi*zr) + ci
+
+
+def multibrot_step(power):
+    '''Step function for z**power + c, for an integer power >= 2, by repeated multiplication.'''
+    def step(zr, zi, cr, ci):
+        wr, wi = zr, zi
+        for _ in range(power - 1):
+            wr, wi = wr*zr - wi*zi, wr*zi + wi*zr
+        return wr + cr, wi + ci
+    return step
+
+
+def step_exotic(zr, zi, cr, ci):
+    # z**(1/z) + c, following CPython's complex division and complex power
+    with np.errstate(all='ignore'):
+        # w = 1/z
+        real_wins = np.abs(zr) >= np.abs(zi)
+        ratio = np.where(real_wins, zi / zr, zr / zi)
+        denom = np.where(real_wins, zr + zi * ratio, zr * ratio + zi)
+        wr = np.where(real_wins, 1.0 / denom, ratio / denom)
+        wi = np.where(real_wins, -ratio / denom, -1.0 / denom)
+
+        # z**w
+        vabs = np.hypot(zr, zi)
+        length = np.power(vabs, wr)
+        at = np.arctan2(zi, zr)
+        phase = at * wr
+        complex_exponent = wi != 0.0
+        length = np.where(complex_exponent, length / np.exp(at * wi), length)
+        phase = np.where(complex_exponent, phase + wi * np.log(vabs), phase)
+
+        return length * np.cos(phase) + cr, length * np.sin(phase) + ci
+
+
+def scalar_step_exotic(zr, zi, cr, ci):
+    # step_exotic for single numbers
+    if abs(zr) >= abs(zi):
+        ratio = zi / zr
+        denom = zr + zi * ratio
+        wr = 1.0 / denom
+        wi = -ratio / denom
+    else:
+        ratio = zr / zi
+        denom = zr * ratio + zi
+        wr = ratio / denom
+        wi = -1.0 / denom
+
+    vabs = math.hypot(zr, zi)
+    length = vabs ** wr
+    at = math.atan2(zi, zr)
+    phase = at * wr
+    if wi != 0.0:
+        length = length / math.exp(at * wi)
+        phase = phase + wi * math.log(vabs)
+    return length * math.cos(phase) + cr, length * math.sin(phase) + ci
+
+
+register_formula('mandelbrot', step_square, interior_check=True, symmetry='conjugate',
+                 description='z^2 + c, z starting at 0, c the pixel')
+register_formula('julia', step_square, parameter_plane=False, symmetry='origin',
+                 description='z^2 + c, z starting at the pixel, c = a + ib')
+register_formula('burning_ship', step_burning_ship,
+                 description='(|Re z| + i|Im z|)^2 + c, z starting at 0, c the pixel')
+register_formula('tricorn', step_tricorn, symmetry='conjugate',
+                 description='conj(z)^2 + c, z starting at 0, c the pixel')
+for power in (3, 4, 5):
+    register_formula(f'multibrot{power}', multibrot_step(power), symmetry='conjugate',
+                     description=f'z^{power} + c, z starting at 0, c the pixel')
+register_formula('exotic', step_exotic, escape_radius=1, parameter_plane=False, periodicity=False,
+                 scalar_step=scalar_step_exotic,
+                 description='z^(1/z) + c, z starting at the pixel, c = a + ib')
@@ -1,41 +1,215 @@
 #! /usr/bin/env python3
 # gif.py
-"""Function to generate a gif from a numbered list of files in a directory."""
+"""
+Functions to generate a gif (or video) from a numbered list of files in a directory, or straight from a
+generator of frames.
 
+Frames are appended to the file one at a time as they come in, so memory use doesn't grow with the
+number of frames, and a renderer can feed frames in as it makes them without saving them as PNGs first.
+"""
 
-def generate_gif(directory: ("Folder name", "positional"),
-                 image_format: ('Image format', 'positional') = '.png',
-                 print_file_names=False):
-    """Generate a gif from a numbered list of files in a directory."""
-    import imageio
+from itertools import chain, islice
+
+
+def frame_files(directory, image_format='.png'):
+    '''
+    The frame files in a directory (or matching a glob pattern), in numbered order.
+    '''
+    import os
     from glob import glob
     from natsort import natsorted
 
-    images = []
-    # Create a list of file names in the specified directory
-    filenames = glob(directory + '/*' + image_format)
-
-    filenames = natsorted(filenames, key=lambda y: y.lower())
-    # Sort the list 'filenames' using the traditional method.
-    # Traditional method -
+    pattern = directory + '/*' + image_format if os.path.isdir(directory) else directory
+    # Sort the file names the traditional way -
     #   isolate the entire first number in the string, then sort by that number
     # If this step is not included,
     #   files will be sorted like so: 0, 100, 110, 200, 3, 420, etc...
+    return natsorted(glob(pattern), key=lambda y: y.lower())
+
+
+def as_array(frame):
+    '''A frame (numpy array, PIL image, or image or .npy file name) as an RGB numpy array.'''
+    import numpy as np
+    from PIL import Image
+
+    if isinstance(frame, str) and frame.lower().endswith('.npy'):
+        # RGB arrays saved as they are (see image_writer.py)
+        return np.load(frame)
+    if isinstance(frame, str):
+        with Image.open(frame) as image:
+            return np.asarray(image.convert('RGB'))
+    if isinstance(frame, Image.Image):
+        return np.asarray(frame.convert('RGB'))
+    return np.asarray(frame)
+
+
+def global_palette(frames, colors=256):
+    '''
+    One palette for a whole animation, computed from a sample of its frames.
+    Returns a 'P' mode PIL image holding the palette, for apply_palette.
+    '''
+    import numpy as np
+    from PIL import Image
+
+    # stack the sample into one tall image and let Pillow pick the colors for all of it at once
+    sample = np.concatenate([as_array(frame)[..., :3] for frame in frames], axis=0)
+    return Image.fromarray(sample).quantize(colors, method=Image.Quantize.MEDIANCUT)
+
+
+def _palette_image(frame, palette):
+    # a frame mapped to the colors of palette, as a 'P' mode PIL image
+    from PIL import Image
+
+    # no dithering: dither patterns change from frame to frame and make the animation shimmer
+    return Image.fromarray(as_array(frame)[..., :3]).quantize(palette=palette, dither=Image.Dither.NONE)
+
+
+def apply_palette(frame, palette):
+    '''Map every pixel of a frame to the nearest color of palette (see global_palette), as an RGB array.'''
+    import numpy as np
+
+    return np.asarray(_palette_image(frame, palette).convert('RGB'))
+
+
+def _gif_blocks(image):
+    # a 'P' mode image as the blocks of one gif frame: (width, height) and the image descriptor, with the frame's
+    #   colors as its local color table, followed by the image data. Pillow encodes the frame as a gif of its own
+    #   (Pillow's save_all would keep every frame until the end), and the blocks are cut out of it following the
+    #   gif format
+    from io import BytesIO
+
+    buffer = BytesIO()
+    image.save(buffer, 'GIF')
+    data = buffer.getvalue()
+    # logical screen descriptor: width, height, flags (global color table and its size), background, aspect
+    size = int.from_bytes(data[6:8], 'little'), int.from_bytes(data[8:10], 'little')
+    flags = data[10]
+    position = 13
+    table = b''
+    if flags & 0x80:
+        table = data[position:position + (3 << (flags & 7) + 1)]
+        position += len(table)
+    # skip extensions: introducer, label, then sub-blocks of a length byte and data, up to an empty one
+    while data[position] == 0x21:
+        position += 2
+        while data[position]:
+            position += data[position] + 1
+        position += 1
+    if data[position] != 0x2C or data[-1] != 0x3B:
+        raise ValueError('unexpected gif structure')
+    descriptor = bytearray(data[position:position + 10])
+    if not descriptor[9] & 0x80:
+        # the global color table becomes the frame's local one, with the same size
+        descriptor[9] = descriptor[9] & 0x40 | 0x80 | flags & 7
+        descriptor += table
+    return size, bytes(descriptor) + data[position + 10:-1]
+
+
+def _write_gif(file, frames, fps):
+    # write frames (arrays, PIL images, file names, or 'P' mode images already mapped to a palette) to a looping
+    #   gif one at a time, every frame with its own color table. Returns the number of frames written
+    from PIL import Image
+
+    delay = max(1, round(100 / fps)).to_bytes(2, 'little')
+    count = 0
+    for frame in frames:
+        if not (isinstance(frame, Image.Image) and frame.mode == 'P'):
+            frame = Image.fromarray(as_array(frame)[..., :3]).quantize(256)
+        size, blocks = _gif_blocks(frame)
+        if count == 0:
+            # header and logical screen descriptor without a global color table, then loop forever
+            file.write(b'GIF89a' + size[0].to_bytes(2, 'little') + size[1].to_bytes(2, 'little') + b'\0\0\0')
+            file.write(b'\x21\xff\x0bNETSCAPE2.0\x03\x01\0\0\0')
+        # graphic control extension: the frame's delay in hundredths of a second, no transparency
+        file.write(b'\x21\xf9\x04\0' + delay + b'\0\0')
+        file.write(blocks)
+        count += 1
+    if count == 0:
+        raise ValueError('no frames to write')
+    # trailer
+    file.write(b'\x3b')
+    return count
+
+
+def write_animation(frames, output, fps=10, palette=False, palette_sample=16, image_format='.png'):
+    '''
+    Stream frames into a gif or video file, one frame at a time.
+
+        Parameters:
+            frames: a directory or glob pattern of numbered image files, or any iterable (a generator from a
+                renderer, for instance) of numpy arrays, PIL images or file names
+            output: file to write. '.gif' is written with Pillow, anything else ('.mp4', ...) is piped to
+                ffmpeg through imageio (needs the imageio and imageio-ffmpeg packages). A gif is written under
+                a temporary name and only renamed to output once every frame is in it.
+            fps: frames per second
+            palette: quantize every frame to one palette computed from palette_sample frames, instead of
+                giving every gif frame its own palette (which makes colors flicker between frames)
+            palette_sample: number of frames to compute the palette from. For a directory they are spread
+                over the whole animation; for a generator they are the first frames (kept in memory until
+                the palette is computed).
+            image_format: file extension of the frames when frames is a directory
+
+        Returns the number of frames written. Raises ValueError if there are no frames.
+    '''
+    if isinstance(frames, str):
+        frames = frame_files(frames, image_format)
+
+    if palette:
+        if isinstance(frames, (list, tuple)):
+            step = max(1, len(frames) // palette_sample)
+            frame_palette = global_palette(frames[::step][:palette_sample])
+        else:
+            frames = iter(frames)
+            sample = list(islice(frames, palette_sample))
+            frame_palette = global_palette(sample)
+            frames = chain(sample, frames)
+        frames = (_palette_image(frame, frame_palette) for frame in frames)
+
+    if output.lower().endswith('.gif'):
+        from image_writer import atomic_write
+
+        # each frame is appended to the file as it comes in
+        with atomic_write(output) as file:
+            return _write_gif(file, frames, fps)
+
+    import imageio
+    count = 0
+    with imageio.get_writer(output, mode='I', fps=fps) as writer:
+        for frame in frames:
+            writer.append_data(as_array(frame))
+            count += 1
+    if count == 0:
+        raise ValueError('no frames to write')
+    return count
+
+
+def generate_gif(directory, image_format='.png', print_file_names=False, output=None, fps=10, palette=False):
+    """
+    Generate a gif from a numbered list of files in a directory.
+
+        Parameters:
+            directory: folder name (or a glob pattern)
+            image_format: extension of the frames
+            print_file_names: print the frames, in order (for troubleshooting)
+            output: output file, .gif or .mp4. Defaults to the folder name + .gif
+            fps: frames per second
+            palette: use one palette, sampled from the frames, for every frame
+    """
+    # Create a list of file names in the specified directory
+    filenames = frame_files(directory, image_format)
 
     if print_file_names:  # For troubleshooting
         for i in filenames:
             print(i)
 
-    for filename in filenames:
-        images.append(imageio.imread(filename))
-    # Append each file to the list that will become the gif
-
-    imageio.mimsave(directory + '.gif', images)
     # Save the gif as the name of the directory
     #   that the images were generated from
+    write_animation(filenames, output or directory + '.gif', fps, palette)
     return
 
 
 if __name__ == "__main__":
-    import plac
-    plac.call(generate_gif)
+    # python gif.py --help for the arguments
+    import sys
+    from cli import main
+    sys.exit(main(['gif'] + sys.argv[1:]))
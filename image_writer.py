@@ -0,0 +1,188 @@
+# image_writer.py
+"""
+Saving images: the file names the generators save under, atomic writes, and an ImageWriter that encodes and
+writes images in the background while the next one renders.
+
+Once rendering is fast, compressing a 1920x1080 PNG takes a good part of the time of a frame. An ImageWriter
+takes finished images on a bounded queue and encodes them on threads of its own, while the next frame renders
+(numpy's array loops let other threads run, so the two overlap when there is a core to spare):
+
+    with ImageWriter(compress_level=1) as writer:
+        for frame in frames:
+            writer.submit(f'zoom/job_{frame.index}.png', color(frame))
+
+submit blocks while max_pending images are already waiting or being written, so a renderer that outruns the
+encoder waits for it instead of piling frames up in memory. An image must not be changed after it is submitted.
+
+The format follows the file extension:
+    .png, .webp, or anything else Pillow writes: an image (a PIL image, or an RGB array)
+    .npy: an array as it is (an RGB array, or escape data such as result.iterations)
+    .npz: an engine.EscapeResult, with parameters, as coloring.save_field writes it
+
+Every file is written under a hidden temporary name in its directory and renamed into place when complete
+(atomic_write), so a reader of the directory (gif.py, batch.py deciding which jobs are done) never sees a partly
+written file.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+
+def _read_umask():
+    # the process umask, read without setting it: os.umask can only read it by changing it for the whole process,
+    #   and a file another thread created meanwhile would get no umask at all
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('Umask:'):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError):
+        pass
+    # elsewhere, see what a new file gets
+    directory = tempfile.mkdtemp()
+    probe = os.path.join(directory, 'probe')
+    try:
+        os.close(os.open(probe, os.O_CREAT | os.O_WRONLY, 0o666))
+        return 0o666 & ~os.stat(probe).st_mode
+    finally:
+        if os.path.exists(probe):
+            os.unlink(probe)
+        os.rmdir(directory)
+
+
+# mkstemp makes files only their owner can read: give them the permissions open() would have
+_UMASK = _read_umask()
+
+
+def save_name(initial_color_hue, color_scale, job=None, a=None, b=None, image_format='.png'):
+    '''
+    File name a generator saves an image under (inside directory):
+    job_<job>_a_<a>_b_<b>_inithue_scale_<hue>_<scale><image_format>, without the job or a and b parts if None.
+    '''
+    parts = []
+    if job != None:
+        parts.append('job_' + str(job))
+    if a is not None:
+        parts.append('a_' + str(a) + '_b_' + str(b))
+    parts.append('inithue_scale_' + str(initial_color_hue) + '_' + str(color_scale))
+    return '_'.join(parts) + image_format
+
+
+@contextmanager
+def atomic_write(path):
+    '''
+    A file open for writing under a hidden temporary name next to path, renamed to path when the with block exits
+    without an error. On an error the temporary file is deleted and path is left as it was.
+    '''
+    directory, name = os.path.split(path)
+    # a hidden name, without the extension at the end, so directory listings and globs skip it
+    descriptor, temporary = tempfile.mkstemp(prefix='.' + name + '.', suffix='.part', dir=directory or '.')
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            yield file
+        os.chmod(temporary, 0o666 & ~_UMASK)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def write_image(path, data, compress_level=6, quality=80, lossless=False, **params):
+    '''
+    Write an image, array or escape data to path (the format follows the extension, see the module docstring),
+    atomically: the file only appears once it is complete.
+
+        Parameters:
+            path: file to write
+            data: a PIL image or an array for image formats and .npy, an EscapeResult for .npz
+            compress_level: PNG zlib level, 0 (none, fastest) to 9 (smallest)
+            quality, lossless: WebP quality (0-100), or lossless WebP
+            params: for .npz, parameters saved alongside the escape data (see coloring.save_field)
+    '''
+    extension = os.path.splitext(path)[1].lower()
+    with atomic_write(path) as file:
+        if extension == '.npy':
+            np.save(file, np.asarray(data))
+        elif extension == '.npz':
+            from coloring import save_field
+            save_field(file, data, **params)
+        else:
+            from PIL import Image
+            image = data if isinstance(data, Image.Image) else Image.fromarray(np.asarray(data))
+            image_format = Image.registered_extensions().get(extension)
+            if image_format is None:
+                raise ValueError(f'unknown image format {extension!r}, expected .png, .webp, .npy, .npz, ...')
+            if image_format == 'PNG':
+                image.save(file, image_format, compress_level=compress_level)
+            elif image_format == 'WEBP':
+                image.save(file, image_format, quality=quality, lossless=lossless)
+            else:
+                image.save(file, image_format)
+
+
+class ImageWriter:
+    '''
+    Encodes and writes images on background threads (see the module docstring). A context manager: leaving the
+    with block waits for every image to be written.
+
+        Parameters:
+            workers: encoding threads
+            max_pending: most images waiting or being written at once; submit blocks until there is room
+            compress_level, quality, lossless: encoder settings, see write_image
+    '''
+
+    def __init__(self, workers=1, max_pending=2, compress_level=6, quality=80, lossless=False):
+        self.options = dict(compress_level=compress_level, quality=quality, lossless=lossless)
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix='image_writer')
+        self._room = threading.BoundedSemaphore(max_pending)
+        self._futures = []
+        self.written = 0
+
+    def submit(self, path, data, **params):
+        '''
+        Queue data to be written to path (see write_image), once fewer than max_pending images are waiting.
+        Returns a concurrent.futures.Future. Raises the error of an earlier image that failed to be written.
+        '''
+        self._raise_failed()
+        self._room.acquire()
+        future = self._executor.submit(write_image, path, data, **self.options, **params)
+        future.add_done_callback(lambda _: self._room.release())
+        self._futures.append(future)
+        return future
+
+    def _raise_failed(self):
+        # forget the images already written, raise the first error among them
+        pending, failed = [], None
+        for future in self._futures:
+            if not future.done():
+                pending.append(future)
+            elif future.exception() is None:
+                self.written += 1
+            elif failed is None:
+                failed = future.exception()
+        self._futures = pending
+        if failed is not None:
+            raise failed
+
+    def close(self):
+        '''Wait for every image to be written, then raise the first error, if any.'''
+        self._executor.shutdown(wait=True)
+        self._raise_failed()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def save_image(path, data, writer=None, **params):
+    '''Write data to path now (see write_image), or queue it on an ImageWriter if one is given.'''
+    if writer is not None:
+        return writer.submit(path, data, **params)
+    write_image(path, data, **params)
@@ -1,7 +1,11 @@
 def generate_julia(a, b, initial_color_hue, color_scale=10, zoom_level=1, center_point = (0,0),
                    max_iter = 250, job = None, directory = None,
                    image_size = (1920, 1080), image_save = True,
-                   x_max=2.3, aspect_ratio = 16/9, verbose = True):
+                   x_max=2.3, aspect_ratio = 16/9, verbose = True, workers = 1,
+                   backend = 'numpy', cache = None, palette = 'hsv',
+                   field_save = False, field = None, adaptive = False, stats = None,
+                   antialias = None, precision = None, telemetry = None,
+                   image_format = '.png', writer = None):
 
     '''
     Generate a Julia Set using z = z^2 + c, where c is a + ib
@@ -21,11 +25,36 @@ def generate_julia(a, b, initial_color_hue, color_scale=10, zoom_level=1, center
             x_max: don't change this number (2.3)
             aspect_ratio: ratio between sides of image
             verbose: whether or not to print information about generation of image
+            workers: number of processes to render with. None uses every core
+            backend: 'numpy', or 'numba' for compiled per-pixel kernels (falls back to numpy if numba isn't installed)
+            cache: a tile_cache.TileCache, or the directory of one, to keep the escape data in.
+                Rendering the same view again (with other colors, say) then reads it back instead of iterating.
+            palette: 'hsv' (default), or a palette for coloring.color_field ('fire', 'ocean', 'grayscale', ...)
+            field_save: also save the raw escape data next to the image, as a .npz with the same name
+            field: escape data saved earlier with field_save (a .npz file name, or an EscapeResult) to color
+                instead of computing it again. The view and max_iter have to match the ones it was saved with.
+            adaptive: skip the inside of rectangles whose border never escapes (Mariani-Silver subdivision,
+                see adaptive.py). 'escaped' also fills equal escape-count rectangles, with approximate colors.
+            stats: optional dict, the engine's counters (see engine.new_stats) are added to it
+            antialias: supersample the pixels whose color differs strongly from a neighbour's with
+                antialias x antialias jittered samples each (antialias.py). None or 0 for one sample per pixel.
+            precision: 'float32', 'float64' or 'double-double' to iterate in, or 'auto' for the cheapest that
+                resolves the pixels (precision.py). None is float64, or double-double where float64 can't resolve
+                the pixels. Give center_point and zoom_level as strings to zoom past float64.
+            telemetry: a telemetry.Telemetry to report progress, tile timings and totals to, in place of the
+                progress bar (see telemetry.py)
+            image_format: '.png' (default), '.webp', or '.npy' for the uncompressed RGB array
+            writer: an image_writer.ImageWriter to encode and save the image (and the escape data) in the
+                background, so the next image can render meanwhile. None saves it before returning.
     '''
 
+    import os
     from PIL import Image
-    import math
     from datetime import datetime
+    from engine import complex_bounds, render, new_stats, format_stats, merge_stats
+    from coloring import color_field, load_field
+    from image_writer import save_image
+    from telemetry import rate_limited
 
     start_time = datetime.now()
 
@@ -33,79 +62,73 @@ def generate_julia(a, b, initial_color_hue, color_scale=10, zoom_level=1, center
         print('Warning: resolution does not match aspect ratio. Resolution: ' + str(image_size))
 
     # Find the boundaries of the complex plane in which the fractal will be generated based on the aspect ratio.
-    #    calculate image bounds like normal
-    if aspect_ratio > 1:
-        y_max = x_max / aspect_ratio
-    else:
-        y_max = x_max * aspect_ratio
-    x_min = -x_max
-    y_min = -y_max
-
-    #    zooming, if desired
-    x_max = center_point[0] + x_max * 1/zoom_level
-    y_max = center_point[1] + y_max * 1/zoom_level
-    x_min = center_point[0] + x_min * 1/zoom_level
-    y_min = center_point[1] + y_min * 1/zoom_level
-
-    # Initialize a black image, load in the pixels of the image to an array 'pixel'
-    image = Image.new('RGB', image_size, 'black')
-    pixel = image.load()
-
-    # Set the scaling factor - the mandelbrot set is defined between -2 and 2, not the pixel size of the image
-    x_size = (x_max - x_min)/image.size[0]
-    y_size = (y_max - y_min)/image.size[1]
-
-    # HSV to RGB conversion
-    def hsv2rgb(h,s,v):
-        import colorsys
-        return tuple(round(i * 255) for i in colorsys.hsv_to_rgb(h,s,v))
+    bounds = complex_bounds(center_point, zoom_level, x_max, aspect_ratio)
 
     # For each pixel in the image, iterate z_next = z^2 + c,
-    #   where z is imaginary and c is the complex coordinate value of that specific pixel
-    for x in range(image.size[0]):
-
-    # Print the progress bar
-        if verbose: print_progress_bar(x+1, image.size[0], 'Percentage complete:', 'Finished.')
-
-        for y in range(image.size[1]):
-            l = 0 # Initialize the while loop counter
-            z = complex((x_min + x * x_size), (y_min + y * y_size))
-            z_curr = z
-            c = complex(a, b)
-            nsmooth = math.exp(-abs(z_curr))
-            while pixel[x,y] == (0,0,0) and l < max_iter:
-                nsmooth += math.exp(-abs(z_curr))
-                if abs(z_curr) > 2:
-                    # hue, saturation, value/brightness
-                    pixel[x,y] = hsv2rgb(h = initial_color_hue + color_scale * (nsmooth/max_iter), s = 0.79, v = 0.59)
-                z_curr = z_curr**2 + c
-                l += 1
+    #   where z starts as the complex coordinate value of that specific pixel and c is a + ib
+    progress = telemetry
+    if verbose and telemetry is None:
+        # the engine reports every iteration: redraw the bar at most 10 times a second
+        progress = rate_limited(lambda i, total: print_progress_bar(i, total, 'Percentage complete:', 'Finished.'))
+    #   orbits caught in a cycle can never escape, so they stop being iterated
+    counts = new_stats()
+    if field is not None:
+        # color escape data computed earlier instead of iterating again
+        result = load_field(field)[0] if isinstance(field, str) else field
+        counts = None
+    elif cache is not None:
+        from tile_cache import TileCache, cached_render
+        cache = cache if isinstance(cache, TileCache) else TileCache(cache)
+        result = cached_render(image_size, bounds, cache, 'julia', (a, b), max_iter, exp_smoothing=True,
+                               workers=workers, progress=progress, backend=backend, stats=counts,
+                               precision=precision, telemetry=telemetry)
+    else:
+        result = render(image_size, bounds, 'julia', (a, b), max_iter, exp_smoothing=True,
+                        workers=workers, progress=progress, backend=backend, stats=counts, adaptive=adaptive,
+                        precision=precision, telemetry=telemetry)
+
+    # hue, saturation, value/brightness
+    color = lambda result: color_field(result, max_iter, 'exp', initial_color_hue, color_scale, palette)
+    rgb = color(result)
+    if antialias:
+        from antialias import supersample_edges
+        counts = new_stats() if counts is None else counts
+        rgb = supersample_edges(rgb, image_size, bounds, color, 'julia', (a, b), max_iter, exp_smoothing=True,
+                                samples=antialias, backend=backend, stats=counts, precision=precision)
+    image = Image.fromarray(rgb)
+    if stats is not None and counts is not None:
+        merge_stats(stats, counts)
 
     # calculate total time in minutes
     total_time = (datetime.now() - start_time).total_seconds()/60
     if verbose: print('fractal created in', round(total_time, 3), 'minutes')
-
-    # Name of this image:
-    if job != None:
-        save_name_list = ['job_' + str(job), '_a_' + str(a) + '_b_' + str(b),
-                          '_inithue_scale_' + str(initial_color_hue) + '_' + str(color_scale),
-                          '.png']
-    else:
-        save_name_list = ['a_' + str(a) + '_b_' + str(b),
-                          '_inithue_scale_' + str(initial_color_hue) + '_' + str(color_scale),
-                          '.png']
+    if verbose and counts is not None: print(format_stats(counts))
+    if verbose and telemetry is not None and telemetry.totals is not None: print(telemetry.summary())
+    if verbose and counts is not None and cache is not None: print(cache.summary())
 
     # Save the image
-    save_name = ''.join(save_name_list)
+    save_name = julia_save_name(a, b, initial_color_hue, color_scale, job, image_format)
+    path = save_name if directory == None else directory + '/' + save_name
     if image_save:
         if directory == None:
             if verbose: print('saved as:', save_name)
-            image.save(save_name)
         else:
             if verbose: print('saved as:', save_name, 'in the directory:', directory)
-            image.save(directory + '/' + save_name)
+        save_image(path, image, writer)
     else:
         if verbose: print('Will not save the image.')
+    if field_save and field is None:
+        field_name = os.path.splitext(path)[0] + '.npz'
+        if verbose: print('escape data saved as:', field_name)
+        save_image(field_name, result, writer, formula='julia', a=a, b=b, max_iter=max_iter,
+                   center_point=list(center_point), zoom_level=zoom_level)
+
+    return image
+
+def julia_save_name(a, b, initial_color_hue, color_scale, job=None, image_format='.png'):
+    '''File name generate_julia saves an image under (inside directory)'''
+    from image_writer import save_name
+    return save_name(initial_color_hue, color_scale, job, a, b, image_format)
 
 def print_progress_bar (iteration, total, prefix = '', suffix = '', decimals = 1, length = 25, fill = '█'):
     """
@@ -129,8 +152,7 @@ def print_progress_bar (iteration, total, prefix = '', suffix = '', decimals = 1
         print()
 
 if __name__=="__main__":
-    generate_julia(a = -0.834, b = -0.171, initial_color_hue = 0.41, color_scale = 20,
-                   zoom_level=1, center_point = (0,0),
-                   max_iter = 250, job = 13, directory = "generated_images",
-                   image_size = (int(1920/2), int(1080/2)), image_save = True,
-                   x_max=2.3, aspect_ratio = 16/9, verbose = True)
+    # python julia.py --help for the arguments; with none, renders the default julia set
+    import sys
+    from cli import main
+    sys.exit(main(['julia'] + sys.argv[1:]))
@@ -1,28 +1,314 @@
+# julia_gui.py
+"""
+Interactive explorer for the fractals in formulas.py.
+
+    python making_a_gui/julia_gui.py
+
+Drag with the left mouse button to pan, use the mouse wheel (or + and -) to zoom in and out around the cursor,
+right click on a mandelbrot-style fractal to open the julia set for that point, r to reset the view.
+
+Every change of view is rendered progressively in a background thread: first at a quarter of the width and
+height (1/16 of the pixels), then at half (1/4 of the pixels), then at full resolution. Each stage is shown as
+soon as it is done. A new pan or zoom cancels the render in progress right away, so the preview follows the
+mouse instead of waiting on renders nobody will look at. Frames go straight to the canvas as in-memory images,
+nothing is written to disk.
+"""
+
+from collections import namedtuple
+import os
+import queue
+import sys
+import threading
+from time import perf_counter
+
 import tkinter as tk
 import tkinter.ttk as ttk
-from datetime import datetime as dt
 
-start_time = dt.now()
+import numpy as np
+
+# the shared engine lives at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import complex_bounds, render
+from coloring import color_field
+from formulas import FORMULAS, get_formula
+
+
+# how much smaller than the window each stage is rendered, per side: 1/16 of the pixels, 1/4, then all of them
+STAGES = (4, 2, 1)
+
+# formula: name in FORMULAS; c: (a, b) for julia-style formulas; center_point, zoom_level: as for complex_bounds
+# max_iter, initial_color_hue, color_scale: as for the generators; image_size: window size in pixels
+View = namedtuple('View', ['formula', 'c', 'center_point', 'zoom_level', 'max_iter', 'initial_color_hue',
+                           'color_scale', 'image_size'])
+
+
+class Cancelled(Exception):
+    '''Raised inside a render that a newer request has replaced.'''
+
+
+class ProgressiveRenderer:
+    '''
+    Renders views coarse to fine in a background thread.
+    on_frame(generation, stage, rgb, seconds) is called from that thread after every stage, with the frame as a
+    (height, width, 3) uint8 array already scaled up to the full image size and the seconds since the request.
+    Only the latest request is worked on: request() cancels whatever is being rendered.
+    '''
+
+    def __init__(self, on_frame, backend='numpy'):
+        self.on_frame = on_frame
+        self.backend = backend
+        self.generation = 0
+        self._view = None
+        self._requested = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def request(self, view):
+        '''Start rendering view, dropping any earlier request. Returns the request's generation number.'''
+        with self._lock:
+            self.generation += 1
+            self._view = view
+            self._requested = perf_counter()
+            self._wake.set()
+            return self.generation
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+            self.generation += 1
+            self._wake.set()
+
+    def _check(self, generation):
+        # called from the engine's progress callback, once per iteration: bail out as soon as we're stale
+        if generation != self.generation or self._stopped:
+            raise Cancelled
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            with self._lock:
+                self._wake.clear()
+                if self._stopped:
+                    return
+                generation, view, requested = self.generation, self._view, self._requested
+            try:
+                for stage, divisor in enumerate(STAGES):
+                    self._check(generation)
+                    rgb = render_stage(view, divisor, lambda *_: self._check(generation), self.backend)
+                    self.on_frame(generation, stage, rgb, perf_counter() - requested)
+            except Cancelled:
+                continue
+
+
+def render_stage(view, divisor=1, progress=None, backend='numpy'):
+    '''Render and color a view at 1/divisor of its width and height, scaled back up to the full size.'''
+    width, height = view.image_size
+    size = (max(1, -(-width // divisor)), max(1, -(-height // divisor)))
+    formula = get_formula(view.formula)
+    bounds = complex_bounds(view.center_point, view.zoom_level, 2.3, width / height)
+    # pixel-is-the-start formulas are colored like generate_julia, the others like generate_mandelbrot_zoom
+    style = 'smooth' if formula.parameter_plane else 'exp'
+    # a coarse pixel covers divisor x divisor full pixels: sample it at their center rather than their corner
+    x_min, x_max, y_min, y_max = bounds
+    shift_x = (x_max - x_min) / width * (divisor - 1) / 2
+    shift_y = (y_max - y_min) / height * (divisor - 1) / 2
+    bounds = (x_min + shift_x, x_min + shift_x + (x_max - x_min) * size[0] * divisor / width,
+              y_min + shift_y, y_min + shift_y + (y_max - y_min) * size[1] * divisor / height)
+
+    result = render(size, bounds, formula, view.c, view.max_iter, exp_smoothing=style == 'exp',
+                    progress=progress, backend=backend)
+    if style == 'exp':
+        rgb = color_field(result, view.max_iter, 'exp', view.initial_color_hue, view.color_scale)
+    else:
+        rgb = color_field(result, view.max_iter)
+    if divisor > 1:
+        rgb = np.repeat(np.repeat(rgb, divisor, axis=0), divisor, axis=1)[:height, :width]
+    return rgb
+
+
+def photo_image(rgb):
+    '''A Tk PhotoImage of an (height, width, 3) uint8 array, passed to Tk as an in-memory PPM.'''
+    height, width = rgb.shape[:2]
+    data = b'P6 %d %d 255\n' % (width, height) + np.ascontiguousarray(rgb).tobytes()
+    return tk.PhotoImage(width=width, height=height, data=data, format='PPM')
+
 
 class Application(tk.Frame):
-    def __init__(self, master=None):
+    def __init__(self, master=None, image_size=(960, 540), backend='numpy'):
         super().__init__(master)
-        self.pack()
+        self.master = master
+        self.image_size = image_size
+        self.pack(fill='both', expand=True)
         self.create_widgets()
 
+        self.view = self.home_view('julia')
+        self.frames = queue.Queue()
+        self.renderer = ProgressiveRenderer(lambda *frame: self.frames.put(frame), backend)
+        self.photo = None
+        # the view of the frame on the canvas
+        self.shown = None
+        self.timings = {}
+        self.drag_start = None
+
+        self.redraw()
+        self.after(10, self.show_frames)
+
     def create_widgets(self):
-        self.hi_there = tk.Button(self)
-        self.hi_there["text"] = "Hello World\n(click me)"
-        self.hi_there["command"] = self.say_hi
-        self.hi_there.pack(side="top")
+        toolbar = tk.Frame(self)
+        toolbar.pack(side='top', fill='x')
+
+        self.formula = tk.StringVar(value='julia')
+        self.a = tk.StringVar(value='-0.834')
+        self.b = tk.StringVar(value='-0.171')
+        self.max_iter = tk.StringVar(value='250')
+        self.initial_color_hue = tk.StringVar(value='0.41')
+        self.color_scale = tk.StringVar(value='20')
+
+        tk.Label(toolbar, text='formula').pack(side='left')
+        formulas = ttk.Combobox(toolbar, textvariable=self.formula, values=sorted(FORMULAS), width=12,
+                                state='readonly')
+        formulas.bind('<<ComboboxSelected>>', lambda event: self.reset())
+        formulas.pack(side='left')
+        for label, variable in (('a', self.a), ('b', self.b), ('max_iter', self.max_iter),
+                                ('hue', self.initial_color_hue), ('scale', self.color_scale)):
+            tk.Label(toolbar, text=label).pack(side='left', padx=(8, 0))
+            entry = tk.Entry(toolbar, textvariable=variable, width=8)
+            entry.bind('<Return>', lambda event: self.redraw())
+            entry.pack(side='left')
+        tk.Button(toolbar, text='Reset', command=self.reset).pack(side='left', padx=8)
+        tk.Button(toolbar, text='QUIT', fg='red', command=self.quit_app).pack(side='right')
+
+        width, height = self.image_size
+        self.canvas = tk.Canvas(self, width=width, height=height, highlightthickness=0, background='black')
+        self.canvas.pack(side='top')
+        self.canvas_image = self.canvas.create_image(0, 0, anchor='nw')
+        self.status = tk.Label(self, anchor='w')
+        self.status.pack(side='bottom', fill='x')
+
+        self.canvas.bind('<ButtonPress-1>', self.start_drag)
+        self.canvas.bind('<B1-Motion>', self.drag)
+        self.canvas.bind('<ButtonRelease-1>', self.end_drag)
+        self.canvas.bind('<MouseWheel>', lambda event: self.zoom(1.25 if event.delta > 0 else 0.8, event))
+        self.canvas.bind('<Button-4>', lambda event: self.zoom(1.25, event))
+        self.canvas.bind('<Button-5>', lambda event: self.zoom(0.8, event))
+        self.canvas.bind('<Button-3>', self.open_julia)
+        self.master.bind('+', lambda event: self.zoom(1.25))
+        self.master.bind('=', lambda event: self.zoom(1.25))
+        self.master.bind('-', lambda event: self.zoom(0.8))
+        self.master.bind('r', lambda event: self.reset())
+        self.master.protocol('WM_DELETE_WINDOW', self.quit_app)
+
+    def home_view(self, formula):
+        center = (-0.5, 0) if get_formula(formula).parameter_plane else (0, 0)
+        return View(formula, None, center, 1, 250, 0.41, 20, self.image_size)
+
+    def read_view(self):
+        # the view with the values typed into the toolbar, keeping the old ones if something doesn't parse
+        try:
+            c = (float(self.a.get()), float(self.b.get()))
+            max_iter = max(1, int(self.max_iter.get()))
+            hue, scale = float(self.initial_color_hue.get()), float(self.color_scale.get())
+        except ValueError:
+            return self.view
+        formula = self.formula.get()
+        return self.view._replace(formula=formula, c=None if get_formula(formula).parameter_plane else c,
+                                  max_iter=max_iter, initial_color_hue=hue, color_scale=scale)
+
+    def redraw(self):
+        self.view = self.read_view()
+        self.timings = {}
+        self.renderer.request(self.view)
+
+    def reset(self):
+        self.view = self.home_view(self.formula.get())
+        self.redraw()
+
+    def pixel_size(self):
+        x_min, x_max, y_min, y_max = complex_bounds(self.view.center_point, self.view.zoom_level, 2.3,
+                                                    self.image_size[0] / self.image_size[1])
+        return (x_max - x_min) / self.image_size[0], (y_max - y_min) / self.image_size[1]
+
+    def pixel_to_point(self, x, y):
+        x_min, _, y_min, _ = complex_bounds(self.view.center_point, self.view.zoom_level, 2.3,
+                                            self.image_size[0] / self.image_size[1])
+        x_step, y_step = self.pixel_size()
+        return x_min + x * x_step, y_min + y * y_step
+
+    def zoom(self, factor, event=None):
+        # keep the point under the cursor where it is
+        width, height = self.image_size
+        x, y = (event.x, event.y) if event is not None else (width / 2, height / 2)
+        point = self.pixel_to_point(x, y)
+        center = self.view.center_point
+        self.view = self.view._replace(
+            zoom_level=self.view.zoom_level * factor,
+            center_point=(point[0] + (center[0] - point[0]) / factor, point[1] + (center[1] - point[1]) / factor))
+        self.redraw()
+
+    def start_drag(self, event):
+        self.drag_start = (event.x, event.y, self.view.center_point)
+
+    def drag(self, event):
+        if self.drag_start is None:
+            return
+        x, y, center = self.drag_start
+        x_step, y_step = self.pixel_size()
+        self.view = self.view._replace(center_point=(center[0] - (event.x - x) * x_step,
+                                                     center[1] - (event.y - y) * y_step))
+        # move the picture on screen right away, and render the new view behind it
+        if self.shown is not None and self.shown.zoom_level == self.view.zoom_level:
+            self.canvas.coords(self.canvas_image, (self.shown.center_point[0] - self.view.center_point[0]) / x_step,
+                               (self.shown.center_point[1] - self.view.center_point[1]) / y_step)
+        self.redraw()
+
+    def end_drag(self, event):
+        self.drag_start = None
+
+    def open_julia(self, event):
+        # the julia set of the point under the cursor
+        if not get_formula(self.view.formula).parameter_plane:
+            return
+        a, b = self.pixel_to_point(event.x, event.y)
+        self.a.set(f'{a:.6g}')
+        self.b.set(f'{b:.6g}')
+        self.formula.set('julia')
+        self.reset()
+
+    def show_frames(self):
+        # take finished frames off the queue; only the newest frame of the current request is drawn
+        latest = None
+        while True:
+            try:
+                frame = self.frames.get_nowait()
+            except queue.Empty:
+                break
+            if frame[0] == self.renderer.generation:
+                latest = frame
+        if latest is not None:
+            _, stage, rgb, seconds = latest
+            self.photo = photo_image(rgb)
+            self.canvas.itemconfigure(self.canvas_image, image=self.photo)
+            self.canvas.coords(self.canvas_image, 0, 0)
+            self.shown = self.view
+            self.timings[stage] = seconds
+            done = ', '.join(f'1/{STAGES[s]**2}: {t * 1000:.0f} ms' if STAGES[s] > 1 else f'full: {t * 1000:.0f} ms'
+                             for s, t in sorted(self.timings.items()))
+            center = self.view.center_point
+            self.status['text'] = (f'{done}    center ({center[0]:.12g}, {center[1]:.12g})  '
+                                   f'zoom {self.view.zoom_level:.4g}')
+        self.after(10, self.show_frames)
 
-        self.quit = tk.Button(self, text="QUIT", fg="red",
-                              command=root.destroy)
-        self.quit.pack(side="bottom")
+    def quit_app(self):
+        self.renderer.stop()
+        self.master.destroy()
 
-    def say_hi(self):
-        print("hi there, everyone!")
 
-root = tk.Tk()
-app = Application(master=root)
-app.mainloop()
\ No newline at end of file
+if __name__=="__main__":
+    root = tk.Tk()
+    root.title('fractal explorer')
+    app = Application(master=root)
+    app.mainloop()
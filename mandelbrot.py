@@ -4,20 +4,29 @@ File that defines a function for generating mandelbrot sets.
 """
 
 from PIL import Image
-import math
 from datetime import datetime
-import colorsys
+import os
+
+from engine import complex_bounds, render, new_stats, format_stats, merge_stats
+from coloring import color_field, load_field
+from deep_zoom import needs_deep_zoom, render_deep, format_deep_stats
+from telemetry import rate_limited
+from image_writer import save_image
 
 
 def generate_mandelbrot_zoom(
     initial_color_hue=0.5, color_scale=10, zoom_level=1, max_iter = 250,
     center_point = (0,0), job = None, directory = None,
     image_size = (1920, 1080), image_save = True,
-    x_max=2.3, aspect_ratio = 16/9, verbose = True
+    x_max=2.3, aspect_ratio = 16/9, verbose = True, workers = 1,
+    backend = 'numpy', deep_zoom = None, cache = None,
+    palette = 'hsv', field_save = False, field = None, adaptive = False,
+    stats = None, antialias = None, precision = None, telemetry = None,
+    image_format = '.png', writer = None
     ):
 
     '''
-    Generate a Mandelbrot Set using z = z^2 + z, where z starts as a complex number of the coordinates of a pixel
+    Generate a Mandelbrot Set using z = z^2 + c, where c is the complex number of the coordinates of a pixel and z starts at 0
 
         Parameters:
             initial_color_hue: number between 0 and 1. Specifies the initial coloring based on HSV color model. Corresponds with H
@@ -32,6 +41,32 @@ def generate_mandelbrot_zoom(
             x_max: don't change this number (2.3)
             aspect_ratio: ratio between sides of image
             verbose: whether or not to print information about generation of image
+            workers: number of processes to render with. None uses every core
+            backend: 'numpy', or 'numba' for compiled per-pixel kernels (falls back to numpy if numba isn't installed)
+            deep_zoom: render with perturbation theory (deep_zoom.py) so zooms past ~1e13 don't pixelate.
+                None turns it on when float64 can't resolve the pixels, or when center_point or zoom_level are
+                given as strings or Decimals. Ignores workers and backend.
+            cache: a tile_cache.TileCache, or the directory of one, to keep the escape data in.
+                Rendering the same view again (with other colors, say) then reads it back instead of iterating.
+            palette: 'hsv' (default), or a palette for coloring.color_field ('fire', 'ocean', 'grayscale', ...)
+            field_save: also save the raw escape data next to the image, as a .npz with the same name
+            field: escape data saved earlier with field_save (a .npz file name, or an EscapeResult) to color
+                instead of computing it again. The view and max_iter have to match the ones it was saved with.
+            adaptive: skip the inside of rectangles whose border never escapes (Mariani-Silver subdivision,
+                see adaptive.py). 'escaped' also fills equal escape-count rectangles, with approximate colors.
+            stats: optional dict, the render's counters (see engine.new_stats, or deep_zoom.render_deep for deep
+                zooms) are added to it
+            antialias: supersample the pixels whose color differs strongly from a neighbour's with
+                antialias x antialias jittered samples each (antialias.py). None or 0 for one sample per pixel.
+                Not done for deep zooms.
+            precision: 'float32', 'float64' or 'double-double' to iterate in, or 'auto' for the cheapest that
+                resolves the pixels (precision.py). None is float64. Deep zooms use perturbation instead, unless precision is 'double-double'
+                (which resolves zooms to about 1e27).
+            telemetry: a telemetry.Telemetry to report progress, tile timings and totals to, in place of the
+                progress bar (see telemetry.py). Deep zooms only report progress.
+            image_format: '.png' (default), '.webp', or '.npy' for the uncompressed RGB array
+            writer: an image_writer.ImageWriter to encode and save the image (and the escape data) in the
+                background, so the next image can render meanwhile. None saves it before returning.
     '''
 
     start_time = datetime.now()
@@ -39,81 +74,86 @@ def generate_mandelbrot_zoom(
     if image_size[0]/image_size[1] != aspect_ratio:
         print(f'Warning: resolution ({image_size[0]/image_size[1]}) does not match aspect ratio ({aspect_ratio})')
 
-    # Find the boundaries of the complex plane in which the fractal will be generated based on the aspect ratio.
-    if aspect_ratio > 1:
-        y_max = x_max / aspect_ratio
+    if deep_zoom is None:
+        deep_zoom = precision != 'double-double' and needs_deep_zoom(center_point, zoom_level, image_size, x_max)
+
+    # For each pixel in the image, iterate z_next = z^2 + c,
+    #   where c is that pixel's location in Re / Im space and z starts at 0
+    #   points inside the main cardioid and period-2 bulb, and orbits caught in a cycle, are never escaping
+    #   and are not iterated all the way to max_iter
+    progress = telemetry
+    if verbose and telemetry is None:
+        # the engine reports every iteration: redraw the bar at most 10 times a second
+        progress = rate_limited(lambda i, total: print_progress_bar(i, total, 'Percentage complete:', 'Finished.'))
+    if field is not None:
+        # color escape data computed earlier instead of iterating again
+        result = load_field(field)[0] if isinstance(field, str) else field
+        counts = None
+    elif deep_zoom:
+        # one high precision reference orbit at the center, float64 offsets from it for every pixel
+        counts = {}
+        result = render_deep(image_size, center_point, zoom_level, max_iter, x_max, aspect_ratio,
+                             stats=counts, progress=progress)
     else:
-        y_max = x_max * aspect_ratio
-    x_min = -x_max
-    y_min = -y_max
-
-    x_max = center_point[0] + x_max * 1/zoom_level
-    y_max = center_point[1] + y_max * 1/zoom_level
-    x_min = center_point[0] + x_min * 1/zoom_level
-    y_min = center_point[1] + y_min * 1/zoom_level
-
-    # Initialize a black image, load in the pixels of the image to an array 'pixel'
-    image = Image.new('RGB', image_size, 'black')
-    pixel = image.load()
-
-    # Set the scaling factor - the mandelbrot set is defined between -2 and 2, not the pixel size of the image
-    x_size = (x_max - x_min)/image.size[0]
-    y_size = (y_max - y_min)/image.size[1]
-
-    # For each pixel in the image, iterate z_next = z^2 + z,
-    #   where z is imaginary, starts as that coordinates location in Re / Im space
-    for x in range(image.size[0]):
-
-        # Print the progress bar
-        if verbose: print_progress_bar(x+1, image.size[0], 'Percentage complete:', 'Finished.')
-
-        for y in range(image.size[1]):
-            l = 0 # while loop counter
-            z = complex((x_min + x * x_size), (y_min + y * y_size))
-            z_curr = z
-            while pixel[x,y] == (0,0,0) and l < max_iter:
-                if abs(z_curr) > 2:
-                    # calculate a smoothed color value, between 0 and 1
-                    nsmooth = (l + 1 - math.log10(math.log2(abs(z_curr)))/math.log10(2))/max_iter
-                    pixel[x,y] = hsv2rgb(h = nsmooth, s = 0.79, v = 0.59)
-
-                z_curr = z_curr**2 + z
-                l += 1
+        # Find the boundaries of the complex plane in which the fractal will be generated based on the aspect ratio.
+        bounds = complex_bounds(center_point, zoom_level, x_max, aspect_ratio)
+        counts = new_stats()
+        if cache is not None:
+            from tile_cache import TileCache, cached_render
+            cache = cache if isinstance(cache, TileCache) else TileCache(cache)
+            result = cached_render(image_size, bounds, cache, 'mandelbrot', max_iter=max_iter, workers=workers,
+                                   progress=progress, backend=backend, stats=counts, precision=precision,
+                                   telemetry=telemetry)
+        else:
+            result = render(image_size, bounds, 'mandelbrot', max_iter=max_iter, workers=workers,
+                            progress=progress, backend=backend, stats=counts, adaptive=adaptive,
+                            precision=precision, telemetry=telemetry)
+
+    # calculate a smoothed color value, between 0 and 1, for every pixel that escaped
+    color = lambda result: color_field(result, max_iter, palette=palette)
+    rgb = color(result)
+    if antialias and not deep_zoom:
+        from antialias import supersample_edges
+        counts = new_stats() if counts is None else counts
+        bounds = complex_bounds(center_point, zoom_level, x_max, aspect_ratio)
+        rgb = supersample_edges(rgb, image_size, bounds, color, 'mandelbrot', max_iter=max_iter,
+                                samples=antialias, backend=backend, stats=counts, precision=precision)
+    image = Image.fromarray(rgb)
+    if stats is not None and counts is not None:
+        merge_stats(stats, counts)
 
     # calculate the time it took to generate
     total_time = (datetime.now() - start_time).total_seconds()/60
 
     if verbose: print('julia set created in', round(total_time, 4), 'minutes')
-
-# Name of this image:
-    if job != None:
-        save_name_list = [
-            'job_' + str(job),
-            '_inithue_scale_' + str(initial_color_hue) + '_' + str(color_scale),
-            '.png'
-        ]
-    else:
-        save_name_list = [
-            'inithue_scale_' + str(initial_color_hue) + '_' + str(color_scale),
-            '.png'
-        ]
+    if verbose and counts is not None: print(format_deep_stats(counts) if deep_zoom else format_stats(counts))
+    if verbose and telemetry is not None and telemetry.totals is not None: print(telemetry.summary())
+    if verbose and counts is not None and cache is not None and not deep_zoom: print(cache.summary())
 
 # Save the image
-    save_name = ''.join(save_name_list)
+    save_name = mandelbrot_save_name(initial_color_hue, color_scale, job, image_format)
+    path = save_name if directory == None else directory + '/' + save_name
     if image_save:
         if directory == None:
             if verbose: print('saved as:', save_name)
-            image.save(save_name)
         else:
             if verbose: print('saved as:', save_name, 'in the directory:', directory)
-            image.save(directory + '/' + save_name)
+        save_image(path, image, writer)
     else:
         if verbose: print('Will not save the image.')
+    if field_save and field is None:
+        field_name = os.path.splitext(path)[0] + '.npz'
+        if verbose: print('escape data saved as:', field_name)
+        save_image(field_name, result, writer, formula='mandelbrot', max_iter=max_iter,
+                   center_point=[str(value) for value in center_point], zoom_level=str(zoom_level))
+
+    return image
 
 
-# convert HSV to RGB
-def hsv2rgb(h,s,v):
-    return tuple(round(i*255) for i in colorsys.hsv_to_rgb(h,s,v))
+def mandelbrot_save_name(initial_color_hue, color_scale, job=None, image_format='.png'):
+    '''File name generate_mandelbrot_zoom saves an image under (inside directory)'''
+    from image_writer import save_name
+    return save_name(initial_color_hue, color_scale, job, image_format=image_format)
 
 
 def print_progress_bar (iteration, total, prefix = '', suffix = '', decimals = 1, length = 25, fill = '█'):
@@ -138,7 +178,7 @@ def print_progress_bar (iteration, total, prefix = '', suffix = '', decimals = 1
         print()
 
 if __name__=="__main__":
-    generate_mandelbrot_zoom(initial_color_hue=0.5, color_scale=20, zoom_level=1, max_iter = 250,
-                             center_point = (0,0), job = 13, directory = "generated_images",
-                             image_size = (int(1920/2), int(1080/2)),  image_save = True,
-                             x_max=2.3, aspect_ratio = 16/9, verbose = True)
\ No newline at end of file
+    # python mandelbrot.py --help for the arguments; with none, renders the whole set
+    import sys
+    from cli import main
+    sys.exit(main(['mandelbrot'] + sys.argv[1:]))
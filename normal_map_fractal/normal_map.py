@@ -0,0 +1,111 @@
+import os
+import sys
+
+# the shared engine lives at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def generate_normal_map(formula = 'mandelbrot', a = None, b = None, zoom_level = 1,
+                        center_point = (-0.5, 0), max_iter = 250, job = None, directory = None,
+                        image_size = (1920, 1080), image_save = True, x_max = 2.3,
+                        aspect_ratio = 16/9, verbose = True, style = 'both', light_angle = 45,
+                        light_height = 1.5, thickness = 1.0, initial_color_hue = 0.6,
+                        color_scale = 0.15, skip_far = True, stats = None):
+
+    '''
+    Render the mandelbrot set or a julia set from distance estimates (distance.py) instead of iteration counts:
+    crisp boundaries, and a normal map lit like a 3D surface.
+
+        Parameters:
+            formula: 'mandelbrot' or 'julia'
+            a, b: c = a + ib for the julia formula
+            zoom_level: any number from 1 to inf.
+            center_point: point at which the image is centered
+            max_iter: number of iterations to run on a pixel. Boundaries stay sharp at much lower values than
+                iteration-count coloring needs.
+            job: helpful for when generating multiple images. First number that shows up in the image name.
+            directory: directory to save image in. Must be relative to current working directory.
+            image_size: Image size in pixels (tuple)
+            image_save: boolean of whether or not to save the image
+            x_max: don't change this number (2.3)
+            aspect_ratio: ratio between sides of image
+            verbose: whether or not to print information about generation of image
+            style: 'distance' colors by distance to the set, 'normal' lights the normal map in white,
+                'both' lights the distance colors
+            light_angle: direction the light comes from, in degrees counterclockwise from the real axis
+            light_height: height of the light above the plane; lower means longer shadows
+            thickness: how thick boundaries are drawn, in pixels
+            initial_color_hue, color_scale: hue of the distance coloring, see distance.distance_color
+            skip_far: interpolate instead of iterating pixels more than a few pixels from the set
+            stats: optional dict, the engine's counters (see engine.new_stats) are added to it
+    '''
+
+    from PIL import Image
+    from datetime import datetime
+    from engine import complex_bounds, new_stats, format_stats, merge_stats
+    from distance import render_distance, pixel_size, distance_color, normal_shade
+    from julia import print_progress_bar
+    from telemetry import rate_limited
+    from image_writer import write_image
+
+    start_time = datetime.now()
+
+    if image_size[0]/image_size[1] != aspect_ratio:
+        print('Warning: resolution does not match aspect ratio. Resolution: ' + str(image_size))
+    if style not in ('distance', 'normal', 'both'):
+        raise ValueError(f"unknown style {style!r}, expected 'distance', 'normal' or 'both'")
+
+    bounds = complex_bounds(center_point, zoom_level, x_max, aspect_ratio)
+    pixel = pixel_size(image_size, bounds)
+
+    progress = None
+    if verbose:
+        # the engine reports every iteration: redraw the bar at most 10 times a second
+        progress = rate_limited(lambda i, total: print_progress_bar(i, total, 'Percentage complete:', 'Finished.'))
+    counts = new_stats()
+    # past 4 pixels from the set the distance coloring only changes smoothly
+    result = render_distance(image_size, bounds, formula, None if a is None else (a, b), max_iter,
+                             progress=progress, skip_distance=4 * pixel * thickness if skip_far else None,
+                             stats=counts)
+
+    if style == 'normal':
+        rgb = normal_shade(result, max_iter, light_angle, light_height)
+    else:
+        rgb = distance_color(result, max_iter, pixel, thickness, initial_color_hue, color_scale)
+        if style == 'both':
+            rgb = normal_shade(result, max_iter, light_angle, light_height, base=rgb)
+    image = Image.fromarray(rgb)
+    if stats is not None:
+        merge_stats(stats, counts)
+
+    # calculate total time in minutes
+    total_time = (datetime.now() - start_time).total_seconds()/60
+    if verbose: print('fractal created in', round(total_time, 3), 'minutes')
+    if verbose: print(format_stats(counts))
+
+    # Name of this image:
+    save_name_list = [formula, '_' + style, '.png']
+    if formula == 'julia':
+        save_name_list.insert(1, '_a_' + str(a) + '_b_' + str(b))
+    if job != None:
+        save_name_list.insert(0, 'job_' + str(job) + '_')
+
+    # Save the image
+    save_name = ''.join(save_name_list)
+    if image_save:
+        if directory == None:
+            if verbose: print('saved as:', save_name)
+            write_image(save_name, image)
+        else:
+            if verbose: print('saved as:', save_name, 'in the directory:', directory)
+            write_image(directory + '/' + save_name, image)
+    else:
+        if verbose: print('Will not save the image.')
+
+    return image
+
+
+if __name__=="__main__":
+    generate_normal_map(formula = 'mandelbrot', zoom_level = 1, center_point = (-0.5, 0),
+                        max_iter = 250, job = 1, directory = "generated_images",
+                        image_size = (int(1920/2), int(1080/2)), image_save = True, style = 'both')
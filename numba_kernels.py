@@ -0,0 +1,149 @@
+# numba_kernels.py
+"""
+Compiled per-pixel kernels for the engine, used with backend="numba".
+
+Each pixel runs its own loop and stops as soon as it escapes, so deep max_iter renders don't keep paying for
+points that escaped long ago. Pixels are spread over every core with prange. The exp(-|z|) smoothing sum and
+the |z| used for smooth coloring are accumulated in the same loop.
+
+Numba is optional: importing this module raises ImportError when it isn't installed, and the engine falls
+back to the numpy backend.
+"""
+
+import math
+
+import numba
+import numpy as np
+from numba import njit, prange
+
+
+def _make_kernel(step):
+    @njit(parallel=True, error_model='numpy')
+    def kernel(zr0, zi0, cr, ci, max_iter, escape_radius, exp_smoothing, interior_check, periodicity,
+               iterations, magnitude, exp_sum):
+        per_point_c = cr.size > 1
+        computed = 0
+        saved = 0
+        interior_skipped = 0
+        periodic = 0
+        for i in prange(zr0.size):
+            zr = zr0[i]
+            zi = zi0[i]
+            if per_point_c:
+                a = cr[i]
+                b = ci[i]
+            else:
+                a = cr[0]
+                b = ci[0]
+
+            mag = math.hypot(zr, zi)
+            nsmooth = math.exp(-mag)
+
+            if interior_check:
+                q = (a - 0.25)**2 + b*b
+                if q * (q + (a - 0.25)) < 0.25 * b*b or (a + 1)**2 + b*b < 0.0625:
+                    iterations[i] = max_iter
+                    magnitude[i] = mag
+                    if exp_smoothing:
+                        exp_sum[i] = nsmooth
+                    interior_skipped += 1
+                    saved += max_iter
+                    continue
+
+            # l counts the updates of z; the saved point moves forward whenever l is a power of two
+            saved_r = zr
+            saved_i = zi
+            repeated = False
+            l = 0
+            while l < max_iter:
+                mag = math.hypot(zr, zi)
+                if exp_smoothing:
+                    nsmooth += math.exp(-mag)
+                if mag > escape_radius:
+                    break
+                zr, zi = step(zr, zi, a, b)
+                l += 1
+                if periodicity:
+                    if zr == saved_r and zi == saved_i:
+                        repeated = True
+                        break
+                    if l & (l - 1) == 0:
+                        saved_r = zr
+                        saved_i = zi
+
+            computed += l
+            if repeated:
+                iterations[i] = max_iter
+                magnitude[i] = math.hypot(zr, zi)
+                periodic += 1
+                saved += max_iter - l
+            else:
+                iterations[i] = l
+                # points that never escaped report |z| after the last iteration, like the numpy backend
+                magnitude[i] = mag if l < max_iter else math.hypot(zr, zi)
+            if exp_smoothing:
+                exp_sum[i] = nsmooth
+        return computed, saved, interior_skipped, periodic
+    return kernel
+
+
+# compiled kernels by formula name, filled in the first time each formula is rendered
+KERNELS = {}
+
+
+def kernel_for(formula):
+    '''The compiled kernel for a formula (see formulas.py), compiling it on first use.'''
+    if formula.name not in KERNELS:
+        # error_model='numpy' lets division by zero give inf/nan like numpy does, instead of raising
+        step = njit(inline='always', error_model='numpy')(formula.scalar_step)
+        KERNELS[formula.name] = _make_kernel(step)
+    return KERNELS[formula.name]
+
+# hand out small chunks of pixels so cores that land on cheap pixels go back for more
+if hasattr(numba, 'set_parallel_chunksize'):
+    numba.set_parallel_chunksize(256)
+
+
+def escape_time_numba(z, c, formula='mandelbrot', max_iter=250, escape_radius=None, exp_smoothing=False,
+                      interior_check=False, periodicity=False, stats=None):
+    '''
+    Compiled equivalent of engine.escape_time. Same parameters (except progress and backend) and the same result.
+    The first call for each formula compiles its kernel, which takes a few seconds.
+    '''
+    from engine import EscapeResult, merge_stats
+    from formulas import get_formula
+
+    formula = get_formula(formula)
+    if escape_radius is None:
+        escape_radius = formula.escape_radius
+
+    shape = np.shape(z[0])
+    zr = np.ascontiguousarray(z[0], dtype=np.float64).ravel()
+    zi = np.ascontiguousarray(z[1], dtype=np.float64).ravel()
+    if np.ndim(c[0]) == 0 and np.ndim(c[1]) == 0:
+        cr = np.array([c[0]], dtype=np.float64)
+        ci = np.array([c[1]], dtype=np.float64)
+    else:
+        cr = np.ascontiguousarray(np.broadcast_to(np.asarray(c[0], dtype=np.float64), shape)).ravel()
+        ci = np.ascontiguousarray(np.broadcast_to(np.asarray(c[1], dtype=np.float64), shape)).ravel()
+
+    iterations = np.empty(zr.size, dtype=np.int32)
+    magnitude = np.empty(zr.size, dtype=np.float64)
+    exp_sum = np.empty(zr.size if exp_smoothing else 0, dtype=np.float64)
+
+    if interior_check and cr.size == 1 and zr.size > 1:
+        raise ValueError('interior_check needs a per-point c (mandelbrot-style rendering)')
+
+    computed, saved, interior_skipped, periodic = kernel_for(formula)(
+        zr, zi, cr, ci, max_iter, float(escape_radius), exp_smoothing, interior_check, periodicity,
+        iterations, magnitude, exp_sum)
+
+    if stats is not None:
+        merge_stats(stats, {'points': zr.size, 'iterations': computed, 'iterations_saved': saved,
+                            'interior_skipped': interior_skipped, 'periodic': periodic})
+
+    return EscapeResult(
+        iterations.reshape(shape),
+        magnitude.reshape(shape),
+        exp_sum.reshape(shape) if exp_smoothing else None,
+    )
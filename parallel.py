@@ -0,0 +1,137 @@
+# parallel.py
+"""
+Multi-process tiled rendering.
+
+The image is cut into bands of rows which are handed out to a process pool one at a time, so a worker that
+finishes a cheap band outside the set immediately picks up the next one instead of waiting on a band that
+crosses the set interior. Workers write their results straight into shared memory; only the band
+coordinates are pickled.
+"""
+
+import math
+import os
+from time import perf_counter
+from multiprocessing import get_all_start_methods, get_context
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from engine import EscapeResult, render, merge_stats, new_stats
+from formulas import get_formula
+
+
+def split_rows(height, bands):
+    '''Split the rows 0..height into about `bands` (start, stop) bands of equal height.'''
+    band_height = max(1, math.ceil(height / bands))
+    return [(start, min(start + band_height, height)) for start in range(0, height, band_height)]
+
+
+def new_pool(workers=None, initializer=None, initargs=()):
+    '''
+    Start a process pool for parallel_render.
+    Uses the forkserver start method where it exists: forking a process that has already started
+    threads (numba's thread pool, for one) can leave the children or the parent hung.
+    initializer(*initargs) is run once in every worker as it starts.
+    '''
+    method = 'forkserver' if 'forkserver' in get_all_start_methods() else None
+    return get_context(method).Pool(workers, initializer, initargs)
+
+
+def _shared_array(shape, dtype):
+    # allocate an array whose buffer lives in shared memory
+    shm = SharedMemory(create=True, size=max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize))
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _render_band(task):
+    # runs in a worker: render one band of rows and write it into the shared output arrays
+    rows, image_size, bounds, options, names, first_row, shape = task
+    stats = new_stats()
+    start = perf_counter()
+    result = render(image_size, bounds, rows=rows, stats=stats, **options)
+    seconds = perf_counter() - start
+
+    for name, dtype, values in zip(names, (np.int32, np.float64, np.float64), result):
+        if name is None:
+            continue
+        shm = SharedMemory(name=name)
+        try:
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf)[rows[0] - first_row:rows[1] - first_row] = values
+        finally:
+            shm.close()
+    return rows, stats, seconds
+
+
+def parallel_render(image_size, bounds, formula='mandelbrot', c=None, max_iter=250, escape_radius=None,
+                    exp_smoothing=False, workers=None, bands=None, pool=None, progress=None,
+                    backend='numpy', interior_check=False, periodicity=False, stats=None, rows=None,
+                    adaptive=False, precision=None, telemetry=None):
+    '''
+    Render the escape data for an image across a pool of processes. Same result as engine.render.
+
+        Parameters:
+            image_size, bounds, formula, c, max_iter, escape_radius, exp_smoothing, backend,
+            interior_check, periodicity, stats, rows, adaptive, precision: see engine.render
+            workers: number of processes (None uses every core). Ignored if pool is given.
+            bands: number of row bands to split the image into. Defaults to 8 per worker.
+            pool: an existing multiprocessing.Pool to reuse instead of starting a new one
+            progress: optional callable, called as progress(bands_done, total_bands)
+            telemetry: optional telemetry.Telemetry, sent a tile event with the time and counters of each band
+                (timed in its worker) as it comes back. engine.render(..., telemetry=...) also sends the totals.
+
+        Workers look the formula up by name, so it has to be registered when formulas.py
+        (or the module that registers it) is imported.
+
+        Returns an EscapeResult of arrays covering the rendered rows
+    '''
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if bands is None:
+        bands = 8 * workers
+    if rows is None:
+        rows = (0, image_size[1])
+    shape = (rows[1] - rows[0], image_size[0])
+
+    shared = [_shared_array(shape, np.int32), _shared_array(shape, np.float64)]
+    if exp_smoothing:
+        shared.append(_shared_array(shape, np.float64))
+    shms = [shm for shm, _ in shared]
+    views = [array for _, array in shared]
+    del shared
+    names = [shm.name for shm in shms] + [None] * (3 - len(shms))
+
+    options = dict(formula=get_formula(formula).name, c=c, max_iter=max_iter, escape_radius=escape_radius,
+                   exp_smoothing=exp_smoothing, backend=backend, interior_check=interior_check,
+                   periodicity=periodicity, adaptive=adaptive, precision=precision)
+
+    try:
+        tasks = [((rows[0] + start, rows[0] + stop), image_size, bounds, options, names, rows[0], shape)
+                 for start, stop in split_rows(shape[0], bands)]
+
+        own_pool = pool is None
+        if own_pool:
+            pool = new_pool(workers)
+        try:
+            # chunksize=1 hands out bands one at a time as workers free up
+            finished = pool.imap_unordered(_render_band, tasks, chunksize=1)
+            for done, (band, band_stats, seconds) in enumerate(finished, 1):
+                if stats is not None:
+                    merge_stats(stats, band_stats)
+                if telemetry is not None:
+                    telemetry.tile(band, None, seconds, band_stats)
+                if progress is not None:
+                    progress(done, len(tasks))
+        finally:
+            if own_pool:
+                pool.close()
+                pool.join()
+
+        arrays = [view.copy() for view in views]
+    finally:
+        # the views have to go before the shared memory can be closed
+        views.clear()
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+    return EscapeResult(arrays[0], arrays[1], arrays[2] if exp_smoothing else None)
@@ -0,0 +1,266 @@
+# poster.py
+"""
+Out-of-core rendering of images too big to hold in memory (posters of 100,000 x 60,000 pixels and up).
+
+The image is rendered in strips of rows. Each strip's escape data is computed, colored and written out before
+the next one is started, so memory use depends on the strip height and the image width, never on the height:
+    - output '.npy': the RGB image as a memory-mapped numpy array (np.load(path, mmap_mode='r') reads it back)
+    - output '.ppm': a binary PPM, which any image tool reads, written strip by strip
+    - output '.tif'/'.tiff': a BigTIFF written strip by strip (needs the tifffile package)
+
+Optionally a tile pyramid is written at the same time for web viewers:
+    - layout 'dzi': Deep Zoom (OpenSeadragon): poster.dzi and poster_files/<level>/<column>_<row>.png
+    - layout 'xyz': slippy-map tiles (Leaflet with CRS.Simple, ...): <directory>/<z>/<x>/<y>.png, z = 0 is the
+      level where the whole image fits in one tile
+Every level of the pyramid only keeps tile_size rows (plus one row to pair up) in memory: rows are halved as
+they come in and handed on to the next level down, which writes its tiles as soon as it has a full row of them.
+"""
+
+import math
+import os
+
+import numpy as np
+
+from engine import complex_bounds, render
+from coloring import color_field
+from formulas import get_formula
+
+
+def _downsample(rows):
+    # halve an even number of rows (and the width, rounding up) by averaging 2x2 blocks
+    if rows.shape[1] % 2:
+        rows = np.concatenate([rows, rows[:, -1:]], axis=1)
+    height, width = rows.shape[0] // 2, rows.shape[1] // 2
+    blocks = rows.reshape(height, 2, width, 2, 3).astype(np.uint16)
+    return ((blocks.sum(axis=(1, 3)) + 2) // 4).astype(np.uint8)
+
+
+class TilePyramid:
+    '''
+    Writes a tile pyramid from rows of an image fed in order from top to bottom.
+
+        Parameters:
+            directory: for 'dzi', the name of the pyramid without extension (writes directory + '.dzi' and
+                directory + '_files/'); for 'xyz', the directory of the tiles
+            image_size: (width, height) of the full image
+            layout: 'dzi' or 'xyz'
+            tile_size: width and height of the tiles in pixels
+            tile_format: extension of the tiles, 'png' or 'jpg'
+
+        Call add(rows) with consecutive (n, width, 3) uint8 bands of rows, then close().
+    '''
+
+    def __init__(self, directory, image_size, layout='dzi', tile_size=256, tile_format='png'):
+        if layout not in ('dzi', 'xyz'):
+            raise ValueError(f"unknown layout {layout!r}, expected 'dzi' or 'xyz'")
+        self.directory = directory
+        self.image_size = image_size
+        self.layout = layout
+        self.tile_size = tile_size
+        self.tile_format = tile_format
+        self.tiles = 0
+        # DZI numbers levels from 1x1 pixel (0) up to the full image (max_level)
+        self.max_level = math.ceil(math.log2(max(image_size))) if max(image_size) > 1 else 0
+        # xyz only has the levels from the one where the image fits in a tile up
+        self.xyz_levels = math.ceil(math.log2(max(1, max(image_size) / tile_size))) + 1
+        self.lowest = 0 if layout == 'dzi' else self.max_level - self.xyz_levels + 1
+        # per level: rows waiting for a full row of tiles, rows waiting to be halved, next row of tiles
+        self._pending = {level: None for level in range(self.lowest, self.max_level + 1)}
+        self._unpaired = {level: None for level in range(self.lowest, self.max_level + 1)}
+        self._tile_row = {level: 0 for level in range(self.lowest, self.max_level + 1)}
+
+        if layout == 'dzi':
+            with open(directory + '.dzi', 'w') as file:
+                file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                           f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" TileSize="{tile_size}" '
+                           f'Overlap="0" Format="{tile_format}">\n'
+                           f'  <Size Width="{image_size[0]}" Height="{image_size[1]}"/>\n'
+                           '</Image>\n')
+
+    def _tile_path(self, level, column, row):
+        if self.layout == 'dzi':
+            folder = os.path.join(self.directory + '_files', str(level))
+            name = f'{column}_{row}.{self.tile_format}'
+        else:
+            folder = os.path.join(self.directory, str(level - self.lowest), str(column))
+            name = f'{row}.{self.tile_format}'
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, name)
+
+    def _write_tiles(self, level, rows):
+        from PIL import Image
+        row = self._tile_row[level]
+        for column, x in enumerate(range(0, rows.shape[1], self.tile_size)):
+            Image.fromarray(rows[:, x:x + self.tile_size]).save(self._tile_path(level, column, row))
+            self.tiles += 1
+        self._tile_row[level] += 1
+
+    def _add(self, level, rows, final):
+        if rows.shape[0] or final:
+            pending = self._pending[level]
+            pending = rows if pending is None else np.concatenate([pending, rows])
+            while pending.shape[0] >= self.tile_size or (final and pending.shape[0]):
+                self._write_tiles(level, pending[:self.tile_size])
+                pending = pending[self.tile_size:]
+            self._pending[level] = pending
+        if level == self.lowest:
+            return
+
+        # halve pairs of rows for the level below; an odd last row is paired with itself
+        unpaired = self._unpaired[level]
+        rows = rows if unpaired is None else np.concatenate([unpaired, rows])
+        if final and rows.shape[0] % 2:
+            rows = np.concatenate([rows, rows[-1:]])
+        even = rows.shape[0] // 2 * 2
+        self._unpaired[level] = rows[even:]
+        self._add(level - 1, _downsample(rows[:even]), final)
+
+    def add(self, rows):
+        '''Add the next rows of the full size image.'''
+        self._add(self.max_level, rows, False)
+
+    def close(self):
+        '''Write out what is left of every level.'''
+        self._add(self.max_level, np.zeros((0, self.image_size[0], 3), dtype=np.uint8), True)
+
+
+class _StripWriter:
+    # writes an RGB image strip by strip to .npy (memory-mapped), .ppm or .tif
+    def __init__(self, path, image_size, strip_height):
+        width, height = image_size
+        self.kind = os.path.splitext(path)[1].lower()
+        self.row = 0
+        if self.kind == '.npy':
+            self.array = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=(height, width, 3))
+        elif self.kind == '.ppm':
+            self.file = open(path, 'wb')
+            self.file.write(b'P6 %d %d 255\n' % (width, height))
+        elif self.kind in ('.tif', '.tiff'):
+            import queue
+            import threading
+            import tifffile
+            # tifffile pulls the strips from an iterator: feed it through a queue from a thread
+            self.strips = queue.Queue(maxsize=2)
+            self.error = None
+
+            def write():
+                try:
+                    with tifffile.TiffWriter(path, bigtiff=True) as tiff:
+                        tiff.write(iter(self.strips.get, None), shape=(height, width, 3), dtype=np.uint8,
+                                   photometric='rgb', rowsperstrip=strip_height)
+                except Exception as error:
+                    self.error = error
+
+            self.thread = threading.Thread(target=write)
+            self.thread.start()
+        else:
+            raise ValueError(f'unknown output format {self.kind!r}, expected .npy, .ppm, .tif or .tiff')
+
+    def write(self, rgb):
+        if self.kind == '.npy':
+            self.array[self.row:self.row + rgb.shape[0]] = rgb
+            # hand the pages back to the OS instead of letting them pile up as dirty memory
+            self.array.flush()
+        elif self.kind == '.ppm':
+            self.file.write(np.ascontiguousarray(rgb).tobytes())
+        else:
+            import queue
+            while True:
+                try:
+                    self.strips.put(rgb, timeout=1)
+                    break
+                except queue.Full:
+                    # the writer thread died: don't wait on it forever
+                    if not self.thread.is_alive():
+                        raise self.error
+        self.row += rgb.shape[0]
+
+    def close(self):
+        if self.kind == '.npy':
+            del self.array
+        elif self.kind == '.ppm':
+            self.file.close()
+        else:
+            self.strips.put(None)
+            self.thread.join()
+            if self.error is not None:
+                raise self.error
+
+
+def render_poster(image_size, output, center_point=(0, 0), zoom_level=1, formula='mandelbrot', c=None,
+                  max_iter=250, initial_color_hue=0.41, color_scale=20, palette='hsv', color=None,
+                  strip_height=256, pyramid=None, layout='dzi', tile_size=256, tile_format='png', x_max=2.3,
+                  workers=1, backend='numpy', progress=None, stats=None):
+    '''
+    Render an image strip by strip, without ever holding all of it (or its escape data) in memory.
+
+        Parameters:
+            image_size: Image size in pixels (tuple)
+            output: file to write the image to, '.npy', '.ppm' or '.tif' (see the module docstring), or None
+                to only write the pyramid
+            center_point, zoom_level, x_max: see engine.complex_bounds; the aspect ratio is the image's
+            formula, c, max_iter, backend: see engine.render
+            initial_color_hue, color_scale, palette: colors, as for the generators. Julia-style formulas are
+                colored like generate_julia, the others like generate_mandelbrot_zoom.
+            color: optional callable turning a strip's EscapeResult into uint8 colors, instead of the above.
+                It gets exp(-|z|) sums only for julia-style formulas.
+            strip_height: rows rendered at a time. Peak memory is about strip_height x width x 130 bytes,
+                plus tile_size x width x 6 bytes with a pyramid.
+            pyramid: also write a tile pyramid there (see TilePyramid), or None
+            layout, tile_size, tile_format: of the pyramid
+            workers: number of processes to render each strip with (None uses every core)
+            progress: optional callable, called as progress(rows_done, height)
+            stats: optional dict (see engine.new_stats) that the counters are added to
+
+        Returns the TilePyramid, or None
+    '''
+    formula = get_formula(formula)
+    width, height = image_size
+    bounds = complex_bounds(center_point, zoom_level, x_max, width / height)
+    exp_smoothing = not formula.parameter_plane
+    if color is None:
+        if exp_smoothing:
+            color = lambda result: color_field(result, max_iter, 'exp', initial_color_hue, color_scale, palette)
+        else:
+            color = lambda result: color_field(result, max_iter, palette=palette)
+
+    writer = None if output is None else _StripWriter(output, image_size, strip_height)
+    tiles = None if pyramid is None else TilePyramid(pyramid, image_size, layout, tile_size, tile_format)
+    options = dict(formula=formula, c=c, max_iter=max_iter, exp_smoothing=exp_smoothing, backend=backend,
+                   stats=stats)
+    pool = None
+    try:
+        if workers != 1:
+            from parallel import new_pool
+            pool = new_pool(workers)
+        for start in range(0, height, strip_height):
+            rows = (start, min(start + strip_height, height))
+            if pool is None:
+                result = render(image_size, bounds, rows=rows, **options)
+            else:
+                from parallel import parallel_render
+                result = parallel_render(image_size, bounds, pool=pool, rows=rows, **options)
+            rgb = color(result)
+            del result
+            if writer is not None:
+                writer.write(rgb)
+            if tiles is not None:
+                tiles.add(rgb)
+            if progress is not None:
+                progress(rows[1], height)
+        if tiles is not None:
+            tiles.close()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if writer is not None:
+            writer.close()
+    return tiles
+
+
+if __name__=="__main__":
+    from mandelbrot import print_progress_bar
+    render_poster((16000, 9000), 'generated_images/poster.ppm', center_point=(-0.75, 0),
+                  pyramid='generated_images/poster', workers=None,
+                  progress=lambda i, total: print_progress_bar(i, total, 'Percentage complete:', 'Finished.'))
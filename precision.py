@@ -0,0 +1,268 @@
+# precision.py
+"""
+Precision tiers for the escape-time engine: float32, float64 and double-double.
+
+How much precision a render needs depends on how far apart its pixels are, relative to the size of the numbers
+being iterated. Shallow views don't need float64: float32 halves the memory traffic of every array operation.
+Past a zoom of about 1e13 float64 can no longer tell neighbouring pixels apart and the image pixelates.
+Double-double carries each number as an unevaluated sum hi + lo of two float64s, which gives about 106 bits
+(32 digits) of mantissa, enough for zooms to about 1e27, at the cost of about 20 float64 operations per
+multiplication.
+
+choose_precision picks the cheapest tier that resolves the pixel spacing, leaving 13 bits of the mantissa
+for the error the iteration itself builds up, the margin deep_zoom.needs_deep_zoom leaves for float64.
+The engine's default starts from float64 and only moves up to double-double when float64 can't resolve the
+pixels: float32 changes a few hundred pixels of a shallow 960x540 view by more than an iteration (orbits that
+stay near the escape radius for a long time), and is no faster for the mandelbrot set. Asking for 'auto'
+lets it pick float32 too. The numba kernels are compiled for float64 only: with the numba backend 'auto' starts
+from float64, float32 is refused, and double-double is iterated with numpy.
+
+DoubleDouble is an array type with +, -, * and abs, so the step functions in formulas.py run on it
+unchanged. Formulas that use numpy functions (the exotic formula's np.where, np.hypot, ...) can't be
+iterated in double-double. For zooms past double-double, and for faster deep zooms of the mandelbrot set,
+see deep_zoom.py.
+"""
+
+from decimal import Decimal, localcontext
+import warnings
+
+import numpy as np
+
+
+PRECISIONS = ('float32', 'float64', 'double-double')
+
+# bits of mantissa of each tier
+MANTISSA_BITS = {'float32': 24, 'float64': 53, 'double-double': 106}
+
+# bits of the mantissa left for the error the iteration builds up
+HEADROOM = 13
+
+
+def _two_sum(a, b):
+    # s + e == a + b exactly (Knuth)
+    s = a + b
+    v = s - a
+    return s, (a - (s - v)) + (b - v)
+
+
+def _quick_two_sum(a, b):
+    # s + e == a + b exactly, if |a| >= |b|
+    s = a + b
+    return s, b - (s - a)
+
+
+# 2^27 + 1, splits a float64 into two halves of 26 bits
+_SPLITTER = 134217729.0
+
+
+def _split(a):
+    t = _SPLITTER * a
+    high = t - (t - a)
+    return high, a - high
+
+
+def _two_product(a, b):
+    # p + e == a * b exactly (Dekker)
+    p = a * b
+    a_high, a_low = _split(a)
+    b_high, b_low = _split(b)
+    return p, ((a_high*b_high - p) + a_high*b_low + a_low*b_high) + a_low*b_low
+
+
+class DoubleDouble:
+    '''
+    An array of double-double numbers: each value is hi + lo, with |lo| at most half an ulp of hi.
+
+    Supports +, -, * (with other DoubleDoubles, arrays and numbers), unary -, abs, ==, indexing and
+    ravel, which is what the engine and the polynomial step functions use. hi alone is the value
+    rounded to float64, for comparisons that don't need the extra precision (escape tests).
+    '''
+
+    # keep numpy from applying its ufuncs element by element when an array is on the left of an operator
+    __array_ufunc__ = None
+
+    def __init__(self, hi, lo=0.0):
+        self.hi = np.asarray(hi, dtype=np.float64)
+        self.lo = np.broadcast_to(np.asarray(lo, dtype=np.float64), self.hi.shape)
+
+    @classmethod
+    def from_decimal(cls, value):
+        '''A single Decimal (or string) to the nearest DoubleDouble.'''
+        value = Decimal(value)
+        hi = float(value)
+        with localcontext() as context:
+            context.prec = 60
+            return cls(hi, float(value - Decimal(hi)))
+
+    def to_decimal(self):
+        '''Decimal values, as a list (for checking results against a Decimal reference).'''
+        with localcontext() as context:
+            context.prec = 60
+            return [Decimal(hi) + Decimal(lo) for hi, lo in zip(self.hi.ravel().tolist(), self.lo.ravel().tolist())]
+
+    @property
+    def shape(self):
+        return self.hi.shape
+
+    @property
+    def size(self):
+        return self.hi.size
+
+    @property
+    def ndim(self):
+        return self.hi.ndim
+
+    def __len__(self):
+        return len(self.hi)
+
+    def __getitem__(self, index):
+        return DoubleDouble(self.hi[index], self.lo[index])
+
+    def ravel(self):
+        return DoubleDouble(self.hi.ravel(), np.ravel(self.lo))
+
+    def reshape(self, shape):
+        return DoubleDouble(self.hi.reshape(shape), np.reshape(self.lo, shape))
+
+    def copy(self):
+        return DoubleDouble(self.hi.copy(), np.array(self.lo))
+
+    def __add__(self, other):
+        other = as_double_double(other)
+        s, e = _two_sum(self.hi, other.hi)
+        t, f = _two_sum(self.lo, other.lo)
+        s, e = _quick_two_sum(s, e + t)
+        return DoubleDouble(*_quick_two_sum(s, e + f))
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        return DoubleDouble(-self.hi, -self.lo)
+
+    def __sub__(self, other):
+        return self + -as_double_double(other)
+
+    def __rsub__(self, other):
+        return as_double_double(other) + -self
+
+    def __mul__(self, other):
+        other = as_double_double(other)
+        p, e = _two_product(self.hi, other.hi)
+        return DoubleDouble(*_quick_two_sum(p, e + (self.hi*other.lo + self.lo*other.hi)))
+
+    __rmul__ = __mul__
+
+    def __abs__(self):
+        sign = np.where(self.hi < 0, -1.0, 1.0)
+        return DoubleDouble(self.hi * sign, self.lo * sign)
+
+    def __eq__(self, other):
+        other = as_double_double(other)
+        return (self.hi == other.hi) & (self.lo == other.lo)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'DoubleDouble(hi={self.hi!r}, lo={self.lo!r})'
+
+
+def as_double_double(values):
+    '''DoubleDoubles are passed through, numbers and arrays become DoubleDoubles with lo = 0.'''
+    if isinstance(values, DoubleDouble):
+        return values
+    return DoubleDouble(values)
+
+
+def as_precision(values, precision, shape=None):
+    '''
+    values (an array, a number or a DoubleDouble) in a precision's array type, broadcast to shape if given:
+    a float32 or float64 array, or a DoubleDouble.
+    '''
+    if precision == 'double-double':
+        values = as_double_double(values)
+        if shape is not None:
+            values = DoubleDouble(np.broadcast_to(values.hi, shape), np.broadcast_to(values.lo, shape))
+        return values
+    values = np.asarray(leading(values), dtype=np.float32 if precision == 'float32' else np.float64)
+    return values if shape is None else np.broadcast_to(values, shape)
+
+
+def leading(values):
+    '''The float64 part of values: hi for a DoubleDouble, values themselves otherwise.'''
+    return values.hi if isinstance(values, DoubleDouble) else values
+
+
+def supports_double_double(formula):
+    '''Whether a formula's step function only uses the arithmetic DoubleDouble has.'''
+    one = DoubleDouble(np.ones(1))
+    try:
+        formula.step(one, one, one, one)
+    except TypeError:
+        return False
+    return True
+
+
+def relative_spacing(image_size, bounds):
+    '''Distance between neighbouring pixels, relative to the size of the coordinates (at least 1).'''
+    x_min, x_max, y_min, y_max = bounds
+    with localcontext() as context:
+        context.prec = 60
+        # bounds may be Decimals, whose differences keep every digit
+        spacing = min(abs(x_max - x_min) / image_size[0], abs(y_max - y_min) / image_size[1])
+    size = max(abs(float(value)) for value in bounds)
+    return float(spacing) / max(size, 1.0)
+
+
+def choose_precision(image_size, bounds, formula=None, cheapest='float32'):
+    '''
+    The cheapest tier of PRECISIONS, from cheapest up, that resolves the pixels of an image.
+    With a formula, tiers it can't be iterated in are skipped (float64 is the most it gets, with a warning).
+    '''
+    spacing = relative_spacing(image_size, bounds)
+    for precision in PRECISIONS[PRECISIONS.index(cheapest):]:
+        if spacing >= 2.0**(HEADROOM - MANTISSA_BITS[precision]):
+            break
+    else:
+        warnings.warn('pixels are closer together than double-double resolves; for the mandelbrot set, '
+                      'deep_zoom.render_deep goes deeper')
+    if precision == 'double-double' and formula is not None and not supports_double_double(formula):
+        warnings.warn(f'the {formula.name} formula can only be iterated in float32 or float64, '
+                      'so this image will pixelate')
+        precision = 'float64'
+    return precision
+
+
+def resolve_precision(precision, image_size, bounds, formula=None, backend='numpy'):
+    '''
+    A precision argument as the engine takes it to a tier: None for float64, or double-double where float64
+    can't resolve the pixels; 'auto' for the cheapest tier that resolves them; or a tier.
+    With backend 'numba', which has no float32 kernels, 'auto' starts from float64 and 'float32' is a ValueError.
+    '''
+    if precision == 'float32' and backend == 'numba':
+        raise ValueError("the numba kernels iterate in float64, use precision 'float64' or the numpy backend")
+    if precision is None or precision == 'auto' and backend == 'numba':
+        return choose_precision(image_size, bounds, formula, cheapest='float64')
+    if precision == 'auto':
+        return choose_precision(image_size, bounds, formula)
+    if precision not in PRECISIONS:
+        raise ValueError(f"unknown precision {precision!r}, expected 'auto' or one of {PRECISIONS}")
+    return precision
+
+
+def double_double_grid(image_size, bounds, rows=None):
+    '''
+    complex_grid in double-double: the coordinates of every pixel as two (height, width) DoubleDoubles.
+    bounds can be Decimals (see engine.complex_bounds), so coordinates keep more digits than float64 holds.
+    '''
+    x_min, x_max, y_min, y_max = (Decimal(value) if isinstance(value, (str, float)) else value for value in bounds)
+    with localcontext() as context:
+        context.prec = 60
+        # the steps only need float64's relative precision: the offsets they make are small next to x_min
+        x_size = float((x_max - x_min) / image_size[0])
+        y_size = float((y_max - y_min) / image_size[1])
+    start, stop = (0, image_size[1]) if rows is None else rows
+    re = DoubleDouble.from_decimal(x_min) + np.arange(image_size[0], dtype=np.float64) * x_size
+    im = DoubleDouble.from_decimal(y_min) + np.arange(start, stop, dtype=np.float64) * y_size
+    shape = (stop - start, image_size[0])
+    return (DoubleDouble(np.broadcast_to(re.hi, shape), np.broadcast_to(re.lo, shape)),
+            DoubleDouble(np.broadcast_to(im.hi[:, None], shape), np.broadcast_to(im.lo[:, None], shape)))
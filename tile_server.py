@@ -0,0 +1,362 @@
+# tile_server.py
+"""
+Slippy-map tile server, to explore the fractals in a browser on machines where the Tk explorer can't run.
+
+    python tile_server.py [--port 8000] [--workers 4]
+
+then open http://localhost:8000/ (or http://localhost:8000/?formula=julia&a=-0.8&b=0.156). Everything is served
+from this file, nothing is fetched from the internet.
+
+Tiles are at /<formula>/<z>/<x>/<y>.png, with optional query parameters a, b (for julia-style formulas),
+max_iter, palette, hue and scale. Zoom z is 2**z times generate_julia's zoom_level, and the whole z = 0 view
+(x from -x_max to x_max, centered on 0) is one tile. Each tile's bounds come from engine.complex_bounds like the
+generators', with an aspect ratio of 1.
+
+    - tiles are rendered, colored and PNG-encoded in a pool of processes
+    - encoded tiles are kept in an in-memory LRU cache of cache_bytes
+    - requests for a tile that is already being rendered wait for that render instead of starting another one
+    - when every client waiting for a tile has disconnected, its render is cancelled: a queued one never starts,
+      a running one stops at its next iteration (with the numba backend, at its next band of BAND_ROWS rows:
+      the compiled kernel only returns when its rows are done)
+
+/stats returns the server's counters as JSON. benchmarks/bench_tile_server.py is a load test.
+"""
+
+import argparse
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import count
+import io
+import json
+from multiprocessing import get_all_start_methods, get_context
+from urllib.parse import parse_qs, urlsplit
+
+
+# number of cancel flags: a render holds one from the moment it is queued until it ends, and renders queued while
+#   every flag is taken can't be stopped once they have started
+SLOTS = 4096
+
+# with the numba backend, a tile is rendered in bands of this many rows, checking for cancellation between them
+BAND_ROWS = 32
+
+# set in every worker by _init_worker: flags[slot] is the id of the job allowed to run in that slot
+_flags = None
+
+
+class Cancelled(Exception):
+    '''Raised inside a worker's render once nobody is waiting for the tile anymore.'''
+
+
+def _init_worker(flags):
+    global _flags
+    _flags = flags
+    # import the engine once per worker, not on the first tile
+    import engine, coloring, PIL.Image  # noqa: F401
+
+
+def tile_bounds(z, x, y, x_max=2.3):
+    '''Bounds (see engine.complex_bounds) of tile (x, y) at zoom z: 2**z x 2**z tiles cover the z = 0 view.'''
+    from engine import complex_bounds
+    side = 2 * x_max / 2**z
+    center = (-x_max + (x + 0.5) * side, -x_max + (y + 0.5) * side)
+    return complex_bounds(center, 2**z, x_max, 1)
+
+
+def _render_tile(job, slot, formula, c, z, x, y, max_iter, palette, hue, scale, tile_size, x_max, backend):
+    # runs in a worker: render, color and encode one tile, giving up as soon as the job is cancelled
+    #   (slot None: no flag was free, the job runs to the end)
+    import numpy as np
+    from PIL import Image
+    from engine import EscapeResult, render
+    from coloring import color_field
+    from formulas import get_formula
+
+    def check(*_):
+        if slot is not None and _flags[slot] != job:
+            raise Cancelled
+
+    check()
+    exp_smoothing = not get_formula(formula).parameter_plane
+    options = dict(exp_smoothing=exp_smoothing, progress=check, backend=backend)
+    bounds = tile_bounds(z, x, y, x_max)
+    if backend == 'numba':
+        # the numba kernel calls progress only once it has finished: render band by band, checking in between
+        parts = [render((tile_size, tile_size), bounds, formula, c, max_iter,
+                        rows=(start, min(start + BAND_ROWS, tile_size)), **options)
+                 for start in range(0, tile_size, BAND_ROWS)]
+        result = EscapeResult(*(None if fields[0] is None else np.concatenate(fields) for fields in zip(*parts)))
+    else:
+        result = render((tile_size, tile_size), bounds, formula, c, max_iter, **options)
+    if exp_smoothing:
+        rgb = color_field(result, max_iter, 'exp', hue, scale, palette)
+    else:
+        rgb = color_field(result, max_iter, palette=palette)
+    check()
+    data = io.BytesIO()
+    # fast compression: a tile is sent once and then served from the cache
+    Image.fromarray(rgb).save(data, format='PNG', compress_level=1)
+    return data.getvalue()
+
+
+async def _hang_up(reader):
+    # returns once the client closes its end of the connection. Anything it sends meanwhile (a request body, a
+    #   pipelined request) is read and dropped, not taken for a hang-up
+    while await reader.read(65536):
+        pass
+
+
+class _Render:
+    # a tile being rendered, and how many requests are waiting for it
+    def __init__(self, job, slot, future):
+        self.job = job
+        self.slot = slot
+        self.future = future
+        self.waiters = 0
+
+
+class TileServer:
+    '''
+    The tile server.
+
+        Parameters:
+            workers: number of render processes (None uses every core)
+            cache_bytes: size of the cache of encoded tiles
+            tile_size: width and height of a tile in pixels
+            x_max: half the width of the z = 0 tile on the real axis (as for the generators)
+            backend: 'numpy' or 'numba' (see engine.render)
+
+        stats counts requests, cache hits, coalesced requests (that waited for a render already running),
+        renders started, cancelled and failed.
+    '''
+
+    def __init__(self, workers=None, cache_bytes=256 * 2**20, tile_size=256, x_max=2.3, backend='numpy'):
+        self.cache_bytes = cache_bytes
+        self.tile_size = tile_size
+        self.x_max = x_max
+        self.backend = backend
+        method = 'forkserver' if 'forkserver' in get_all_start_methods() else None
+        context = get_context(method)
+        self._flags = context.Array('q', SLOTS, lock=False)
+        self._pool = ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                         initargs=(self._flags,))
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._inflight = {}
+        self._free_slots = list(range(SLOTS))
+        self._jobs = count(1)
+        self._server = None
+        self.stats = dict(requests=0, hits=0, coalesced=0, renders=0, cancelled=0, failed=0)
+
+    async def start(self, host='127.0.0.1', port=8000):
+        '''Start listening. Port 0 picks a free port; the one in use is in self.port.'''
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for entry in self._inflight.values():
+            if entry.slot is not None:
+                self._flags[entry.slot] = 0
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def _store(self, key, data):
+        self._cache[key] = data
+        self._cached_bytes += len(data)
+        while self._cached_bytes > self.cache_bytes and len(self._cache) > 1:
+            self._cached_bytes -= len(self._cache.popitem(last=False)[1])
+
+    def _finished(self, key, entry, future):
+        # a render ended: cache its tile, unless it was cancelled or failed
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+        if entry.slot is not None:
+            # the slot is free for another render. If this one was cancelled and is still running, the worker
+            #   sees 0, or the next job's id, and stops
+            self._flags[entry.slot] = 0
+            self._free_slots.append(entry.slot)
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            if not isinstance(future.exception(), Cancelled):
+                self.stats['failed'] += 1
+            return
+        self._store(key, future.result())
+
+    async def tile(self, formula, z, x, y, c=None, max_iter=250, palette='hsv', hue=0.41, scale=20):
+        '''The PNG bytes of a tile, from the cache, from a render already running, or from a new render.'''
+        key = (formula, z, x, y, c, max_iter, palette, hue, scale)
+        self.stats['requests'] += 1
+        if key in self._cache:
+            self.stats['hits'] += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        entry = self._inflight.get(key)
+        if entry is None:
+            job = next(self._jobs)
+            slot = self._free_slots.pop() if self._free_slots else None
+            if slot is not None:
+                self._flags[slot] = job
+            future = asyncio.get_running_loop().run_in_executor(
+                self._pool, _render_tile, job, slot, formula, c, z, x, y, max_iter, palette, hue, scale,
+                self.tile_size, self.x_max, self.backend)
+            entry = self._inflight[key] = _Render(job, slot, future)
+            future.add_done_callback(lambda future: self._finished(key, entry, future))
+            self.stats['renders'] += 1
+        else:
+            self.stats['coalesced'] += 1
+
+        entry.waiters += 1
+        try:
+            # shielded: one waiter going away must not cancel the render for the others
+            return await asyncio.shield(entry.future)
+        finally:
+            entry.waiters -= 1
+            if entry.waiters == 0 and not entry.future.done():
+                # nobody wants this tile anymore
+                self.stats['cancelled'] += 1
+                if entry.slot is not None:
+                    self._flags[entry.slot] = 0
+                entry.future.cancel()
+                if self._inflight.get(key) is entry:
+                    del self._inflight[key]
+
+    async def _handle(self, reader, writer):
+        # one request per connection (Connection: close)
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            try:
+                method, target = request.decode('latin-1').split()[:2]
+            except ValueError:
+                return await self._respond(writer, 400, 'text/plain', b'bad request')
+            url = urlsplit(target)
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            parts = url.path.strip('/').split('/')
+
+            if url.path == '/':
+                return await self._respond(writer, 200, 'text/html; charset=utf-8', VIEWER.encode())
+            if url.path == '/stats':
+                return await self._respond(writer, 200, 'application/json', json.dumps(self.stats).encode())
+            if len(parts) != 4 or not parts[3].endswith('.png'):
+                return await self._respond(writer, 404, 'text/plain', b'not found')
+            try:
+                from formulas import get_formula
+                formula = get_formula(parts[0])
+                z, x, y = int(parts[1]), int(parts[2]), int(parts[3][:-len('.png')])
+                c = None if formula.parameter_plane else (float(query.get('a', -0.8)), float(query.get('b', 0.156)))
+                options = dict(max_iter=int(query.get('max_iter', 250)), palette=query.get('palette', 'hsv'),
+                               hue=float(query.get('hue', 0.41)), scale=float(query.get('scale', 20)))
+                if not (0 <= z <= 48 and 0 <= x < 2**z and 0 <= y < 2**z and 0 < options['max_iter'] <= 10**6):
+                    raise ValueError('tile out of range')
+            except (KeyError, ValueError) as error:
+                return await self._respond(writer, 400, 'text/plain', str(error).encode())
+
+            # render, unless the client hangs up first
+            render = asyncio.ensure_future(self.tile(formula.name, z, x, y, c, **options))
+            hang_up = asyncio.ensure_future(_hang_up(reader))
+            await asyncio.wait({render, hang_up}, return_when=asyncio.FIRST_COMPLETED)
+            if not render.done():
+                render.cancel()
+                return
+            hang_up.cancel()
+            try:
+                data = render.result()
+            except Exception as error:
+                return await self._respond(writer, 500, 'text/plain', repr(error).encode())
+            await self._respond(writer, 200, 'image/png', data, 'Cache-Control: max-age=86400\r\n')
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, content_type, body, headers=''):
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}[status]
+        writer.write(f'HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n'
+                     f'Content-Length: {len(body)}\r\n{headers}Connection: close\r\n\r\n'.encode() + body)
+        await writer.drain()
+
+
+# a minimal slippy map: drag to pan, scroll to zoom; the page's query string is passed on to the tiles
+VIEWER = '''<!DOCTYPE html>
+<html><head><title>fractal tiles</title><style>
+html, body { margin: 0; height: 100%; overflow: hidden; background: #000; }
+#map { position: absolute; inset: 0; cursor: grab; }
+#map img { position: absolute; width: 256px; height: 256px; user-select: none; -webkit-user-drag: none; }
+#info { position: absolute; left: 8px; bottom: 8px; color: #ccc; font: 12px monospace; }
+</style></head><body><div id="map"></div><div id="info"></div><script>
+const params = new URLSearchParams(location.search);
+const formula = params.get('formula') || 'mandelbrot';
+params.delete('formula');
+const query = params.toString() ? '?' + params.toString() : '';
+const map = document.getElementById('map'), info = document.getElementById('info'), size = 256;
+// view: zoom level and the world position (in z = 0 tile units, 0..1) at the middle of the window
+let z = 1, cx = 0.5, cy = 0.5, tiles = {};
+function draw() {
+  const scale = size * 2 ** z, w = map.clientWidth, h = map.clientHeight;
+  const left = cx * scale - w / 2, top = cy * scale - h / 2, wanted = {};
+  for (let y = Math.max(0, Math.floor(top / size)); y <= Math.min(2 ** z - 1, Math.floor((top + h) / size)); y++)
+    for (let x = Math.max(0, Math.floor(left / size)); x <= Math.min(2 ** z - 1, Math.floor((left + w) / size)); x++) {
+      const key = `${z}/${x}/${y}`;
+      let img = tiles[key];
+      if (!img) { img = tiles[key] = new Image(); img.src = `/${formula}/${key}.png${query}`; map.appendChild(img); }
+      img.style.left = (x * size - left) + 'px';
+      img.style.top = (y * size - top) + 'px';
+      wanted[key] = true;
+    }
+  // dropping an image that is still loading closes its connection, which cancels its render
+  for (const key in tiles) if (!wanted[key]) { tiles[key].src = ''; tiles[key].remove(); delete tiles[key]; }
+  info.textContent = `${formula} z=${z}`;
+}
+let drag = null;
+map.onmousedown = e => { drag = [e.clientX, e.clientY, cx, cy]; };
+onmouseup = () => { drag = null; };
+onmousemove = e => {
+  if (!drag) return;
+  const scale = size * 2 ** z;
+  cx = drag[2] - (e.clientX - drag[0]) / scale; cy = drag[3] - (e.clientY - drag[1]) / scale; draw();
+};
+map.onwheel = e => {
+  e.preventDefault();
+  const step = e.deltaY < 0 ? 1 : -1;
+  if (z + step < 0 || z + step > 48) return;
+  // keep the point under the cursor in place
+  const scale = size * 2 ** z, px = (e.clientX - map.clientWidth / 2) / scale, py = (e.clientY - map.clientHeight / 2) / scale;
+  z += step;
+  const factor = step > 0 ? 0.5 : 2;
+  cx += px * (1 - factor); cy += py * (1 - factor); draw();
+};
+onresize = draw;
+draw();
+</script></body></html>
+'''
+
+
+async def serve(host='127.0.0.1', port=8000, **options):
+    '''Run a TileServer until interrupted.'''
+    server = await TileServer(**options).start(host, port)
+    print(f'serving on http://{host}:{server.port}/')
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser(description='Serve fractal map tiles over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=None, help='render processes (default: every core)')
+    parser.add_argument('--cache-mib', type=int, default=256, help='size of the tile cache')
+    parser.add_argument('--backend', default='numpy')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, workers=args.workers, cache_bytes=args.cache_mib * 2**20,
+                          backend=args.backend))
+    except KeyboardInterrupt:
+        pass